@@ -0,0 +1,276 @@
+# core/approval_policy.py
+"""
+Declarative auto-approval rules for the approval queue (manual mode).
+- A rule matches on request kind (llm/http/task), provider (for HTTP: the host),
+  model (exact, or a "prefix*"), and optionally a description regex and a per-call
+  token cap. Its action is "approve", "deny" or "manual" (always ask).
+- Budgets (tokens, USD via usd_per_1k_tokens, call count) are reserved from the
+  request's estimate when it is auto-approved; once spent the rule stops matching and
+  requests fall through to the next rule, or to a manual click.
+- Rules live in policy sets. A set activated for a run ("auto-approve OpenAlex GETs and
+  200k tokens of gpt-4o-mini for run X") carries its own budgets and is dropped with
+  deactivate() / when the scope() block ends. AILYS_APPROVAL_POLICY (a JSON file path
+  or inline JSON list) provides a process-wide set.
+- Evaluation is O(1) in the number of requests seen: rules are indexed by
+  (kind, provider, model) with wildcards, so each request probes a fixed set of keys.
+Rule JSON: {"name": "openalex", "kind": "http", "provider": "api.openalex.org", "action": "approve"}
+           {"name": "mini", "kind": "llm", "model": "gpt-4o-mini", "budget_tokens": 200000}
+"""
+
+from __future__ import annotations
+import itertools
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+ACTIONS = ("approve", "deny", "manual")
+_ANY = "*"
+
+
+@dataclass(frozen=True)
+class PolicyRule:
+    name: str
+    action: str = "approve"
+    kind: Optional[str] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None              # exact, or "prefix*"
+    pattern: Optional[Pattern[str]] = None   # searched in the request description
+    max_tokens_per_call: Optional[int] = None
+    budget_tokens: Optional[int] = None
+    budget_usd: Optional[float] = None
+    usd_per_1k_tokens: Optional[float] = None
+    budget_calls: Optional[int] = None
+
+    def index_key(self) -> Tuple[str, str, str]:
+        model = self.model or _ANY
+        if model.endswith("*"):
+            model = _ANY   # prefix rules sit in the model wildcard bucket and check startswith
+        return ((self.kind or _ANY).lower(), (self.provider or _ANY).lower(), model.lower())
+
+    def matches(self, description: str, meta: Dict[str, Any]) -> bool:
+        if self.model and self.model.endswith("*"):
+            if not str(meta.get("model") or "").lower().startswith(self.model[:-1].lower()):
+                return False
+        if self.pattern is not None and not self.pattern.search(description or ""):
+            return False
+        if self.max_tokens_per_call is not None and int(meta.get("tokens") or 0) > self.max_tokens_per_call:
+            return False
+        return True
+
+    def cost_usd(self, meta: Dict[str, Any]) -> float:
+        if meta.get("cost_usd") is not None:
+            return float(meta["cost_usd"])
+        if self.usd_per_1k_tokens is not None:
+            return float(meta.get("tokens") or 0) / 1000.0 * self.usd_per_1k_tokens
+        return 0.0
+
+
+@dataclass
+class Decision:
+    action: str                      # approve | deny | manual
+    rule: Optional[str] = None
+    policy_set: Optional[str] = None
+    reason: str = ""
+
+
+@dataclass
+class _Usage:
+    tokens: int = 0
+    usd: float = 0.0
+    calls: int = 0
+
+
+@dataclass
+class PolicySet:
+    name: str
+    rules: List[PolicyRule]
+    priority: int = 0
+    usage: Dict[str, _Usage] = field(default_factory=dict)
+
+    def remaining(self, rule: PolicyRule) -> Dict[str, Any]:
+        u = self.usage.get(rule.name) or _Usage()
+        return {
+            "tokens": None if rule.budget_tokens is None else rule.budget_tokens - u.tokens,
+            "usd": None if rule.budget_usd is None else round(rule.budget_usd - u.usd, 4),
+            "calls": None if rule.budget_calls is None else rule.budget_calls - u.calls,
+        }
+
+
+def _rule_from_dict(d: Dict[str, Any], i: int) -> PolicyRule:
+    action = str(d.get("action") or "approve").strip().lower()
+    if action not in ACTIONS:
+        raise ValueError(f"approval policy rule {i}: action must be one of {ACTIONS}, got {action!r}")
+    pat = d.get("pattern") or d.get("description")
+
+    def _num(key: str, cast):
+        v = d.get(key)
+        return None if v is None or v == "" else cast(v)
+
+    return PolicyRule(
+        name=str(d.get("name") or f"rule{i}"),
+        action=action,
+        kind=(d.get("kind") or None),
+        provider=(d.get("provider") or d.get("host") or None),
+        model=(d.get("model") or None),
+        pattern=re.compile(pat, re.IGNORECASE) if pat else None,
+        max_tokens_per_call=_num("max_tokens_per_call", int),
+        budget_tokens=_num("budget_tokens", int),
+        budget_usd=_num("budget_usd", float),
+        usd_per_1k_tokens=_num("usd_per_1k_tokens", float),
+        budget_calls=_num("budget_calls", int),
+    )
+
+
+def parse_rules(spec: Any) -> List[PolicyRule]:
+    """Accept PolicyRule objects, dicts, a JSON list, or {"rules": [...]}."""
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        spec = json.loads(spec)
+    if isinstance(spec, dict):
+        spec = spec.get("rules") or []
+    out: List[PolicyRule] = []
+    for i, r in enumerate(spec):
+        out.append(r if isinstance(r, PolicyRule) else _rule_from_dict(dict(r), i))
+    return out
+
+
+class PolicyEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sets: Dict[str, PolicySet] = {}
+        # (kind, provider, model) → [(priority, order, set, rule)], sorted
+        self._index: Dict[Tuple[str, str, str], List[Tuple[int, int, PolicySet, PolicyRule]]] = {}
+        self._order = itertools.count()
+        self.decisions: Dict[str, int] = {a: 0 for a in ACTIONS}
+
+    # ---- rule sets -----------------------------------------------------------
+    def activate(self, rules: Any, run: str = "default", priority: int = 0) -> PolicySet:
+        """Install (or replace) the rule set for a run; on equal priority, earlier sets match first."""
+        ps = PolicySet(name=run, rules=parse_rules(rules), priority=priority)
+        with self._lock:
+            self._sets[run] = ps
+            self._rebuild_locked()
+        print(f"[approval_policy] activated run={run!r} rules={len(ps.rules)}")
+        return ps
+
+    def deactivate(self, run: str) -> Optional[PolicySet]:
+        with self._lock:
+            ps = self._sets.pop(run, None)
+            self._rebuild_locked()
+        return ps
+
+    def _rebuild_locked(self) -> None:
+        index: Dict[Tuple[str, str, str], List[Tuple[int, int, PolicySet, PolicyRule]]] = {}
+        for ps in self._sets.values():
+            for rule in ps.rules:
+                index.setdefault(rule.index_key(), []).append((-ps.priority, next(self._order), ps, rule))
+        for bucket in index.values():
+            bucket.sort(key=lambda t: (t[0], t[1]))
+        self._index = index
+
+    # ---- evaluation ----------------------------------------------------------
+    def evaluate(self, kind: str, description: str, meta: Optional[Dict[str, Any]] = None) -> Decision:
+        """
+        First matching rule with budget left decides (higher set priority, then rule
+        order). Approvals reserve their estimate from the rule's budgets.
+        """
+        meta = meta or {}
+        kind = (kind or _ANY).lower()
+        prov = str(meta.get("provider") or _ANY).lower()
+        model = str(meta.get("model") or _ANY).lower()
+        with self._lock:
+            if not self._index:
+                return Decision("manual", reason="no policies")
+            candidates: List[Tuple[int, int, PolicySet, PolicyRule]] = []
+            for k in (kind, _ANY):
+                for p in (prov, _ANY):
+                    for m in (model, _ANY):
+                        candidates.extend(self._index.get((k, p, m), ()))
+            candidates.sort(key=lambda t: (t[0], t[1]))
+            seen = set()
+            for _, _, ps, rule in candidates:
+                if id(rule) in seen:
+                    continue
+                seen.add(id(rule))
+                if not rule.matches(description, meta):
+                    continue
+                if rule.action == "approve" and not self._reserve_locked(ps, rule, meta):
+                    continue   # budget spent: fall through to the next rule
+                self.decisions[rule.action] += 1
+                return Decision(rule.action, rule=rule.name, policy_set=ps.name)
+            self.decisions["manual"] += 1
+            return Decision("manual", reason="no matching rule")
+
+    def _reserve_locked(self, ps: PolicySet, rule: PolicyRule, meta: Dict[str, Any]) -> bool:
+        u = ps.usage.setdefault(rule.name, _Usage())
+        tokens = int(meta.get("tokens") or 0)
+        usd = rule.cost_usd(meta)
+        if rule.budget_tokens is not None and u.tokens + tokens > rule.budget_tokens:
+            return False
+        if rule.budget_usd is not None and u.usd + usd > rule.budget_usd:
+            return False
+        if rule.budget_calls is not None and u.calls + 1 > rule.budget_calls:
+            return False
+        u.tokens += tokens
+        u.usd += usd
+        u.calls += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "decisions": dict(self.decisions),
+                "sets": {
+                    name: {r.name: {"action": r.action, "used": vars(ps.usage.get(r.name) or _Usage()),
+                                    "remaining": ps.remaining(r)} for r in ps.rules}
+                    for name, ps in self._sets.items()
+                },
+            }
+
+
+def _load_env_policy(engine: PolicyEngine) -> None:
+    spec = (os.getenv("AILYS_APPROVAL_POLICY") or "").strip()
+    if not spec:
+        return
+    try:
+        if not spec.lstrip().startswith(("[", "{")):
+            with open(spec, "r", encoding="utf-8") as f:
+                spec = f.read()
+        engine.activate(spec, run="env", priority=-1)
+    except Exception as e:
+        print(f"[approval_policy] AILYS_APPROVAL_POLICY ignored: {e}")
+
+
+ENGINE = PolicyEngine()
+_load_env_policy(ENGINE)
+
+
+def activate(rules: Any, run: str = "default", priority: int = 0) -> PolicySet:
+    return ENGINE.activate(rules, run=run, priority=priority)
+
+
+def deactivate(run: str) -> Optional[PolicySet]:
+    return ENGINE.deactivate(run)
+
+
+@contextmanager
+def scope(rules: Any, run: str, priority: int = 0) -> Iterator[PolicySet]:
+    """Rules (and budgets) that apply only for the duration of one run."""
+    ps = ENGINE.activate(rules, run=run, priority=priority)
+    try:
+        yield ps
+    finally:
+        ENGINE.deactivate(run)
+
+
+def evaluate(kind: str, description: str, meta: Optional[Dict[str, Any]] = None) -> Decision:
+    return ENGINE.evaluate(kind, description, meta)
+
+
+def stats() -> Dict[str, Any]:
+    return ENGINE.stats()
@@ -1,9 +1,20 @@
+import contextvars
+import functools
+import json
 import os
 import threading
-import queue
 import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures import wait as futures_wait
 from dataclasses import dataclass, field
-from typing import Callable, Optional, List, Any
+from typing import Callable, Deque, Dict, Iterable, Optional, List, Any, Tuple, Union
+
+from core import approval_policy, approval_store, cognition_metrics
 
 # --- DEBUG: module identity
 import sys as _dbg_sys
@@ -14,6 +25,111 @@ def _env_mode() -> str:
     return (os.getenv("AILYS_APPROVAL_MODE", "manual") or "manual").strip().lower()
 
 
+# Approved calls run on one bounded worker pool per kind, so a burst of approved
+# network calls cannot starve LLM calls (or vice versa). "task" is the default kind:
+# whole-task call_fns that orchestrate their own sub-requests.
+_KIND_WORKER_ENV = {
+    "llm": ("AILYS_APPROVAL_LLM_WORKERS", 4),
+    "http": ("AILYS_APPROVAL_HTTP_WORKERS", 2),
+}
+_DEFAULT_KIND = "task"
+
+
+def _history_depth() -> int:
+    try:
+        return max(0, int(os.getenv("AILYS_APPROVAL_HISTORY", "500")))
+    except ValueError:
+        return 500
+
+
+def _kind_workers(kind: str) -> int:
+    key, default = _KIND_WORKER_ENV.get(kind, ("AILYS_APPROVAL_WORKERS", 4))
+    try:
+        return max(1, int(os.getenv(key, str(default))))
+    except ValueError:
+        return default
+
+
+# Marks threads owned by the queue's executors (nested approvals run inline on them).
+_worker_state = threading.local()
+
+# Approval group open in the current context (copied into map_ask workers).
+_current_group: "contextvars.ContextVar[Optional[ApprovalGroup]]" = contextvars.ContextVar(
+    "ailys_approval_group", default=None)
+
+
+def _group_log_depth() -> int:
+    try:
+        return max(0, int(os.getenv("AILYS_APPROVAL_GROUP_LOG", "2000")))
+    except ValueError:
+        return 2000
+
+
+class _QueueStats:
+    """
+    Rolling approval-queue aggregates; the caller holds the queue lock.
+    Per kind: wait (enqueued → decided: the human/policy), dispatch (decided → started:
+    waiting for a pool worker), exec (started → finished) and total, each with
+    p50/p95 over a bounded window (cognition_metrics series). Plus queue depth
+    sampled at every enqueue, and finished-per-minute throughput.
+    """
+    SPANS = ("wait", "dispatch", "exec", "total")
+
+    def __init__(self):
+        self.started_utc = datetime.utcnow().isoformat()
+        self.by_kind: Dict[str, Dict[str, Any]] = {}
+        self.depth = cognition_metrics.Series()
+        self.depth_peak = 0
+        self.finished: Deque[float] = deque(maxlen=4096)   # finish times, for throughput
+
+    def _kind(self, kind: str) -> Dict[str, Any]:
+        series = self.by_kind.get(kind)
+        if series is None:
+            series = self.by_kind[kind] = {name: cognition_metrics.Series() for name in self.SPANS}
+        return series
+
+    def enqueued(self, depth: int) -> None:
+        self.depth.add(float(depth))
+        self.depth_peak = max(self.depth_peak, depth)
+
+    def record(self, req: "ApprovalRequest") -> None:
+        """A finished request: every span whose two timestamps were set."""
+        series = self._kind(req.kind)
+        marks = (req.enqueued_at, req.decided_at, req.started_at, req.finished_at)
+        for name, a, b in (("wait", marks[0], marks[1]), ("dispatch", marks[1], marks[2]),
+                           ("exec", marks[2], marks[3]), ("total", marks[0], marks[3])):
+            if a is not None and b is not None:
+                series[name].add(max(0.0, b - a))
+        self.finished.append(req.finished_at or time.time())
+
+    def executed(self, kind: str, seconds: float) -> None:
+        """A call that never entered the queue (auto mode, approval group)."""
+        series = self._kind(kind)
+        series["exec"].add(seconds)
+        series["total"].add(seconds)
+        self.finished.append(time.time())
+
+    def snapshot(self, pending: int, running: int, buckets: bool = False) -> Dict[str, Any]:
+        now = time.time()
+
+        def _per_min(window: float) -> float:
+            n = sum(1 for t in self.finished if t >= now - window)
+            return round(n * 60.0 / window, 2)
+
+        def _summ(s) -> Dict[str, Any]:
+            out = s.summary()
+            if not buckets:
+                out.pop("buckets", None)
+            return out
+
+        return {
+            "since_utc": self.started_utc,
+            "depth": {"pending": pending, "running": running, "peak": self.depth_peak, **_summ(self.depth)},
+            "throughput_per_min": {"1m": _per_min(60.0), "15m": _per_min(900.0)},
+            "by_kind": {k: {name: _summ(s) for name, s in series.items()} for k, series in self.by_kind.items()},
+        }
+
+
 @dataclass
 class ApprovalRequest:
     id: int
@@ -24,7 +140,157 @@ class ApprovalRequest:
     result: Optional[object] = None
     error: Optional[BaseException] = None
     overrides: Optional[dict] = None
-    condition: threading.Condition = field(default_factory=threading.Condition)
+    # Resolved exactly once (executed, denied or dry-run); waiters block on it instead of polling.
+    future: Future = field(default_factory=Future)
+    claimed: bool = False   # set under the queue lock by whoever executes/denies it
+    kind: str = _DEFAULT_KIND
+    # Requested from one of our worker threads: once approved, the (blocked) requester
+    # runs it itself instead of taking a second pool slot, so nesting cannot deadlock.
+    inline: bool = False
+    handoff: Future = field(default_factory=Future)
+    # provider/model/tokens/cost estimate for approval policies; the rule that decided, if any
+    meta: Dict[str, Any] = field(default_factory=dict)
+    policy: Optional[str] = None
+    # Set when the request has a replayable spec and is journaled in the approval store
+    store_id: Optional[str] = None
+    # Lifecycle timestamps (time.time()): queued → approved/denied → running → resolved
+    enqueued_at: float = field(default_factory=time.time)
+    decided_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+class ApprovalGroup:
+    """
+    One approval ticket for a batch of calls. Opened with `with approvals.group(...)`:
+    entering files a single request (description + estimated count/tokens/cost);
+    once approved, every request_approval() made in that context (including map_ask
+    workers) runs at once, with the ticket's approval-time overrides, and is logged
+    against the group instead of the queue. If the ticket is denied, calls in the
+    block return None without queueing. A covered call that fails returns None, like
+    request_approval() outside a group; its error is kept in the group log. `limit` caps the calls the ticket covers;
+    later calls fall back to individual approval.
+    """
+
+    def __init__(self, queue: "ApprovalQueue", description: str, *, count: Optional[int] = None,
+                 tokens: Optional[int] = None, cost_usd: Optional[float] = None, kind: Optional[str] = None,
+                 limit: Optional[int] = None, meta: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None):
+        self._queue = queue
+        self.description = description
+        self.count = count
+        self.tokens = tokens
+        self.cost_usd = cost_usd
+        self.kind = kind
+        self.limit = limit
+        self.meta = dict(meta or {})
+        self.timeout = timeout
+        self.approved: Optional[bool] = None
+        self.overrides: Dict[str, Any] = {}
+        self.calls = 0
+        self.errors = 0
+        self.by_kind: Dict[str, int] = {}
+        self.tokens_estimated = 0
+        self.log: Deque[Dict[str, Any]] = deque(maxlen=_group_log_depth())
+        self.started = time.time()
+        self.ended: Optional[float] = None
+        self._lock = threading.Lock()
+        self._token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> "ApprovalGroup":
+        est = [f"calls≈{self.count}" if self.count is not None else "",
+               f"tokens≈{self.tokens}" if self.tokens is not None else "",
+               f"cost≈${self.cost_usd:.2f}" if self.cost_usd is not None else ""]
+        label = " ".join(e for e in est if e)
+        meta = dict(self.meta)
+        if self.tokens is not None:
+            meta.setdefault("tokens", self.tokens)
+        if self.cost_usd is not None:
+            meta.setdefault("cost_usd", self.cost_usd)
+        ticket = self._queue.request_approval(
+            description=f"[group] {self.description}" + (f" | {label}" if label else ""),
+            call_fn=lambda ov=None: {"overrides": dict(ov or {})},
+            timeout=self.timeout,
+            kind=self.kind,
+            meta=meta,
+        )
+        self.approved = bool(ticket)
+        self.overrides = ticket["overrides"] if isinstance(ticket, dict) else {}
+        self._token = _current_group.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            _current_group.reset(self._token)
+            self._token = None
+        self.ended = time.time()
+        self._queue._record_group(self)
+        print(f"[approval_group] closed {self.description!r} approved={self.approved} "
+              f"calls={self.calls} errors={self.errors}")
+
+    def covers(self) -> bool:
+        with self._lock:
+            return self.approved is False or self.limit is None or self.calls < self.limit
+
+    def run(self, description: str, call_fn: Callable[..., Any], kind: Optional[str],
+            meta: Optional[Dict[str, Any]]) -> Any:
+        """
+        Execute one call under the ticket (no queue round-trip) and log it. Returns None
+        if the ticket was declined or the call failed (the error is in the log entry).
+        """
+        t0 = time.perf_counter()
+        ok = bool(self.approved)
+        result = None
+        error: Optional[Exception] = None
+        if ok:
+            try:
+                result = call_fn(self.overrides) if self.overrides else call_fn()
+            except Exception as e:
+                ok = False
+                error = e
+        kind = kind or _DEFAULT_KIND
+        with self._lock:
+            self.calls += 1
+            if self.approved and not ok:
+                self.errors += 1
+            self.by_kind[kind] = self.by_kind.get(kind, 0) + 1
+            self.tokens_estimated += int((meta or {}).get("tokens") or 0)
+            self.log.append({"description": description, "kind": kind, "ok": ok,
+                             "sec": round(time.perf_counter() - t0, 4),
+                             "error": repr(error) if error is not None else None})
+        if ok:
+            self._queue._observe(kind, time.perf_counter() - t0)
+        else:
+            if error is not None:
+                print(f"[approval_group] {self.description!r}: call {description!r} failed: {error!r}")
+            result = None
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "description": self.description,
+                "approved": self.approved,
+                "overrides": self.overrides or None,
+                "estimated": {"count": self.count, "tokens": self.tokens, "cost_usd": self.cost_usd},
+                "calls": self.calls,
+                "errors": self.errors,
+                "by_kind": dict(self.by_kind),
+                "tokens_estimated": self.tokens_estimated,
+                "seconds": round((self.ended or time.time()) - self.started, 3),
+            }
+
+    def export(self, dest: str) -> str:
+        """Write the summary plus the per-call log as JSON (dest: file path)."""
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        with self._lock:
+            calls = list(self.log)
+        with open(dest, "w", encoding="utf-8") as f:
+            json.dump({**self.summary(), "log": calls}, f, ensure_ascii=False, indent=2)
+        return dest
 
 
 
@@ -37,12 +303,22 @@ class ApprovalQueue:
     """
     def __init__(self, mode: Optional[str] = None):
         self._mode = (mode or _env_mode())
-        self._queue: "queue.Queue[ApprovalRequest]" = queue.Queue()
-        self._requests: List[ApprovalRequest] = []
+        # Registry: id → request while it is pending (awaiting a decision) or running.
+        # Finished requests leave both (their call_fn is dropped) and only a small summary
+        # is kept in the bounded history (AILYS_APPROVAL_HISTORY, default 500).
+        self._pending: Dict[int, ApprovalRequest] = {}   # insertion-ordered = FIFO
+        self._running: Dict[int, ApprovalRequest] = {}
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=_history_depth())
+        self._counts: Dict[str, int] = {
+            "submitted": 0, "approved": 0, "failed": 0, "denied": 0, "dryrun": 0, "auto": 0,
+            "policy_approved": 0, "policy_denied": 0, "groups": 0, "group_calls": 0,
+        }
         self._next_id = 1
         self._auto_approve_count = 0
         self._lock = threading.RLock()
-
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._exec_counts: Dict[str, Dict[str, int]] = {}
+        self._stats = _QueueStats()
 
     # -------- public API -----------------------------------------------------
 
@@ -57,119 +333,366 @@ class ApprovalQueue:
         description: str,
         call_fn: Callable[[], Any],
         timeout: Optional[float] = None,  # seconds; None = wait forever in manual mode
+        kind: Optional[str] = None,       # "llm" | "http" | "task" (executor pool once approved)
+        meta: Optional[Dict[str, Any]] = None,  # provider/model/tokens for approval policies
+        spec: Optional[Dict[str, Any]] = None,  # {"replayer": "core.x:fn", "args": {...}} → survives restarts
     ) -> Optional[object]:
         """
         Returns the call result on success, or None if denied/dryrun/failed.
         In manual mode, will block until approved/denied (or until timeout).
         """
+        # Inside an approval group: the group's ticket covers this call (no queue, no per-call log line)
+        grp = _current_group.get()
+        if grp is not None and grp.covers():
+            return grp.run(description, call_fn, kind, meta)
+
         mode = self._mode
         print(f"[request_approval] mode={self._mode} queue_id={id(self)} desc={description!r}")
 
-        # Fast paths: auto / dryrun
+        # Replay of an already-approved request: its own sub-requests need no new click
+        pre = getattr(_worker_state, "preapproved", None)
+        if pre is not None:
+            try:
+                return call_fn(pre) if pre else call_fn()
+            except BaseException:
+                return None
+
+        # Fast path: auto
         if mode == "auto":
             try:
                 print("[request_approval] AUTO mode → executing immediately (no queue)")
+                with self._lock:
+                    self._counts["auto"] += 1
 
-                return call_fn()
+                t0 = time.perf_counter()
+                result = call_fn()
+                self._observe(kind or _DEFAULT_KIND, time.perf_counter() - t0)
+                return result
             except BaseException as e:
                 # mirror manual behavior: return None when something goes wrong
                 # (error is still captured in the manual path)
                 return None
 
+        req = self.submit(description, call_fn, kind=kind, meta=meta, spec=spec)
+        if not req.done():
+            print(f"[request_approval] waiting (timeout={timeout}) for id={req.id}")
+        if req.inline:
+            # wake on approval (handoff → run it here) or on denial
+            futures_wait([req.future, req.handoff], timeout=timeout, return_when=FIRST_COMPLETED)
+            with self._lock:
+                run_here = req.handoff.done() and not req.future.done()
+                if not run_here and not req.future.done():
+                    req.inline = False  # giving up; a late approval runs it on the pool instead
+            if run_here:
+                self._execute_request(req)
+            if not req.future.done():
+                return None
+        try:
+            # Event-driven: the thread sleeps until this request is resolved (one wake-up)
+            req.future.result(timeout=timeout)
+        except FuturesTimeout:
+            return None
+
+        if req.approved:
+            print(f"[request_approval] woke: id={req.id} approved={req.approved} error={req.error}")
+
+            return req.result
+        return None
+
+    def submit(self, description: str, call_fn: Callable[[], Any], kind: Optional[str] = None,
+               meta: Optional[Dict[str, Any]] = None, spec: Optional[Dict[str, Any]] = None) -> ApprovalRequest:
+        """
+        Non-blocking request_approval(): enqueue and return the ApprovalRequest at once.
+        Wait on req.future (or wait_many) for the outcome. In auto mode the call runs
+        immediately and the returned request is already resolved (it is not listed).
+        """
+        mode = self._mode
+        kind = (kind or _DEFAULT_KIND).strip().lower()
+        if mode == "auto":
+            req = ApprovalRequest(id=0, description=description, call_fn=call_fn, claimed=True, kind=kind)
+            with self._lock:
+                self._counts["auto"] += 1
+            self._execute_request(req)
+            return req
+
         if mode == "dryrun":
             # track but don't execute
-            req = self._enqueue(description, call_fn)
-            print(f"[request_approval] DRYRUN mode → enqueued id={req.id}, pending={len(self.get_pending_requests())}")
+            req = self._enqueue(description, call_fn, kind)
+            print(f"[request_approval] DRYRUN mode → enqueued id={req.id}, pending={len(self._pending)}")
 
+            self._claim(req)
             req.approved = False  # not executed
-            return None
+            self._finish(req, "dryrun")
+            return req
 
-        # Manual mode (with optional N-requests auto-approve burst)
+        # Manual mode: approval policies first, then the optional N-requests auto-approve burst
+        decision = approval_policy.evaluate(kind, description, meta)
+        run_now = False
+        journal = False
         with self._lock:
-            req = self._enqueue(description, call_fn)
-            print(f"[request_approval] MANUAL enqueued id={req.id} pending={len(self.get_pending_requests())}")
-
-            if self._auto_approve_count > 0:
+            req = self._enqueue(description, call_fn, kind)
+            req.meta = dict(meta or {})
+            print(f"[request_approval] MANUAL enqueued id={req.id} pending={len(self._pending)}")
+
+            if decision.action != "manual":
+                self._claim(req)
+                req.policy = f"{decision.policy_set}:{decision.rule}"
+                run_now = decision.action == "approve"
+                self._counts["policy_approved" if run_now else "policy_denied"] += 1
+                print(f"[request_approval] policy {req.policy} → {decision.action} id={req.id}")
+            elif self._auto_approve_count > 0:
                 self._auto_approve_count -= 1
-                return self._execute_request(req)
-
-        # Block until approved or denied (or timeout)
-        with req.condition:
-            print(f"[request_approval] waiting on condition (timeout={timeout}) for id={req.id}")
-            # wait until approved is no longer None, or until timeout expires
-            if timeout is None:
-                while req.approved is None:
-                    req.condition.wait(timeout=0.25)
-            else:
-                # bounded wait with small slices so we can be notified
-                end = time.time() + float(timeout)
-                while req.approved is None and time.time() < end:
-                    req.condition.wait(timeout=0.25)
+                self._claim(req)
+                run_now = True
+            elif spec and approval_store.enabled():
+                # waiting for a human: give it a store id before anyone can claim it, so
+                # its decision is recorded however it races the journal write below
+                req.store_id = uuid.uuid4().hex
+                journal = True
+        if journal:
+            # SQLite I/O stays outside the queue lock; a restarted process can approve it
+            self._journal(req, spec)
+        if run_now:
+            self._dispatch(req)
+        elif decision.action == "deny":
+            req.approved = False
+            self._finish(req, "denied")
+        return req
 
-        if req.approved:
-            print(f"[request_approval] woke: id={req.id} approved={req.approved} error={req.error}")
+    def group(self, description: str, **kwargs) -> ApprovalGroup:
+        """One approval for many calls; see ApprovalGroup."""
+        return ApprovalGroup(self, description, **kwargs)
 
-            return req.result
-        return None
+    def _record_group(self, grp: ApprovalGroup) -> None:
+        summ = grp.summary()
+        with self._lock:
+            self._counts["groups"] += 1
+            self._counts["group_calls"] += summ["calls"]
+            self._history.append({"id": None, "description": f"[group] {grp.description}", "kind": grp.kind or _DEFAULT_KIND,
+                                  "outcome": "group", "policy": None, "error": None,
+                                  "calls": summ["calls"], "errors": summ["errors"]})
+
+    def restore(self) -> int:
+        """
+        Re-offer requests left open by a previous process (approval store). They come
+        back as pending "[restored]" requests; approving one replays its spec.
+        """
+        store = approval_store.get_store()
+        if store is None:
+            return 0
+        rows = store.claim_open()
+        for row in rows:
+            spec = row["spec"]
+            label = "[restored, interrupted]" if row["interrupted"] else "[restored]"
+            with self._lock:
+                req = self._enqueue(f"{label} {row['description']}", functools.partial(_replay, spec),
+                                    row["kind"] or _DEFAULT_KIND)
+                req.meta = dict(row["meta"] or {})
+                req.store_id = row["store_id"]
+        if rows:
+            print(f"[approval_queue] restored {len(rows)} request(s) from {store.path}")
+        return len(rows)
+
+    def wait_many(
+        self,
+        requests: Iterable[Union[ApprovalRequest, int]],
+        timeout: Optional[float] = None,
+        return_when: str = ALL_COMPLETED,
+    ) -> Tuple[List[ApprovalRequest], List[ApprovalRequest]]:
+        """
+        Block until the given requests (objects or ids) are resolved: all of them by
+        default, or the first one with return_when=FIRST_COMPLETED. Returns (done, pending).
+        """
+        reqs = [r if isinstance(r, ApprovalRequest) else self._find_request(r) for r in requests]
+        reqs = [r for r in reqs if r is not None]
+        by_future = {id(r.future): r for r in reqs}
+        done, pending = futures_wait([r.future for r in reqs], timeout=timeout, return_when=return_when)
+        return [by_future[id(f)] for f in done], [by_future[id(f)] for f in pending]
 
     def get_pending_requests(self) -> List[ApprovalRequest]:
-        pend = [r for r in self._requests if r.approved is None]
-#        print(f"[get_pending] pending={len(pend)} total={len(self._requests)} queue_id={id(self)}")
-        return pend
+        with self._lock:
+            return list(self._pending.values())
 
-    def approve_request(self, request_id: int, overrides: Optional[dict] = None) -> Optional[object]:
-        req = self._find_request(request_id)
-        if req and req.approved is None:
-            with req.condition:
-                # attach overrides and execute
-                req.overrides = overrides or None
-                result = self._execute_request(req)
-                req.condition.notify()
-            return result
-        return None
+    def summary(self) -> Dict[str, Any]:
+        """O(1) counters for the GUI timer: pending/running now, plus lifetime outcomes."""
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+            out.update(pending=len(self._pending), running=len(self._running), history=len(self._history))
+            return out
 
-    def approve_batch(self, count: int):
-        """Immediately executes up to `count` queued items (manual convenience)."""
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent finished requests (summaries only), newest last."""
         with self._lock:
-            self._auto_approve_count = max(0, int(count))
-        while not self._queue.empty() and count > 0:
-            req = self._queue.get()
-            if req.approved is None:
-                self._execute_request(req)
-                with req.condition:
-                    req.condition.notify()
-            count -= 1
+            items = list(self._history)
+        return items[-limit:] if limit else items
 
-    def approve_all_pending(self):
-        self.approve_batch(len(self.get_pending_requests()))
+    def metrics(self, *, buckets: bool = False) -> Dict[str, Any]:
+        """Queue depth, throughput, and wait/dispatch/exec p50/p95 per kind, plus outcome counters."""
+        with self._lock:
+            out = self._stats.snapshot(len(self._pending), len(self._running), buckets=buckets)
+            out["outcomes"] = dict(self._counts)
+        out["executors"] = self.executor_stats()
+        return out
+
+    def export_metrics(self, dest: Union[str, Path]) -> Path:
+        """Write metrics (with histogram buckets) to dest; a directory gets a timestamped file."""
+        dest = Path(dest)
+        if dest.suffix.lower() != ".json":
+            dest.mkdir(parents=True, exist_ok=True)
+            dest = dest / f"approval_metrics_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json"
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_text(json.dumps(self.metrics(buckets=True), ensure_ascii=False, indent=2), encoding="utf-8")
+        return dest
+
+    def approve_request(self, request_id: int, overrides: Optional[dict] = None,
+                        wait: bool = True) -> Optional[object]:
+        """
+        Hand the request to its kind's worker pool. With wait=True (the GUI's approve
+        thread) block until it finishes and return its result; wait=False returns at once.
+        """
+        req = self._find_request(request_id)
+        if req is None or not self._claim(req):
+            return None
+        req.overrides = overrides or None
+        self._dispatch(req)
+        if not wait:
+            return None
+        req.future.result()
+        return req.result
+
+    def approve_batch(self, count: int, wait: bool = False) -> List[ApprovalRequest]:
+        """
+        Approve up to `count` queued items; they execute concurrently on the worker pools
+        (bounded per kind). Returns the dispatched requests; wait=True blocks until all finish.
+        """
+        count = max(0, int(count))
+        dispatched: List[ApprovalRequest] = []
+        with self._lock:
+            for req in list(self._pending.values())[:count]:
+                if self._claim(req):
+                    dispatched.append(req)
+            # whatever is left auto-approves the next requests to arrive
+            self._auto_approve_count = count - len(dispatched)
+        for req in dispatched:
+            self._dispatch(req)
+        if wait and dispatched:
+            self.wait_many(dispatched)
+        return dispatched
+
+    def approve_all_pending(self, wait: bool = False) -> List[ApprovalRequest]:
+        return self.approve_batch(len(self._pending), wait=wait)
+
+    def executor_stats(self) -> Dict[str, Dict[str, int]]:
+        """Per kind: worker limit, calls running, approved calls waiting for a worker, finished."""
+        with self._lock:
+            return {k: dict(v) for k, v in self._exec_counts.items()}
 
     def deny_request(self, request_id: int) -> bool:
         req = self._find_request(request_id)
-        if req and req.approved is None:
-            req.approved = False
-            with req.condition:
-                req.condition.notify()
-            return True
-        return False
+        if req is None or not self._claim(req):
+            return False
+        req.approved = False
+        self._finish(req, "denied")
+        return True
 
     # -------- internals ------------------------------------------------------
 
-    def _enqueue(self, description: str, call_fn: Callable[[Optional[dict]], Any]) -> ApprovalRequest:
+    def _enqueue(self, description: str, call_fn: Callable[[Optional[dict]], Any],
+                 kind: str = _DEFAULT_KIND) -> ApprovalRequest:
         with self._lock:
             request = ApprovalRequest(
                 id=self._next_id,
                 description=description,
-                call_fn=call_fn
+                call_fn=call_fn,
+                kind=kind,
+                inline=bool(getattr(_worker_state, "active", False)),
             )
             self._next_id += 1
-            self._requests.append(request)
-            self._queue.put(request)
-            print(f"[enqueue] ++ id={request.id} total={len(self._requests)} pending={len([r for r in self._requests if r.approved is None])}")
+            self._pending[request.id] = request
+            self._counts["submitted"] += 1
+            self._stats.enqueued(len(self._pending))
+            print(f"[enqueue] ++ id={request.id} total={self._counts['submitted']} pending={len(self._pending)}")
 
             return request
 
+    def _claim(self, request: ApprovalRequest) -> bool:
+        """Atomically take ownership of a pending request (exactly one executor/denier wins)."""
+        with self._lock:
+            if request.claimed or request.approved is not None:
+                return False
+            request.claimed = True
+            request.decided_at = time.time()
+            if self._pending.pop(request.id, None) is not None:
+                self._running[request.id] = request
+        if request.store_id:
+            self._store_status(request, "running")
+        return True
+
+    def _finish(self, request: ApprovalRequest, outcome: str) -> None:
+        """Resolve the waiter's future once, then retire the request from the registry."""
+        with self._lock:
+            if request.finished_at is None:
+                request.finished_at = time.time()
+                if outcome != "dryrun":
+                    self._stats.record(request)
+            if self._running.pop(request.id, None) is not None or self._pending.pop(request.id, None) is not None:
+                if outcome != "auto":
+                    self._counts[outcome] += 1
+                self._history.append({
+                    "id": request.id,
+                    "description": request.description,
+                    "kind": request.kind,
+                    "outcome": outcome,
+                    "policy": request.policy,
+                    "error": repr(request.error) if request.error is not None else None,
+                })
+            # the closure (and anything it captured) is no longer needed; the waiter keeps the result
+            request.call_fn = None
+        if request.store_id:
+            self._store_status(request, outcome, repr(request.error) if request.error is not None else None,
+                               result=request.result if outcome == "approved" else None)
+        if not request.future.done():
+            request.future.set_result(request.result)
+
+    def _executor(self, kind: str) -> ThreadPoolExecutor:
+        with self._lock:
+            ex = self._executors.get(kind)
+            if ex is None:
+                workers = _kind_workers(kind)
+                ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"approval-{kind}",
+                                        initializer=_mark_worker)
+                self._executors[kind] = ex
+                self._exec_counts[kind] = {"workers": workers, "queued": 0, "running": 0, "finished": 0}
+            return ex
+
+    def _dispatch(self, request: ApprovalRequest) -> None:
+        """Start an approved (claimed) request; results/errors reach the waiter via its future."""
+        with self._lock:
+            if request.inline:
+                request.handoff.set_result(True)
+                return
+        ex = self._executor(request.kind)
+        counts = self._exec_counts[request.kind]
+        with self._lock:
+            counts["queued"] += 1
+
+        def _run():
+            with self._lock:
+                counts["queued"] -= 1
+                counts["running"] += 1
+            try:
+                self._execute_request(request)
+            finally:
+                with self._lock:
+                    counts["running"] -= 1
+                    counts["finished"] += 1
+
+        ex.submit(_run)
+
     def _execute_request(self, request: ApprovalRequest):
         print(f"[execute] -> id={request.id} approved={request.approved} (before) queue_id={id(self)}")
+        request.started_at = time.time()
 
         try:
             # Always call the function with a single optional overrides argument
@@ -180,10 +703,55 @@ class ApprovalQueue:
             request.approved = False
         print(f"[execute] <- id={request.id} approved={request.approved} error={request.error}")
 
-        return request.result
+        result = request.result
+        self._finish(request, "auto" if request.id == 0 else ("approved" if request.approved else "failed"))
+        return result
+
+    def _observe(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._stats.executed(kind, seconds)
+
+    def _journal(self, request: ApprovalRequest, spec: Dict[str, Any]) -> None:
+        """Write the request's row (add() keeps any status _claim/_finish already stored)."""
+        try:
+            store = approval_store.get_store()
+            if store is not None:
+                store.add(request.store_id, request.description, request.kind, spec, request.meta)
+        except Exception as e:
+            print(f"[approval_queue] store error (request kept in memory only): {e}")
+
+    def _store_status(self, request: ApprovalRequest, status: str, error: Optional[str] = None,
+                      result: Any = None) -> None:
+        try:
+            store = approval_store.get_store()
+            if store is not None:
+                store.set_status(request.store_id, status, error, result=result)
+        except Exception as e:
+            print(f"[approval_queue] store status error: {e}")
 
     def _find_request(self, request_id: int) -> Optional[ApprovalRequest]:
-        return next((r for r in self._requests if r.id == request_id), None)
+        with self._lock:
+            return self._pending.get(request_id) or self._running.get(request_id)
+
+
+def _mark_worker() -> None:
+    _worker_state.active = True
+
+
+@contextmanager
+def preapproved(overrides: Optional[Dict[str, Any]] = None):
+    """Requests made by this thread inside the block run at once (with these overrides)."""
+    prev = getattr(_worker_state, "preapproved", None)
+    _worker_state.preapproved = dict(overrides or {})
+    try:
+        yield
+    finally:
+        _worker_state.preapproved = prev
+
+
+def _replay(spec: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Any:
+    with preapproved(overrides):
+        return approval_store.replay(spec, overrides)
 
 
 # --- Hard singleton wiring (module-global) -----------------------------------
@@ -196,11 +764,22 @@ else:
     approval_queue = ApprovalQueue()
     setattr(_sys.modules[__name__], "_GLOBAL_APPROVAL_QUEUE", approval_queue)
 
-def request_approval(description: str, call_fn: Callable[[], Any], timeout: Optional[float] = None) -> Optional[object]:
-    return approval_queue.request_approval(description, call_fn, timeout=timeout)
+def request_approval(description: str, call_fn: Callable[[], Any], timeout: Optional[float] = None,
+                     kind: Optional[str] = None, meta: Optional[Dict[str, Any]] = None,
+                     spec: Optional[Dict[str, Any]] = None) -> Optional[object]:
+    return approval_queue.request_approval(description, call_fn, timeout=timeout, kind=kind, meta=meta, spec=spec)
 
 # === Ailys patch: module-level re-exports for GUI/use (START) ===
 
+def submit_approval(description: str, call_fn: Callable[[], Any], kind: Optional[str] = None,
+                    meta: Optional[Dict[str, Any]] = None) -> ApprovalRequest:
+    """Enqueue without blocking; see ApprovalQueue.submit."""
+    return approval_queue.submit(description, call_fn, kind=kind, meta=meta)
+
+def wait_many(requests, timeout: Optional[float] = None, return_when: str = ALL_COMPLETED):
+    """Wait on several approvals at once; see ApprovalQueue.wait_many."""
+    return approval_queue.wait_many(requests, timeout=timeout, return_when=return_when)
+
 def get_pending_requests() -> List[ApprovalRequest]:
     """Return the list of pending ApprovalRequest objects."""
     return approval_queue.get_pending_requests()
@@ -224,13 +803,54 @@ def deny_request(request_id: int) -> bool:
     """Deny a specific pending request by id (does not execute the call)."""
     return approval_queue.deny_request(request_id)
 
-def approve_batch(count: int) -> None:
-    """Approve/execute up to count pending requests (manual convenience)."""
-    return approval_queue.approve_batch(count)
+def approve_batch(count: int, wait: bool = False) -> List[ApprovalRequest]:
+    """Approve up to count pending requests; they run concurrently on the worker pools."""
+    return approval_queue.approve_batch(count, wait=wait)
+
+def approve_all_pending(wait: bool = False) -> List[ApprovalRequest]:
+    """Approve all pending requests (concurrent execution)."""
+    return approval_queue.approve_all_pending(wait=wait)
+
+def group(description: str, *, count: Optional[int] = None, tokens: Optional[int] = None,
+          cost_usd: Optional[float] = None, kind: Optional[str] = None, limit: Optional[int] = None,
+          meta: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> ApprovalGroup:
+    """Open an approval group: `with approvals.group("Collect", count=n, kind="http") as g:`."""
+    return approval_queue.group(description, count=count, tokens=tokens, cost_usd=cost_usd, kind=kind,
+                                limit=limit, meta=meta, timeout=timeout)
+
+def approval_scope() -> str:
+    """
+    Who would approve a request made here: queue mode, open group ticket, replay.
+    Callers that share work between requests (single-flight) only share within one scope.
+    """
+    grp = _current_group.get()
+    group_id = id(grp) if grp is not None and grp.covers() else 0
+    pre = getattr(_worker_state, "preapproved", None)
+    return f"{approval_queue.get_mode()}|group={group_id}|pre={'' if pre is None else json.dumps(pre, sort_keys=True, default=str)}"
+
+def restore_pending() -> int:
+    """Bring back requests a previous process left waiting (see ApprovalQueue.restore)."""
+    return approval_queue.restore()
+
+def summary() -> Dict[str, Any]:
+    """O(1) counters (pending/running/approved/denied/...) for the GUI."""
+    return approval_queue.summary()
+
+def history(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Summaries of recently finished requests (bounded by AILYS_APPROVAL_HISTORY)."""
+    return approval_queue.history(limit)
+
+def executor_stats() -> Dict[str, Dict[str, int]]:
+    """Per-kind worker pool counters (workers/queued/running/finished)."""
+    return approval_queue.executor_stats()
+
+def metrics(buckets: bool = False) -> Dict[str, Any]:
+    """Queue depth, throughput and per-kind wait/exec percentiles (see ApprovalQueue.metrics)."""
+    return approval_queue.metrics(buckets=buckets)
 
-def approve_all_pending() -> None:
-    """Approve/execute all pending requests."""
-    return approval_queue.approve_all_pending()
+def export_metrics(dest: Union[str, Path]) -> Path:
+    """Write approval-queue metrics JSON into a run folder (or to a .json path)."""
+    return approval_queue.export_metrics(dest)
 
 # === Ailys patch: module-level re-exports for GUI/use (END) ===
 
@@ -242,7 +862,8 @@ def _debug_id() -> str:
 def _debug_counts() -> str:
     """Return sizes for quick checks from GUI/task."""
     try:
-        return f"requests={len(approval_queue._requests)} pending={len([r for r in approval_queue._requests if r.approved is None])}"
+        s = approval_queue.summary()
+        return f"requests={s['submitted']} pending={s['pending']} running={s['running']}"
     except Exception as e:
         return f"error={e!r}"
 
@@ -0,0 +1,254 @@
+# core/approval_store.py
+"""
+SQLite journal of approval requests that carry a replayable call spec.
+- A spec is plain data, never a closure: {"replayer": "core.module:function", "args": {...}}.
+  After approval the replayer is called as fn(args, overrides).
+- Rows follow their request: pending → running → approved / failed / denied. Rows still
+  pending (or running when their process died) are offered again by
+  ApprovalQueue.restore() in the next process, so a restarted GUI can list, approve
+  and resume them. Rows are owned by a per-process token (not the pid, which
+  containers reuse), so a new process never mistakes an old row for its own.
+- Ownership is a lease: the owning process touches updated_at on its open rows every
+  AILYS_APPROVAL_LEASE_SEC / 3 (default 120 s lease), and claim_open() only takes rows
+  whose lease ran out, inside one write transaction; two live processes sharing the
+  store never take each other's requests, and two restarting ones never both take a row.
+- add() and set_status() are upserts that never undo each other, so a request's row can
+  be written after it was decided (the queue journals outside its lock).
+- An approved row keeps its call's result (JSON; non-JSON values as str), so a
+  replayed call's output is readable with get() whether or not the response cache
+  (AILYS_CACHE, off by default) is on; the lit tasks' checkpoint CSVs pick up the
+  replayed work when the task itself is re-run.
+- Finished rows are purged after AILYS_APPROVAL_STORE_DAYS (default 14).
+- WAL, one connection per thread (like response_cache).
+"""
+
+from __future__ import annotations
+import dataclasses
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+DDL = """
+PRAGMA journal_mode=WAL;
+
+CREATE TABLE IF NOT EXISTS approvals(
+  store_id TEXT PRIMARY KEY,
+  description TEXT,
+  kind TEXT,
+  spec_json TEXT,
+  meta_json TEXT,
+  status TEXT,
+  error TEXT,
+  pid INTEGER,
+  owner TEXT,
+  result_json TEXT,
+  created_at REAL,
+  updated_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_approvals_status ON approvals(status, created_at);
+"""
+
+OPEN_STATUSES = ("pending", "running")
+DEFAULT_LEASE_SEC = 120.0
+# Identifies this process's rows (pids are reused, e.g. pid 1 in every container).
+OWNER = uuid.uuid4().hex
+# Replayers may only live in the application's own packages.
+_REPLAYER_PACKAGES = ("core.", "tasks.")
+
+
+def resolve_replayer(name: str) -> Callable[[Dict[str, Any], Optional[Dict[str, Any]]], Any]:
+    mod_name, _, fn_name = (name or "").partition(":")
+    if not fn_name or not mod_name.startswith(_REPLAYER_PACKAGES):
+        raise ValueError(f"not a replayer: {name!r}")
+    fn = getattr(importlib.import_module(mod_name), fn_name, None)
+    if not callable(fn):
+        raise ValueError(f"replayer {name!r} not found")
+    return fn
+
+
+def replay(spec: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> Any:
+    return resolve_replayer(spec["replayer"])(dict(spec.get("args") or {}), overrides)
+
+
+def _jsonable(value: Any) -> Any:
+    """Results worth keeping as data: dataclasses (CognitionResult) and HTTP responses."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "status_code") and hasattr(value, "text"):
+        return {"status_code": value.status_code, "url": str(getattr(value, "url", "")), "text": value.text}
+    return value
+
+
+def _lease_sec() -> float:
+    try:
+        return max(1.0, float(os.getenv("AILYS_APPROVAL_LEASE_SEC", str(DEFAULT_LEASE_SEC))))
+    except ValueError:
+        return DEFAULT_LEASE_SEC
+
+
+class ApprovalStore:
+    def __init__(self, path: Path, *, keep_days: float = 14.0, lease_sec: Optional[float] = None):
+        self.path = Path(path)
+        self.lease_sec = float(lease_sec) if lease_sec is not None else _lease_sec()
+        self._local = threading.local()
+        self._heartbeat_started = False
+        self._heartbeat_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("DELETE FROM approvals WHERE status NOT IN (?, ?) AND updated_at < ?",
+                     (*OPEN_STATUSES, time.time() - float(keep_days) * 86400))
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.executescript(DDL)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(approvals)")}
+            for col in ("owner", "result_json"):   # stores created before these columns
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE approvals ADD COLUMN {col} TEXT")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, store_id: str, description: str, kind: str, spec: Dict[str, Any],
+            meta: Optional[Dict[str, Any]] = None) -> None:
+        """Journal a request as pending; if its status was already written, that status stays."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO approvals(store_id, description, kind, spec_json, meta_json, status,"
+            " error, pid, owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', NULL, ?, ?, ?, ?)"
+            " ON CONFLICT(store_id) DO UPDATE SET description = excluded.description, kind = excluded.kind,"
+            " spec_json = excluded.spec_json, meta_json = excluded.meta_json",
+            (store_id, description, kind, json.dumps(spec, ensure_ascii=False, default=str),
+             json.dumps(meta or {}, ensure_ascii=False, default=str), os.getpid(), OWNER, now, now))
+        conn.commit()
+        self._start_heartbeat()
+
+    def set_status(self, store_id: str, status: str, error: Optional[str] = None, result: Any = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        result_json = json.dumps(_jsonable(result), ensure_ascii=False, default=str) if result is not None else None
+        conn.execute("INSERT INTO approvals(store_id, status, error, result_json, pid, owner, created_at, updated_at)"
+                     " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                     " ON CONFLICT(store_id) DO UPDATE SET status = excluded.status, error = excluded.error,"
+                     " result_json = COALESCE(excluded.result_json, result_json), pid = excluded.pid,"
+                     " owner = excluded.owner, updated_at = excluded.updated_at",
+                     (store_id, status, error, result_json, os.getpid(), OWNER, now, now))
+        conn.commit()
+
+    def heartbeat(self) -> int:
+        """Renew the lease on this process's open rows; returns how many were touched."""
+        conn = self._conn()
+        n = conn.execute("UPDATE approvals SET updated_at = ? WHERE owner = ? AND status IN (?, ?)",
+                         (time.time(), OWNER, *OPEN_STATUSES)).rowcount
+        conn.commit()
+        return n
+
+    def _start_heartbeat(self) -> None:
+        with self._heartbeat_lock:
+            if self._heartbeat_started:
+                return
+            self._heartbeat_started = True
+
+        def _beat():
+            while True:
+                time.sleep(self.lease_sec / 3)
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    print(f"[approval_store] heartbeat error: {e}")
+
+        threading.Thread(target=_beat, name="approval-store-heartbeat", daemon=True).start()
+
+    def claim_open(self) -> List[Dict[str, Any]]:
+        """
+        Open rows whose owner stopped renewing its lease, re-owned by this process
+        (oldest first). Select and re-own happen in one write transaction.
+        """
+        conn = self._conn()
+        stale = time.time() - self.lease_sec
+        where = (" WHERE status IN (?, ?) AND spec_json IS NOT NULL"
+                 " AND (owner IS NULL OR (owner != ? AND updated_at < ?))")
+        args = (*OPEN_STATUSES, OWNER, stale)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT store_id, description, kind, spec_json, meta_json, status, created_at"
+                                " FROM approvals" + where + " ORDER BY created_at", args).fetchall()
+            if rows:
+                conn.execute("UPDATE approvals SET status = 'pending', pid = ?, owner = ?, updated_at = ?" + where,
+                             (os.getpid(), OWNER, time.time(), *args))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if rows:
+            self._start_heartbeat()
+        return [{
+            "store_id": r[0], "description": r[1], "kind": r[2], "spec": json.loads(r[3] or "{}"),
+            "meta": json.loads(r[4] or "{}"), "interrupted": r[5] == "running", "created_at": r[6],
+        } for r in rows]
+
+    def list(self, status: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        conn = self._conn()
+        sql = "SELECT store_id, description, kind, status, error, created_at, updated_at FROM approvals"
+        args: tuple = ()
+        if status:
+            sql += " WHERE status = ?"
+            args = (status,)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        cols = ("store_id", "description", "kind", "status", "error", "created_at", "updated_at")
+        return [dict(zip(cols, r)) for r in conn.execute(sql, (*args, int(limit))).fetchall()]
+
+    def get(self, store_id: str) -> Optional[Dict[str, Any]]:
+        """One row, with its spec, meta and (once approved) result."""
+        row = self._conn().execute(
+            "SELECT store_id, description, kind, status, error, spec_json, meta_json, result_json,"
+            " created_at, updated_at FROM approvals WHERE store_id = ?", (store_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "store_id": row[0], "description": row[1], "kind": row[2], "status": row[3], "error": row[4],
+            "spec": json.loads(row[5] or "{}"), "meta": json.loads(row[6] or "{}"),
+            "result": json.loads(row[7]) if row[7] is not None else None,
+            "created_at": row[8], "updated_at": row[9],
+        }
+
+
+_STORE: Optional[ApprovalStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return (os.getenv("AILYS_APPROVAL_STORE", "1") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_store() -> Optional[ApprovalStore]:
+    """Shared store (AILYS_APPROVAL_DB, default memory/cache/approvals.sqlite), or None when disabled."""
+    global _STORE
+    if not enabled():
+        return None
+    path_cfg = (os.getenv("AILYS_APPROVAL_DB", "") or "").strip()
+    if path_cfg:
+        path = Path(path_cfg).expanduser()
+        if not path.is_absolute():
+            path = Path.cwd() / path
+    else:
+        path = Path(__file__).resolve().parent.parent / "memory" / "cache" / "approvals.sqlite"
+    with _STORE_LOCK:
+        if _STORE is None or _STORE.path != path:
+            try:
+                keep = float(os.getenv("AILYS_APPROVAL_STORE_DAYS", "14"))
+            except ValueError:
+                keep = 14.0
+            _STORE = ApprovalStore(path, keep_days=keep)
+        return _STORE
@@ -10,8 +10,16 @@ from __future__ import annotations
 import json
 import traceback
 import os
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout, wait as futures_wait
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
 
 # persistence & memory
 from pathlib import Path
@@ -21,6 +29,9 @@ from memory.memory import save_memory_event
 
 # Always import the module so we share the SAME singleton queue with GUI
 import core.approval_queue as approvals
+from core import backend_pool, cognition_metrics, exchange_archive, llm_clients, token_estimator
+from core.json_stream import JsonItemStream
+from core.single_flight import FlightTimeout, SingleFlight
 
 # ------------------------------ Configuration ------------------------------
 
@@ -39,25 +50,149 @@ import core.approval_queue as approvals
 #   OPENAI_API_KEY         (only required for hosted OpenAI or compatible servers that need a key)
 #   AILYS_DEFAULT_TEMPERATURE (optional float; default 0.3)
 #   AILYS_DEFAULT_MAX_TOKENS  (optional int; provider/model dependent)
+#   AILYS_CACHE               ("1" to enable the on-disk response cache; default off)
+#   AILYS_CACHE_PATH          (SQLite file; default <repo_root>/memory/cache/responses.sqlite)
+#   AILYS_CACHE_MAX_MB        (size cap before LRU eviction; default 256)
+#   AILYS_CACHE_MAX_AGE_DAYS  (entries older than this are dropped; default 30)
+#   AILYS_MAX_CONCURRENCY     (in-flight provider calls per provider; default 4)
+#   AILYS_MAX_CONCURRENCY_<PROVIDER>  (per-provider override, e.g. AILYS_MAX_CONCURRENCY_OPENAI_COMPATIBLE)
+#   AILYS_EXCHANGES_FORMAT    ("journal" | "folders" | "both"; default journal)
+#   AILYS_EXCHANGES_ARCHIVE_DAYS (exchange files/run folders/journal segments older than this are archived
+#                              by exchange_archive.compact / tasks/compact_storage; default 14)
+#   AILYS_CONTEXT_WINDOW      (tokens; overrides the per-model window used for preflight sizing)
+#   AILYS_RPM / AILYS_TPM     (client-side requests/tokens per minute per provider+model; 0 = unlimited)
+#   AILYS_RATE_LIMITS         (JSON overrides, e.g. {"openai:gpt-4o-mini": {"rpm": 500, "tpm": 200000}};
+#                              keys tried: "provider:model", "model", "provider", "*")
+#   AILYS_RATE_MAX_RETRIES    (429s retried in place after Retry-After, no new approval; default 3)
+#   AILYS_BASE_URLS           (openai_compatible pool: "url|weight, url" or a JSON list; llm.json may use
+#                              "AILYS_BASE_URLS": [{"url": ..., "weight": 2}, ...]; overrides AILYS_BASE_URL)
+#   AILYS_POOL_EJECT_AFTER    (consecutive backend failures before ejection; default 3)
+#   AILYS_POOL_EJECT_SEC      (first ejection cool-down, doubles per repeat; default 30)
+#   AILYS_STRUCTURED_MODE     ("json_schema" | "json_object" | "off"; ask_structured() response_format;
+#                              default json_schema for openai, json_object for openai_compatible)
+#   AILYS_SINGLE_FLIGHT       ("0" to stop coalescing identical concurrent ask() calls; default on)
+#   AILYS_HEDGE               ("1" to hedge slow calls with a duplicate request; default off)
+#   AILYS_HEDGE_PERCENTILE    (hedge after this latency percentile of recent calls; default 95)
+#   AILYS_HEDGE_DELAY_SEC     (delay used until enough samples exist; default 10)
+#   AILYS_HEDGE_MIN_SAMPLES   (recent calls needed before the percentile is trusted; default 20)
+#   AILYS_HEDGE_MODEL         (model for the duplicate when there is no second backend)
 
 _CONFIG_FILE = os.path.join("config", "llm.json")
 
+# Keys that may come from the environment; the snapshot is rebuilt if any of them change.
+_ENV_PREFIXES = ("AILYS_", "OPENAI_API_KEY")
+
+_CONFIG_LOCK = threading.Lock()
+_UNLOADED = object()
+_FILE_CACHE: Dict[str, Any] = {"mtime": _UNLOADED, "data": {}, "generation": 0}
+_SNAPSHOT: Optional["LLMConfig"] = None
+_SNAPSHOT_KEY: Optional[tuple] = None
+
 def _load_config_file() -> Dict[str, Any]:
+    """Parsed config/llm.json, re-read only when its mtime changes."""
     try:
-        if os.path.exists(_CONFIG_FILE):
-            with open(_CONFIG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+        mtime = os.stat(_CONFIG_FILE).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _CONFIG_LOCK:
+        if mtime == _FILE_CACHE["mtime"]:
+            return _FILE_CACHE["data"]
+        data: Dict[str, Any] = {}
+        if mtime is not None:
+            try:
+                with open(_CONFIG_FILE, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                data = loaded if isinstance(loaded, dict) else {}
+            except Exception:
+                data = {}
+        _FILE_CACHE["mtime"] = mtime
+        _FILE_CACHE["data"] = data
+        _FILE_CACHE["generation"] += 1
+        return data
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """
+    One consistent view of the LLM settings (environment over config/llm.json).
+    Built by config_snapshot(); ask() takes one per call and passes it along.
+    """
+    provider: str
+    model: str
+    base_url: Optional[str]
+    api_key: Optional[str]
+    temperature: float
+    max_tokens: Optional[int]
+    timeout: float
+    values: Dict[str, str]
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        val = self.values.get(key)
+        return val if val else default
+
+def _build_snapshot(file_cfg: Dict[str, Any], env: Dict[str, str]) -> LLMConfig:
+    values: Dict[str, str] = {
+        str(k): (json.dumps(v) if isinstance(v, (dict, list)) else str(v)) for k, v in file_cfg.items() if v
+    }
+    values.update({k: v for k, v in env.items() if v})
+
+    def _get(key: str, default: Optional[str] = None) -> Optional[str]:
+        return values.get(key) or default
+
+    try:
+        timeout = float(_get("AILYS_LLM_TIMEOUT", "60"))
     except Exception:
-        pass
-    return {}
+        timeout = 60.0
+    try:
+        temperature = float(_get("AILYS_DEFAULT_TEMPERATURE", "0.3"))
+    except Exception:
+        temperature = 0.3
+    # Default to 2000 if user hasn't set anything.
+    try:
+        max_tokens = int(_get("AILYS_DEFAULT_MAX_TOKENS", "2000"))
+    except Exception:
+        max_tokens = 2000
+    base_url = (_get("AILYS_BASE_URL", "") or "").strip() or None
+    api_key = (_get("OPENAI_API_KEY", "") or "").strip() or None
+
+    return LLMConfig(
+        provider=(_get("AILYS_PROVIDER", "openai") or "openai").strip().lower(),
+        model=(_get("AILYS_MODEL", "gpt-5") or "gpt-5").strip(),
+        base_url=base_url,
+        api_key=api_key,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        values=values,
+    )
 
-def _cfg(key: str, default: Optional[str] = None) -> Optional[str]:
+def config_snapshot() -> LLMConfig:
+    """
+    Current LLM settings. Cached; rebuilt only when config/llm.json's mtime changes,
+    a relevant environment variable changes, or reload_config() is called.
+    """
+    global _SNAPSHOT, _SNAPSHOT_KEY
     file_cfg = _load_config_file()
-    if key in os.environ and os.environ[key]:
-        return os.environ[key]
-    if key in file_cfg and file_cfg[key]:
-        return str(file_cfg[key])
-    return default
+    env = {k: v for k, v in os.environ.items() if k.startswith(_ENV_PREFIXES)}
+    key = (_FILE_CACHE["generation"], tuple(sorted(env.items())))
+    with _CONFIG_LOCK:
+        if _SNAPSHOT is not None and _SNAPSHOT_KEY == key:
+            return _SNAPSHOT
+        _SNAPSHOT = _build_snapshot(file_cfg, env)
+        _SNAPSHOT_KEY = key
+        return _SNAPSHOT
+
+def reload_config() -> LLMConfig:
+    """Force a re-read of config/llm.json and the environment (Config tab → Save)."""
+    global _SNAPSHOT, _SNAPSHOT_KEY
+    with _CONFIG_LOCK:
+        _FILE_CACHE["mtime"] = _UNLOADED
+        _SNAPSHOT = None
+        _SNAPSHOT_KEY = None
+    llm_clients.invalidate_clients()
+    return config_snapshot()
+
+def _cfg(key: str, default: Optional[str] = None, cfg: Optional[LLMConfig] = None) -> Optional[str]:
+    return (cfg or config_snapshot()).get(key, default)
 
 # --- Model profiles & helpers -------------------------------------------------
 
@@ -80,38 +215,245 @@ def _should_drop_temperature(prov: str, model: str, temperature: Optional[float]
 
 
 def _llm_timeout() -> float:
-    try:
-        return float(_cfg("AILYS_LLM_TIMEOUT", "60"))
-    except Exception:
-        return 60.0
+    return config_snapshot().timeout
 
 def _provider() -> str:
-    return (_cfg("AILYS_PROVIDER", "openai") or "openai").strip().lower()
+    return config_snapshot().provider
 
 def _model() -> str:
-    return (_cfg("AILYS_MODEL", "gpt-5") or "gpt-5").strip()
+    return config_snapshot().model
 
 def _base_url() -> Optional[str]:
-    val = _cfg("AILYS_BASE_URL", None)
-    return val.strip() if isinstance(val, str) and val.strip() else None
+    return config_snapshot().base_url
 
 def _api_key() -> Optional[str]:
-    val = _cfg("OPENAI_API_KEY", None)
-    return val.strip() if isinstance(val, str) and val.strip() else None
+    return config_snapshot().api_key
 
 def _default_temperature() -> float:
+    return config_snapshot().temperature
+
+def _default_max_tokens() -> Optional[int]:
+    return config_snapshot().max_tokens
+
+
+def _build_chat_args(prov: str, model: str, messages: List[Dict[str, Any]],
+                     temp: Optional[float], mx: Optional[int]) -> Dict[str, Any]:
+    """
+    Chat-completions kwargs for this provider/model: applies the temperature policy
+    and picks the right token-limit field.
+    """
+    chat_args: Dict[str, Any] = {
+        "model": model,
+        "messages": messages,
+    }
+    if not _should_drop_temperature(prov, model, temp):
+        chat_args["temperature"] = temp
+    token_param = _token_param_for(prov, model)
+    if mx is not None:
+        chat_args[token_param] = mx
+    return chat_args
+
+
+# --- Per-provider concurrency caps --------------------------------------------
+
+_SLOTS_LOCK = threading.Lock()
+_SLOTS: Dict[str, Any] = {}   # provider -> (limit, BoundedSemaphore)
+
+def _provider_concurrency(prov: str, cfg: Optional[LLMConfig] = None) -> int:
+    key = "AILYS_MAX_CONCURRENCY_" + "".join(ch if ch.isalnum() else "_" for ch in prov.upper())
+    raw = _cfg(key, None, cfg) or _cfg("AILYS_MAX_CONCURRENCY", "4", cfg)
     try:
-        return float(_cfg("AILYS_DEFAULT_TEMPERATURE", "0.3"))
+        return max(1, int(raw))
     except Exception:
-        return 0.3
+        return 4
 
-def _default_max_tokens() -> Optional[int]:
-    # Default to 2000 if user hasn't set anything.
-    v = _cfg("AILYS_DEFAULT_MAX_TOKENS", "2000")
+@contextmanager
+def _provider_slot(prov: str, cfg: Optional[LLMConfig] = None):
+    """
+    Hold one of the provider's in-flight slots for the duration of a network call.
+    Only the HTTP call is gated (not approval waits), so pending approvals never
+    consume capacity. A changed limit takes effect for new calls.
+    """
+    limit = _provider_concurrency(prov, cfg)
+    with _SLOTS_LOCK:
+        cur = _SLOTS.get(prov)
+        if cur is None or cur[0] != limit:
+            cur = (limit, threading.BoundedSemaphore(limit))
+            _SLOTS[prov] = cur
+        sem = cur[1]
+    sem.acquire()
+    try:
+        yield
+    finally:
+        sem.release()
+
+
+# --- Client-side rate scheduling (RPM/TPM) -------------------------------------
+
+_RATE = None
+_RATE_LOCK = threading.Lock()
+
+def _rate_scheduler(cfg: Optional[LLMConfig] = None):
+    global _RATE
+    from core.rate_limiter import RateScheduler
+    with _RATE_LOCK:
+        if _RATE is None:
+            try:
+                burst = float(_cfg("AILYS_RATE_BURST_SEC", "10", cfg))
+            except Exception:
+                burst = 10.0
+            _RATE = RateScheduler(burst_sec=burst)
+        return _RATE
+
+def _rate_limits(prov: str, model: str, cfg: Optional[LLMConfig] = None) -> tuple:
+    """(rpm, tpm) for this provider/model; 0 means unlimited."""
+    def _num(v: Any) -> float:
+        try:
+            return max(0.0, float(v))
+        except Exception:
+            return 0.0
+
+    rpm, tpm = _num(_cfg("AILYS_RPM", "0", cfg)), _num(_cfg("AILYS_TPM", "0", cfg))
+    raw = _cfg("AILYS_RATE_LIMITS", "", cfg)
+    if raw:
+        try:
+            table = json.loads(raw)
+        except Exception:
+            table = {}
+        for k in (f"{prov}:{model}", model, prov, "*"):
+            entry = table.get(k) if isinstance(table, dict) else None
+            if isinstance(entry, dict):
+                rpm = _num(entry.get("rpm", rpm))
+                tpm = _num(entry.get("tpm", tpm))
+                break
+    return rpm, tpm
+
+def _is_rate_limited(e: BaseException) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+def _retry_after_seconds(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
     try:
-        return int(v) if str(v).strip() else 2000
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000.0
+        val = headers.get("retry-after")
+        return float(val) if val else None
     except Exception:
-        return 2000
+        return None
+
+def rate_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth, wait times and 429 counts per provider:model."""
+    return _rate_scheduler().stats()
+
+
+# --- openai_compatible endpoint pool ------------------------------------------
+
+_POOL: Dict[str, Any] = {"key": None, "pool": None}
+_POOL_LOCK = threading.Lock()
+
+def _backend_pool(cfg: Optional[LLMConfig] = None):
+    """The shared BackendPool for AILYS_BASE_URLS, or None when only one endpoint is configured."""
+    spec = _cfg("AILYS_BASE_URLS", None, cfg)
+    backends = backend_pool.parse_backends(spec) if spec else []
+    if not backends:
+        return None
+    try:
+        eject_after = int(_cfg("AILYS_POOL_EJECT_AFTER", "3", cfg))
+        eject_sec = float(_cfg("AILYS_POOL_EJECT_SEC", "30", cfg))
+    except Exception:
+        eject_after, eject_sec = 3, 30.0
+    key = (tuple(backends), eject_after, eject_sec)
+    with _POOL_LOCK:
+        if _POOL["key"] != key:
+            # health/latency history is per pool definition; a config change starts fresh
+            _POOL["pool"] = backend_pool.BackendPool(backends, eject_after=eject_after, eject_sec=eject_sec)
+            _POOL["key"] = key
+            print(f"[cognition:POOL] {len(backends)} backend(s): " + ", ".join(u for u, _ in backends))
+        return _POOL["pool"]
+
+def backend_stats() -> List[Dict[str, Any]]:
+    """Per-backend health, load and latency for the openai_compatible pool ([] if not pooled)."""
+    pool = _backend_pool()
+    return pool.stats() if pool is not None else []
+
+
+# --- Single-flight (coalesce identical in-flight requests) ---------------------
+
+_FLIGHTS = SingleFlight()
+
+def _single_flight_enabled(cfg: Optional[LLMConfig] = None) -> bool:
+    return (_cfg("AILYS_SINGLE_FLIGHT", "1", cfg) or "1").strip().lower() not in ("0", "false", "no", "off")
+
+def single_flight_stats() -> Dict[str, int]:
+    """leaders = calls that went to approval; coalesced = callers that shared a leader's result."""
+    return _FLIGHTS.stats()
+
+
+# --- Hedged requests (tail-latency cutting) -----------------------------------
+
+_LATENCIES: Dict[tuple, Any] = {}
+_LATENCY_LOCK = threading.Lock()
+
+def _record_latency(prov: str, model: str, seconds: float) -> None:
+    from collections import deque
+    with _LATENCY_LOCK:
+        _LATENCIES.setdefault((prov, model), deque(maxlen=500)).append(float(seconds))
+
+def _hedge_settings(cfg: Optional[LLMConfig] = None) -> Dict[str, Any]:
+    def _num(key: str, default: str) -> float:
+        try:
+            return float(_cfg(key, default, cfg))
+        except Exception:
+            return float(default)
+
+    return {
+        "enabled": (_cfg("AILYS_HEDGE", "0", cfg) or "0").strip().lower() in ("1", "true", "yes", "on"),
+        "percentile": min(99.9, max(1.0, _num("AILYS_HEDGE_PERCENTILE", "95"))),
+        "default_delay": max(0.0, _num("AILYS_HEDGE_DELAY_SEC", "10")),
+        "min_samples": int(_num("AILYS_HEDGE_MIN_SAMPLES", "20")),
+        "model": (_cfg("AILYS_HEDGE_MODEL", "", cfg) or "").strip() or None,
+    }
+
+def _hedge_delay(prov: str, model: str, settings: Dict[str, Any]) -> float:
+    """Observed latency percentile for this provider/model, or the configured default."""
+    with _LATENCY_LOCK:
+        samples = sorted(_LATENCIES.get((prov, model)) or ())
+    if len(samples) < max(1, settings["min_samples"]):
+        return settings["default_delay"]
+    idx = min(len(samples) - 1, int(len(samples) * settings["percentile"] / 100.0))
+    return samples[idx]
+
+def _spawn(fn) -> Future:
+    """Run fn on a daemon thread; an abandoned hedge must never block interpreter exit."""
+    fut: Future = Future()
+
+    def _runner():
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=_runner, name="ailys-hedge", daemon=True).start()
+    return fut
+
+def _resp_text(resp: Any) -> str:
+    try:
+        return resp.choices[0].message.content or ""
+    except Exception:
+        return ""
+
+def _resp_usage(resp: Any) -> Optional[Dict[str, Any]]:
+    u = getattr(resp, "usage", None)
+    if u is None:
+        return None
+    return {
+        "prompt_tokens": getattr(u, "prompt_tokens", None),
+        "completion_tokens": getattr(u, "completion_tokens", None),
+        "total_tokens": getattr(u, "total_tokens", None),
+    }
 
 
 # ------------------------------ Result object ------------------------------
@@ -122,6 +464,71 @@ class CognitionResult:
     raw_text: str
     usage: Optional[Dict[str, Any]] = None   # tokens, cost, etc. if available
     provider: str = ""
+    cached: bool = False                     # True when served from the response cache
+
+@dataclass
+class StructuredResult:
+    items: List[Dict[str, Any]]          # every complete, valid item (kept even if the reply was cut off)
+    missing_ids: List[str]               # expected ids with no valid item; re-request only these
+    raw_text: str
+    model_id: str
+    provider: str
+    usage: Optional[Dict[str, Any]] = None
+    finish_reason: Optional[str] = None
+    complete: bool = False               # array closed, nothing missing
+    truncated: bool = False
+    bad_items: int = 0                   # items that failed to parse or lacked required keys
+    cached: bool = False
+
+# --- Response cache (opt-in) -------------------------------------------------
+
+_CACHE = None
+_CACHE_PATH: Optional[Path] = None
+
+def _cache_enabled(cfg: Optional[LLMConfig] = None) -> bool:
+    return str(_cfg("AILYS_CACHE", "0", cfg) or "0").strip().lower() in ("1", "true", "yes", "on")
+
+def _response_cache(cfg: Optional[LLMConfig] = None):
+    """Lazily open the shared cache (re-opened if AILYS_CACHE_PATH changes)."""
+    global _CACHE, _CACHE_PATH
+    from core.response_cache import ResponseCache
+
+    path_cfg = (_cfg("AILYS_CACHE_PATH", "", cfg) or "").strip()
+    if path_cfg:
+        path = Path(path_cfg).expanduser()
+        if not path.is_absolute():
+            path = Path.cwd() / path
+    else:
+        path = Path(__file__).resolve().parent.parent / "memory" / "cache" / "responses.sqlite"
+
+    if _CACHE is None or _CACHE_PATH != path:
+        try:
+            max_mb = float(_cfg("AILYS_CACHE_MAX_MB", "256", cfg))
+        except Exception:
+            max_mb = 256.0
+        try:
+            max_days = float(_cfg("AILYS_CACHE_MAX_AGE_DAYS", "30", cfg))
+        except Exception:
+            max_days = 30.0
+        _CACHE = ResponseCache(path, max_bytes=int(max_mb * 1024 * 1024), max_age_sec=max_days * 86400)
+        _CACHE_PATH = path
+    return _CACHE
+
+def _cache_key_for(prov: str, args: Dict[str, Any]) -> str:
+    from core.response_cache import canonical_key
+    token_param = "max_completion_tokens" if "max_completion_tokens" in args else "max_tokens"
+    extra = {"response_format": args["response_format"]} if args.get("response_format") else None
+    return canonical_key(prov, args.get("model", ""), args.get("messages") or [],
+                         args.get("temperature"), token_param, args.get(token_param), extra)
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and size of the response cache (empty dict if disabled or unavailable)."""
+    if not _cache_enabled():
+        return {}
+    try:
+        return _response_cache().stats()
+    except Exception as e:
+        return {"error": str(e)}
 
 # --- Persistence helpers (full-fidelity exchange logs) ----------------------
 
@@ -144,48 +551,102 @@ def _resolve_exchanges_base() -> Path:
     repo_root = Path(__file__).resolve().parent.parent
     return repo_root / "memory" / "exchanges"
 
+_EXCH_DIRS_MADE: set = set()
+_JOURNAL = None
+_JOURNAL_LOCK = threading.Lock()
+
 def _exchanges_dir() -> Path:
     p = _resolve_exchanges_base()
+    if p not in _EXCH_DIRS_MADE:
+        try:
+            p.mkdir(parents=True, exist_ok=True)
+            _EXCH_DIRS_MADE.add(p)
+            print(f"[cognition:PERSIST] exchanges_dir = {p}  (cwd={Path.cwd()})")
+        except Exception as e:
+            print(f"[cognition:PERSIST] ERROR creating exchanges dir {p}: {e}")
+            print(traceback.format_exc())
+    return p
+
+def _exchanges_format() -> str:
+    """
+    AILYS_EXCHANGES_FORMAT:
+      journal (default) → append-only JSONL segments under <exchanges>/journal
+      folders           → legacy one-JSON-file-per-stage folders
+      both              → write both (handy while migrating tooling)
+    """
+    fmt = (os.getenv("AILYS_EXCHANGES_FORMAT", "journal") or "journal").strip().lower()
+    return fmt if fmt in ("journal", "folders", "both") else "journal"
+
+def _journal():
+    """Shared journal writer (re-created if AILYS_EXCHANGES_DIR changes)."""
+    global _JOURNAL
+    from core.exchange_journal import ExchangeJournal
+
+    base = _exchanges_dir() / "journal"
+    with _JOURNAL_LOCK:
+        if _JOURNAL is None or _JOURNAL.base_dir != base:
+            if _JOURNAL is not None:
+                _JOURNAL.close()
+            try:
+                seg_mb = float(os.getenv("AILYS_JOURNAL_SEGMENT_MB", "64"))
+            except Exception:
+                seg_mb = 64.0
+            fsync = (os.getenv("AILYS_JOURNAL_FSYNC", "1") or "1").strip().lower() not in ("0", "false", "no")
+            try:
+                manifest = exchange_archive.get_manifest(base.parent)
+            except Exception as e:
+                print(f"[cognition:PERSIST] manifest ERROR (journal records not indexed): {e}")
+                manifest = None
+            _JOURNAL = ExchangeJournal(base, segment_max_bytes=int(seg_mb * 1024 * 1024), fsync=fsync,
+                                       manifest=manifest)
+        return _JOURNAL
+
+def journal():
+    """Public handle on the exchange journal (read_call, list_calls, export_call, flush)."""
+    return _journal()
+
+def _next_seq(seq: Optional[List[int]]) -> int:
+    if seq is not None and len(seq) == 1:
+        n = seq[0]
+        seq[0] += 1
+        return n
+    return 0
+
+def _write_json_file(path: Path, payload: Dict[str, Any]) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
     try:
-        p.mkdir(parents=True, exist_ok=True)
+        # manifest row (model/timestamp/description) so listings never reopen the payload
+        exchange_archive.get_manifest(_exchanges_dir()).add(path, payload)
     except Exception as e:
-        print(f"[cognition:PERSIST] ERROR creating exchanges dir {p}: {e}")
-        print(traceback.format_exc())
-    print(f"[cognition:PERSIST] exchanges_dir = {p}  (cwd={Path.cwd()})")
-    return p
+        print(f"[cognition:PERSIST] manifest ERROR ({path.name}): {e}")
+    return str(path.resolve())
 
 def _persist_snapshot(call_id: str, suffix: str, payload: Dict[str, Any], *, run_dir: Optional[Path] = None, seq: Optional[List[int]] = None) -> str:
     """
-    Write a small JSON snapshot for a stage in the lifecycle (queued, preflight, denied, etc.).
-    If run_dir/seq are provided, files are written inside that folder with a 000-, 001-, ... prefix.
-    Otherwise we fall back to the old flat "<utc>_<callid>_<suffix>.json" behavior.
-    Always best-effort; never throws.
+    Record a small snapshot for a stage in the lifecycle (queued, preflight, denied, etc.).
+    Journal format: one queued JSONL record (no disk wait). Folder format: a JSON file inside
+    run_dir with a 000-, 001-, ... prefix (or the old flat "<utc>_<callid>_<suffix>.json").
+    Returns the journal locator or file path. Always best-effort; never throws.
     """
     try:
-        base = _exchanges_dir()
-        ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-
-        if run_dir is None:
-            path = base / f"{ts}_{call_id}_{suffix}.json"
-        else:
-            run_dir.mkdir(parents=True, exist_ok=True)
-            # sequence handling
-            if seq is not None and len(seq) == 1:
-                n = seq[0]
-                seq[0] += 1
+        fmt = _exchanges_format()
+        n = _next_seq(seq)
+        out = ""
+        if fmt in ("journal", "both"):
+            out = _journal().append({
+                "call_id": call_id, "run": run_dir.name if run_dir is not None else None,
+                "seq": n, "kind": "snapshot", "name": suffix, "payload": payload,
+            })
+        if fmt in ("folders", "both"):
+            if run_dir is None:
+                ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+                path = _exchanges_dir() / f"{ts}_{call_id}_{suffix}.json"
             else:
-                n = 0
-            path = run_dir / f"{n:03d}_{suffix}.json"
-
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
-            try:
-                f.flush()
-                os.fsync(f.fileno())
-            except Exception:
-                pass
-        print(f"[cognition:PERSIST] snapshot '{suffix}' → {path}")
-        return str(path.resolve())
+                path = run_dir / f"{n:03d}_{suffix}.json"
+            out = _write_json_file(path, payload)
+        return out
     except Exception as e:
         print(f"[cognition:PERSIST] snapshot ERROR ({suffix}): {e}")
         return ""
@@ -194,33 +655,32 @@ def _persist_snapshot(call_id: str, suffix: str, payload: Dict[str, Any], *, run
 
 def _persist_exchange(record: Dict[str, Any], *, run_dir: Optional[Path] = None, seq: Optional[List[int]] = None, filename_hint: Optional[str] = None) -> str:
     """
-    Write the full exchange record as JSON and return the absolute path.
-    If run_dir/seq are provided, write into that folder with sequence prefix and optional filename_hint.
-    Otherwise fall back to legacy flat naming.
+    Record the full exchange and return where it went (journal locator or absolute path).
+    Folder format writes into run_dir with sequence prefix and optional filename_hint,
+    or falls back to legacy flat naming.
     """
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    sid = uuid.uuid4().hex[:8]
-
-    if run_dir is None:
-        path = _exchanges_dir() / f"{ts}_{sid}.json"
-    else:
-        run_dir.mkdir(parents=True, exist_ok=True)
-        if seq is not None and len(seq) == 1:
-            n = seq[0]
-            seq[0] += 1
-        else:
-            n = 0
-        hint = f"_{filename_hint}" if filename_hint else ""
-        path = run_dir / f"{n:03d}{hint}.json"
-
+    fmt = _exchanges_format()
+    n = _next_seq(seq) if run_dir is not None else 0
+    out = ""
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-        print(f"[cognition:PERSIST] wrote exchange JSON → {path}")
+        if fmt in ("journal", "both"):
+            out = _journal().append({
+                "call_id": record.get("call_id") or "", "run": run_dir.name if run_dir is not None else None,
+                "seq": n, "kind": "exchange", "name": filename_hint or "exchange", "payload": record,
+            })
+        if fmt in ("folders", "both"):
+            if run_dir is None:
+                ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+                path = _exchanges_dir() / f"{ts}_{uuid.uuid4().hex[:8]}.json"
+            else:
+                hint = f"_{filename_hint}" if filename_hint else ""
+                path = run_dir / f"{n:03d}{hint}.json"
+            out = _write_json_file(path, record)
+        print(f"[cognition:PERSIST] exchange → {out}")
     except Exception as e:
-        print(f"[cognition:PERSIST] ERROR writing {path}: {e}")
+        print(f"[cognition:PERSIST] ERROR writing exchange: {e}")
         print(traceback.format_exc())
-    return str(path.resolve())
+    return out
 
 
 def _with_arg(args: Dict[str, Any], key: str, value: Any, *, remove: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -230,6 +690,51 @@ def _with_arg(args: Dict[str, Any], key: str, value: Any, *, remove: Optional[Li
         out.pop(k, None)
     return out
 
+def _approval_meta(prov: str, model: str, messages: List[Dict[str, Any]], mx: Optional[int]) -> Dict[str, Any]:
+    """What approval policies match on: provider, model and the estimated token spend."""
+    return {"provider": prov, "model": model,
+            "tokens": token_estimator.count_message_tokens(messages, model) + (mx or 0)}
+
+
+def _preflight_size(messages: List[Dict[str, Any]], model: str, mx: Optional[int], fn_name: str) -> Optional[int]:
+    """
+    Count prompt tokens locally and clamp the output cap to the model's window before
+    anything is sent. Raises ValueError when the prompt alone cannot fit (known models
+    only; for unknown models the estimate is just logged).
+    """
+    prompt_tokens = token_estimator.count_message_tokens(messages, model)
+    new_mx, room = token_estimator.clamp_max_tokens(prompt_tokens, mx, model)
+    known = token_estimator.has_profile(model)
+    if room <= 0:
+        msg = (f"prompt is ~{prompt_tokens} tokens but {model} has a "
+               f"{token_estimator.context_window(model)}-token context window")
+        if known:
+            raise ValueError(f"{fn_name}(...): {msg}; shorten the input.")
+        print(f"[cognition:PREFLIGHT] {msg} (window not profiled; sending anyway)")
+        return mx
+    if known and new_mx != mx:
+        print(f"[cognition:PREFLIGHT] clamp max_tokens {mx} → {new_mx} (prompt≈{prompt_tokens}, model={model})")
+        return new_mx
+    return mx
+
+def _normalize_messages(messages: Optional[List[Dict[str, str]]], prompt: Optional[str], fn_name: str) -> List[Dict[str, str]]:
+    """Wrap a bare prompt as a user message and validate the chat shape."""
+    if not messages and not prompt:
+        raise ValueError(f"{fn_name}(...): provide either 'messages' or 'prompt'.")
+
+    # Normalize to messages
+    if messages is None:
+        messages = [{"role": "user", "content": str(prompt)}]
+
+    for i, m in enumerate(messages):
+        if not isinstance(m, dict):
+            raise ValueError(f"messages[{i}] is not a dict: {type(m).__name__}")
+        if not isinstance(m.get("role"), str):
+            raise ValueError(f"messages[{i}].role must be a string, got: {m.get('role')!r}")
+        if "content" not in m:
+            raise ValueError(f"messages[{i}] missing 'content'")
+    return messages
+
 # ------------------------------ Public API ---------------------------------
 
 def ask(
@@ -240,38 +745,92 @@ def ask(
     temperature: Optional[float] = None,
     max_tokens: Optional[int] = None,
     timeout: Optional[float] = None,   # approval wait; None = wait forever
+    bypass_cache: bool = False,        # skip the response cache for this call (read and write)
+    hedge: Optional[bool] = None,      # None = AILYS_HEDGE; True/False forces hedging on/off
 ) -> CognitionResult:
     """
     The ONLY function tasks should call.
     - Accepts either 'messages' (chat format) or a single 'prompt' (we wrap as user message).
     - Routes to the configured provider/model.
     - ALWAYS goes through the approval queue before touching network/secrets.
+      (Exception: an identical request already in the opt-in response cache is
+      returned directly; nothing is sent, so there is nothing to approve.)
+    - Identical requests made concurrently share one approval and one provider call
+      (single-flight); every caller gets the same CognitionResult.
     - Returns raw, unmodified model text.
     """
-    if not messages and not prompt:
-        raise ValueError("ask(...): provide either 'messages' or 'prompt'.")
-
-    # Normalize to messages
-    if messages is None:
-        messages = [{"role": "user", "content": str(prompt)}]
-
-    # right after we normalize `messages`
-    for i, m in enumerate(messages):
-        if not isinstance(m, dict):
-            raise ValueError(f"messages[{i}] is not a dict: {type(m).__name__}")
-        if not isinstance(m.get("role"), str):
-            raise ValueError(f"messages[{i}].role must be a string, got: {m.get('role')!r}")
-        if "content" not in m:
-            raise ValueError(f"messages[{i}] missing 'content'")
+    messages = _normalize_messages(messages, prompt, "ask")
+
+    # One config view for the whole call (approval, retries and persistence included)
+    cfg = config_snapshot()
+    prov = cfg.provider
+    mdl = cfg.model
+    temp = cfg.temperature if temperature is None else float(temperature)
+    mx = cfg.max_tokens if max_tokens is None else int(max_tokens)
+    mx = _preflight_size(messages, mdl, mx, "ask")
+
+    # Response cache lookup (no network, no secrets → no approval needed)
+    use_cache = (not bypass_cache) and _cache_enabled(cfg)
+    request_key = None
+    if use_cache:
+        try:
+            request_key = _cache_key_for(prov, _build_chat_args(prov, mdl, messages, temp, mx))
+            hit = _response_cache(cfg).get(request_key)
+        except Exception as e:
+            print(f"[cognition:CACHE] lookup error (ignored): {e}")
+            hit = None
+        if hit is not None:
+            print(f"[cognition:CACHE] hit key={request_key[:12]} model={hit['model']} len(raw_text)={len(hit['raw_text'])}")
+            return CognitionResult(model_id=hit["model"], raw_text=hit["raw_text"], usage=hit["usage"],
+                                   provider=hit["provider"] or prov, cached=True)
+
+    gated = functools.partial(
+        _ask_gated, messages=messages, description=description, temperature=temperature,
+        max_tokens=max_tokens, timeout=timeout, cfg=cfg, temp=temp, mx=mx,
+        use_cache=use_cache, request_key=request_key, hedge=hedge)
+
+    # Single-flight: identical requests already in flight share one approval and one
+    # provider call, but only under the same approval scope (mode, group ticket, replay).
+    # bypass_cache asks for an independent answer, so it never joins.
+    if bypass_cache or not _single_flight_enabled(cfg):
+        return gated()
+    flight_key = request_key or _cache_key_for(prov, _build_chat_args(prov, mdl, messages, temp, mx))
+    flight_key = f"{flight_key}|{approvals.approval_scope()}"
+    try:
+        result, shared = _FLIGHTS.do(flight_key, gated, timeout=timeout)
+    except FlightTimeout:
+        # same outcome as an approval wait that timed out
+        print(f"[cognition:FLIGHT] gave up waiting for in-flight request after {timeout}s ({description!r})")
+        raise RuntimeError("Approval declined or failed; no result returned.")
+    if shared:
+        print(f"[cognition:FLIGHT] joined in-flight request key={flight_key[:12]} ({description!r})")
+    return result
 
-    prov = _provider()
-    mdl = _model()
-    base_url = _base_url()
-    api_key = _api_key()
-    temp = _default_temperature() if temperature is None else float(temperature)
-    mx = _default_max_tokens() if max_tokens is None else int(max_tokens)
+def _replay_ask(args: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> CognitionResult:
+    """Approval-store replayer: re-issue a journaled ask() in a later process (already approved)."""
+    return ask(**args)
 
+def _ask_gated(
+    *,
+    messages: List[Dict[str, str]],
+    description: str,
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    timeout: Optional[float],
+    cfg: LLMConfig,
+    temp: float,
+    mx: Optional[int],
+    use_cache: bool,
+    request_key: Optional[str],
+    hedge: Optional[bool],
+) -> CognitionResult:
+    """Approval, provider call(s), retries and persistence for one ask() that missed the cache."""
+    prov = cfg.provider
+    mdl = cfg.model
+    base_url = cfg.base_url
+    api_key = cfg.api_key
     call_id = uuid.uuid4().hex[:8]
+    timer = cognition_metrics.CallTimer(call_id, mdl, description)
 
     # Per-run folder + sequence counter (ensures every artifact for this call stays together)
     run_ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
@@ -284,19 +843,15 @@ def ask(
         "description": description,
         "provider": prov,
         "model": mdl,
-        "base_url": _base_url(),
+        "base_url": base_url,
         "parameters": {"temperature": temperature, "max_tokens": max_tokens},
         "messages_count": len(messages or []),
         "status": "awaiting_approval",
     }, run_dir=run_dir, seq=seq)
 
     def _do_call(overrides: Optional[Dict[str, Any]] = None) -> CognitionResult:
-        # We only import and read keys *inside* the call to respect approval gating.
-        try:
-            from openai import OpenAI
-        except Exception as e:
-            raise RuntimeError(f"OpenAI SDK not available: {e}")
-
+        # We only touch the SDK and keys *inside* the call to respect approval gating.
+        timer.mark("approved")
         # --- Apply approval-time overrides (model, token cap, timeout) -------------
         eff_model = (overrides or {}).get("model", mdl)
         eff_timeout = (overrides or {}).get("timeout", None)
@@ -304,55 +859,161 @@ def ask(
         ov_max_completion_tokens = (overrides or {}).get("max_completion_tokens", None)
         eff_mx = ov_max_tokens if ov_max_tokens is not None else (
             ov_max_completion_tokens if ov_max_completion_tokens is not None else mx)
-
-        # Build client
-        kwargs = {}
-        if prov == "openai_compatible":
-            if base_url:
-                kwargs["base_url"] = base_url
-            if api_key:
-                kwargs["api_key"] = api_key
-        else:
-            if not api_key:
-                raise RuntimeError("OPENAI_API_KEY is not set. Add it in the Config tab.")
-            kwargs["api_key"] = api_key
-
-        if "timeout" not in kwargs:
-            kwargs["timeout"] = eff_timeout if isinstance(eff_timeout, (int, float)) else _llm_timeout()
-
-        # Disable SDK-level retries: approval = one HTTP call
-        kwargs["max_retries"] = 0
-        client = OpenAI(**kwargs)
-
-        # Build chat args using the (possibly overridden) model
-        chat_args: Dict[str, Any] = {
-            "model": eff_model,
-            "messages": messages,
-        }
-
-        # temperature policy
-        if not _should_drop_temperature(prov, eff_model, temp):
-            chat_args["temperature"] = temp
-        else:
+        if eff_model != mdl or eff_mx != mx:
+            eff_mx = _preflight_size(messages, eff_model, eff_mx, "ask")
+
+        # Shared, pooled client (see core.llm_clients); SDK retries stay disabled there.
+        client_timeout = float(eff_timeout) if isinstance(eff_timeout, (int, float)) else cfg.timeout
+        if prov != "openai_compatible" and not api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set. Add it in the Config tab.")
+        client_base_url = base_url if prov == "openai_compatible" else None
+
+        # Build chat args using the (possibly overridden) model; temperature policy and
+        # token-limit field are re-evaluated for eff_model.
+        chat_args = _build_chat_args(prov, eff_model, messages, temp, eff_mx)
+        if "temperature" not in chat_args:
             print("[cognition:CALL] dropping temperature per model profile")
 
-        # token-limit field per model (re-evaluated for eff_model)
-        token_param = _token_param_for(prov, eff_model)
-        if eff_mx is not None:
-            chat_args[token_param] = eff_mx
-        if token_param == "max_completion_tokens":
-            chat_args.pop("max_tokens", None)
-        else:
-            chat_args.pop("max_completion_tokens", None)
-
         # Diagnostics
-        print(f"[cognition:CALL] provider={prov} model={eff_model} base_url={_base_url() or ''}")
+        print(f"[cognition:CALL] provider={prov} model={eff_model} base_url={base_url or ''}")
         print(f"[cognition:CALL] cwd={Path.cwd()}  exchanges_base={_resolve_exchanges_base()}")
         print(f"[cognition:CALL] id={call_id} messages={len(messages)} "
               f"temp={chat_args.get('temperature', '∅')} "
               f"max_tokens={chat_args.get('max_tokens', '∅')} "
               f"max_completion_tokens={chat_args.get('max_completion_tokens', '∅')}")
 
+        # ---- Transport: rate pacing, backend routing, in-place 429/failover --------
+        def _send(send_args: Dict[str, Any], exclude: Sequence[str] = (),
+                  holder: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+            # Pace against RPM/TPM; a 429 pauses the key for Retry-After and is retried in
+            # place (rate-limited requests are not billed, so no new approval is needed).
+            sent_model = send_args.get("model", eff_model)
+            provided_cap = send_args.get("max_completion_tokens", send_args.get("max_tokens"))
+            est_tokens = token_estimator.count_message_tokens(messages, sent_model) + (
+                provided_cap if isinstance(provided_cap, int) else 0)
+            rpm, tpm = _rate_limits(prov, sent_model, cfg)
+            sched = _rate_scheduler(cfg)
+            try:
+                max_rate_retries = max(0, int(_cfg("AILYS_RATE_MAX_RETRIES", "3", cfg)))
+            except Exception:
+                max_rate_retries = 3
+            rate_wait = 0.0
+            rate_retries = 0
+            # openai_compatible with several endpoints: route by least outstanding requests;
+            # a refused connection never reached a server, so it fails over in place.
+            pool = _backend_pool(cfg) if prov == "openai_compatible" else None
+            tried_backends: List[str] = list(exclude)
+            lease = None
+            while True:
+                rate_wait += sched.acquire(prov, sent_model, est_tokens, rpm=rpm, tpm=tpm)
+                try:
+                    started = time.monotonic()
+                    with ExitStack() as stack:
+                        call_base_url = client_base_url
+                        if pool is not None:
+                            lease = stack.enter_context(pool.lease(exclude=tried_backends))
+                            call_base_url = lease.url
+                            if holder is not None:
+                                holder["url"] = lease.url
+                        stack.enter_context(_provider_slot(prov, cfg))
+                        client = stack.enter_context(
+                            llm_clients.lease_client(prov, call_base_url, api_key, client_timeout))
+                        resp = client.chat.completions.create(**send_args)
+                    _record_latency(prov, sent_model, time.monotonic() - started)
+                    break
+                except Exception as e:
+                    if (pool is not None and lease is not None and backend_pool.is_connect_failure(e)
+                            and len(tried_backends) + 1 < len(pool)):
+                        tried_backends.append(lease.url)
+                        print(f"[cognition:POOL] id={call_id} {lease.url} unreachable ({type(e).__name__}); "
+                              f"failing over")
+                        continue
+                    if not _is_rate_limited(e) or rate_retries >= max_rate_retries:
+                        raise
+                    delay = _retry_after_seconds(e) or min(60.0, 2.0 ** rate_retries)
+                    sched.pause(prov, sent_model, delay)
+                    rate_retries += 1
+                    print(f"[cognition:RATE] id={call_id} 429 from provider; pausing {delay:.1f}s "
+                          f"(retry {rate_retries}/{max_rate_retries})")
+            if rate_wait > 0.05:
+                print(f"[cognition:RATE] id={call_id} waited {rate_wait:.2f}s for rate budget")
+            total = getattr(getattr(resp, "usage", None), "total_tokens", None)
+            sched.settle(prov, sent_model, est_tokens, total)
+            return {"args": send_args, "resp": resp, "lease": lease, "pool": pool,
+                    "rate_wait": rate_wait, "rate_retries": rate_retries,
+                    "tried": [u for u in tried_backends if u not in exclude]}
+
+        hedge_cfg = _hedge_settings(cfg)
+        if hedge is not None:
+            hedge_cfg["enabled"] = bool(hedge)
+        hedge_pool = _backend_pool(cfg) if prov == "openai_compatible" else None
+        hedge_on = hedge_cfg["enabled"] and (bool(hedge_cfg["model"]) or (hedge_pool is not None and len(hedge_pool) > 1))
+
+        def _send_hedged(send_args: Dict[str, Any]) -> Dict[str, Any]:
+            """
+            Send once; if no answer within the hedge delay, send a duplicate to another
+            backend (pool) or to AILYS_HEDGE_MODEL. First success wins. A synchronous SDK
+            call cannot be interrupted, so the loser is abandoned: its result is dropped
+            and journaled (cost stays visible) when it eventually returns.
+            """
+            sent_model = send_args.get("model", eff_model)
+            delay = _hedge_delay(prov, sent_model, hedge_cfg)
+            holder: Dict[str, Any] = {}
+            primary = _spawn(lambda: _send(send_args, holder=holder))
+            try:
+                return dict(primary.result(timeout=delay), hedge={"fired": False, "delay_sec": round(delay, 3)})
+            except FuturesTimeout:
+                pass
+
+            if hedge_cfg["model"] and (hedge_pool is None or len(hedge_pool) < 2):
+                target = hedge_cfg["model"]
+                hedge_args = _build_chat_args(prov, target, messages, temp, eff_mx)
+                exclude: Sequence[str] = ()
+            else:
+                target = "backend"
+                hedge_args = send_args
+                exclude = [holder["url"]] if holder.get("url") else []
+            print(f"[cognition:HEDGE] id={call_id} no reply after {delay:.2f}s; hedging to "
+                  f"{target if target != 'backend' else 'another backend'}")
+            secondary = _spawn(lambda: _send(hedge_args, exclude=exclude))
+            futures = {primary: "primary", secondary: "hedge"}
+
+            done, _ = futures_wait(list(futures), return_when=FIRST_COMPLETED)
+            first = next(iter(done))
+            if first.exception() is not None:
+                other = secondary if first is primary else primary
+                futures_wait([other])
+                winner = other if other.exception() is None else first
+            else:
+                winner = first
+            loser = secondary if winner is primary else primary
+            info = {"fired": True, "delay_sec": round(delay, 3), "winner": futures[winner],
+                    "target": target if target != "backend" else None}
+
+            def _journal_loser(fut, role=futures[loser]):
+                try:
+                    res = fut.result()
+                except BaseException as e:
+                    res = {"error": {"type": type(e).__name__, "message": str(e)}}
+                resp = res.get("resp")
+                lease = res.get("lease")
+                a = res.get("args") or {}
+                _persist_exchange({
+                    "call_id": call_id,
+                    "timestamp_utc": datetime.utcnow().isoformat(),
+                    "description": f"{description} (hedge {role}, abandoned)",
+                    "provider": prov,
+                    "model": a.get("model"),
+                    "base_url": lease.url if lease is not None else base_url,
+                    "raw_text": _resp_text(resp) if resp is not None else "",
+                    "usage": _resp_usage(resp) if resp is not None else None,
+                    "hedge": dict(info, role=role, abandoned=True),
+                    "error": res.get("error"),
+                }, run_dir=run_dir, seq=seq, filename_hint=f"exchange_hedge_{role}")
+
+            loser.add_done_callback(_journal_loser)
+            return dict(winner.result(), hedge=info)
+
         # ---- Helpers for per-attempt logging and execution -----------------------
         def _single_call(attempt_idx: int, args: Dict[str, Any], attempt_tag: str) -> CognitionResult:
             _persist_snapshot(call_id, f"{attempt_tag}_preflight", {
@@ -368,8 +1029,19 @@ def ask(
                 "messages_count": len(messages),
                 "status": "about_to_call"
             }, run_dir=run_dir, seq=seq)
+            timer.mark("preflight")
 
-            resp = client.chat.completions.create(**args)
+            if hedge_on:
+                sent = _send_hedged(args)
+            else:
+                sent = _send(args)
+            args = sent["args"]
+            resp, lease, pool = sent["resp"], sent["lease"], sent["pool"]
+            rate_wait, rate_retries, tried_backends = sent["rate_wait"], sent["rate_retries"], sent["tried"]
+            sent_model = args.get("model", eff_model)
+            provided_cap = args.get("max_completion_tokens", args.get("max_tokens"))
+            timer.mark("response")
+            timer.add("rate_wait", rate_wait)
 
             # --- Extract content (chat.completions) and usage
             # NOTE: If we ever switch endpoints, this code will intentionally expose a "no text but tokens > 0"
@@ -405,7 +1077,6 @@ def ask(
                 top_keys = []
 
             # mark truncation if we hit the configured cap
-            provided_cap = args.get("max_completion_tokens", args.get("max_tokens"))
             if usage and isinstance(usage.get("completion_tokens"), int) and isinstance(provided_cap, int):
                 if usage["completion_tokens"] >= provided_cap:
                     usage["truncated"] = True
@@ -419,6 +1090,7 @@ def ask(
                 _s = str(resp_dump)
             if _s and len(_s) > 2_000_000:
                 resp_dump = {"truncated": True, "note": "response too large to store safely"}
+            timer.mark("serialized")
 
             _persist_exchange({
                 "call_id": call_id,
@@ -427,7 +1099,7 @@ def ask(
                 "description": description,
                 "provider": prov,
                 "model": args.get("model", eff_model),
-                "base_url": _base_url(),
+                "base_url": lease.url if lease is not None else base_url,
                 "parameters": {
                     "temperature": args.get("temperature"),
                     "max_tokens": args.get("max_tokens"),
@@ -437,8 +1109,18 @@ def ask(
                 "response": resp_dump,
                 "raw_text": content,
                 "usage": usage,
+                "rate": {"wait_sec": round(rate_wait, 3), "retries_429": rate_retries},
+                "backend": ({
+                    "url": lease.url,
+                    "latency_sec": lease.latency_sec,
+                    "outstanding_at_start": lease.outstanding_at_start,
+                    "failed_over_from": tried_backends,
+                    "stats": pool.backend_stats(lease.url),
+                } if lease is not None else None),
+                "hedge": sent.get("hedge"),
                 "error": None,
             }, run_dir=run_dir, seq=seq, filename_hint=f"exchange_attempt{attempt_idx}")
+            timer.mark("persisted")
 
 
             raw_out = content if isinstance(content, str) else str(content)
@@ -454,7 +1136,7 @@ def ask(
                     "description": f"{description} (empty-text anomaly record)",
                     "provider": prov,
                     "model": args.get("model", eff_model),
-                    "base_url": _base_url(),
+                    "base_url": base_url,
                     "parameters": {
                         "temperature": args.get("temperature"),
                         "max_tokens": args.get("max_tokens"),
@@ -486,6 +1168,20 @@ def ask(
                     f"Forensics saved to: {last_path}"
                 )
 
+            if use_cache:
+                # Key on what was actually sent; also on the original request when the
+                # model is unchanged (e.g. a retry that only swapped/dropped a parameter).
+                try:
+                    cache = _response_cache(cfg)
+                    sent_model = args.get("model", eff_model)
+                    keys = {_cache_key_for(prov, args)}
+                    if request_key and sent_model == mdl:
+                        keys.add(request_key)
+                    for k in keys:
+                        cache.put(k, provider=prov, model=sent_model, raw_text=raw_out, usage=usage)
+                except Exception as e:
+                    print(f"[cognition:CACHE] store error (ignored): {e}")
+
             print(f"[cognition:RETURN] id={call_id} attempt={attempt_idx} len(raw_text)={len(raw_out)} usage={usage}")
             return CognitionResult(model_id=args.get("model", eff_model), raw_text=raw_out, usage=usage, provider=prov)
 
@@ -516,7 +1212,8 @@ def ask(
                     approved_result = approvals.request_approval(
                         description=retry_desc,
                         call_fn=lambda ov=None: _single_call(attempt, args, tag),
-                        timeout=timeout
+                        timeout=timeout,
+                        kind="llm",
                     )
                     if not approved_result:
                         _persist_snapshot(call_id, f"{tag}_denied_or_failed", {
@@ -547,7 +1244,7 @@ def ask(
                     "description": description,
                     "provider": prov,
                     "model": args.get("model", eff_model),
-                    "base_url": _base_url(),
+                    "base_url": base_url,
                     "parameters": {
                         "temperature": args.get("temperature"),
                         "max_tokens": args.get("max_tokens"),
@@ -655,7 +1352,12 @@ def ask(
     result = request_approval_fn(
         description=f"{description} | provider={prov} model={mdl}",
         call_fn=_do_call,
-        timeout=timeout
+        timeout=timeout,
+        kind="llm",
+        meta=_approval_meta(prov, mdl, messages, mx),
+        spec={"replayer": "core.artificial_cognition:_replay_ask",
+              "args": {"messages": messages, "description": description, "temperature": temperature,
+                       "max_tokens": max_tokens, "hedge": hedge}},
     )
 
     # Record the approval return path (forensics if it returns None)
@@ -670,6 +1372,15 @@ def ask(
     print(f"[cognition:APPROVAL] Approval returned with type="
           f"{type(result).__name__ if result is not None else 'None'}")
 
+    # Per-stage latency spans → in-process histograms + this call's run folder
+    spans = cognition_metrics.REGISTRY.record(timer, "ok" if result else "denied_or_failed")
+    _persist_snapshot(call_id, "metrics", {
+        "timestamp_utc": datetime.utcnow().isoformat(),
+        "description": description,
+        "model": mdl,
+        "spans_sec": spans,
+    }, run_dir=run_dir, seq=seq)
+
     if not result:
         _persist_snapshot(call_id, "denied_or_failed", {
             "timestamp_utc": datetime.utcnow().isoformat(),
@@ -685,11 +1396,447 @@ def ask(
 
     return result
 
+def ask_stream(
+    *,
+    messages: Optional[List[Dict[str, str]]] = None,
+    prompt: Optional[str] = None,
+    description: str = "Artificial cognition request (stream)",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,   # approval wait; None = wait forever
+    bypass_cache: bool = False,
+    response_format: Optional[Dict[str, Any]] = None,  # passed through (JSON / structured output mode)
+    meta: Optional[Dict[str, Any]] = None,             # filled with model/usage/finish_reason at the end
+) -> Iterator[str]:
+    """
+    Streaming variant of ask(): a generator of text deltas as the provider emits them.
+    - Same approval gate: the stream is only opened once the request is approved
+      (the first next() blocks until then).
+    - The full text is persisted with _persist_exchange when the stream ends (or fails).
+    - A response-cache hit is yielded as a single delta.
+    - No automatic parameter-fix retries; use ask() where those matter.
+    """
+    messages = _normalize_messages(messages, prompt, "ask_stream")
+
+    # One config view for the whole call (approval, retries and persistence included)
+    cfg = config_snapshot()
+    prov = cfg.provider
+    mdl = cfg.model
+    base_url = cfg.base_url
+    api_key = cfg.api_key
+    temp = cfg.temperature if temperature is None else float(temperature)
+    mx = cfg.max_tokens if max_tokens is None else int(max_tokens)
+    mx = _preflight_size(messages, mdl, mx, "ask_stream")
+
+    use_cache = (not bypass_cache) and _cache_enabled(cfg)
+    request_key = None
+    if use_cache:
+        try:
+            key_args = _build_chat_args(prov, mdl, messages, temp, mx)
+            if response_format:
+                key_args["response_format"] = response_format
+            request_key = _cache_key_for(prov, key_args)
+            hit = _response_cache(cfg).get(request_key)
+        except Exception as e:
+            print(f"[cognition:CACHE] lookup error (ignored): {e}")
+            hit = None
+        if hit is not None:
+            print(f"[cognition:CACHE] hit (stream) key={request_key[:12]} model={hit['model']}")
+            if meta is not None:
+                meta.update({"model": hit["model"], "provider": hit["provider"] or prov, "usage": hit["usage"],
+                             "finish_reason": "stop", "cached": True})
+            yield hit["raw_text"]
+            return
+
+    call_id = uuid.uuid4().hex[:8]
+    run_ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    run_dir = _exchanges_dir() / f"{run_ts}_{call_id}"
+    seq = [0]
+
+    _persist_snapshot(call_id, "queued", {
+        "timestamp_utc": datetime.utcnow().isoformat(),
+        "description": description,
+        "provider": prov,
+        "model": mdl,
+        "base_url": base_url,
+        "parameters": {"temperature": temperature, "max_tokens": max_tokens},
+        "messages_count": len(messages),
+        "stream": True,
+        "status": "awaiting_approval",
+    }, run_dir=run_dir, seq=seq)
+
+    def _open_stream(overrides: Optional[Dict[str, Any]] = None):
+        # Runs on approval: open the stream and hand it (plus its client lease) to the waiter.
+        eff_model = (overrides or {}).get("model", mdl)
+        eff_timeout = (overrides or {}).get("timeout", None)
+        ov_mx = (overrides or {}).get("max_tokens", (overrides or {}).get("max_completion_tokens", None))
+        eff_mx = ov_mx if ov_mx is not None else mx
+        if eff_model != mdl or eff_mx != mx:
+            eff_mx = _preflight_size(messages, eff_model, eff_mx, "ask_stream")
+
+        if prov != "openai_compatible" and not api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set. Add it in the Config tab.")
+        client_timeout = float(eff_timeout) if isinstance(eff_timeout, (int, float)) else cfg.timeout
+        client_base_url = base_url if prov == "openai_compatible" else None
+
+        args = _build_chat_args(prov, eff_model, messages, temp, eff_mx)
+        args["stream"] = True
+        if response_format:
+            args["response_format"] = response_format
+        if prov == "openai":
+            # usage arrives in a final, choice-less chunk
+            args["stream_options"] = {"include_usage": True}
+
+        cap = args.get("max_completion_tokens", args.get("max_tokens"))
+        rpm, tpm = _rate_limits(prov, eff_model, cfg)
+        est = token_estimator.count_message_tokens(messages, eff_model) + (cap if isinstance(cap, int) else 0)
+        _rate_scheduler(cfg).acquire(prov, eff_model, est, rpm=rpm, tpm=tpm)
+
+        stack = ExitStack()
+        try:
+            pool = _backend_pool(cfg) if prov == "openai_compatible" else None
+            lease = stack.enter_context(pool.lease()) if pool is not None else None
+            if lease is not None:
+                client_base_url = lease.url
+            stack.enter_context(_provider_slot(prov, cfg))
+            client = stack.enter_context(llm_clients.lease_client(prov, client_base_url, api_key, client_timeout))
+            print(f"[cognition:STREAM] id={call_id} provider={prov} model={eff_model}")
+            stream = client.chat.completions.create(**args)
+        except BaseException as e:
+            stack.__exit__(type(e), e, e.__traceback__)
+            raise
+        return {"stream": stream, "stack": stack, "args": args, "lease": lease, "est_tokens": est}
+
+    _persist_snapshot(call_id, "enqueue", {
+        "timestamp_utc": datetime.utcnow().isoformat(),
+        "description": description,
+        "provider": prov,
+        "model": mdl,
+        "status": "enqueue_request"
+    }, run_dir=run_dir, seq=seq)
+
+    opened = approvals.request_approval(
+        description=f"{description} | provider={prov} model={mdl} (stream)",
+        call_fn=_open_stream,
+        timeout=timeout,
+        kind="llm",
+        meta=_approval_meta(prov, mdl, messages, mx),
+    )
+    if not opened or not isinstance(opened, dict):
+        _persist_snapshot(call_id, "denied_or_failed", {
+            "timestamp_utc": datetime.utcnow().isoformat(),
+            "description": description,
+            "provider": prov,
+            "model": mdl,
+            "status": "approval_denied_or_no_result"
+        }, run_dir=run_dir, seq=seq)
+        raise RuntimeError("Approval declined or failed; no stream opened.")
+
+    stream, stack, args, lease = opened["stream"], opened["stack"], opened["args"], opened.get("lease")
+    parts: List[str] = []
+    usage: Optional[Dict[str, Any]] = None
+    finish_reason = None
+    chunks = 0
+    error: Optional[Dict[str, Any]] = None
+    try:
+        for chunk in stream:
+            chunks += 1
+            u = getattr(chunk, "usage", None)
+            if u is not None:
+                usage = {
+                    "prompt_tokens": getattr(u, "prompt_tokens", None),
+                    "completion_tokens": getattr(u, "completion_tokens", None),
+                    "total_tokens": getattr(u, "total_tokens", None),
+                }
+            choices = getattr(chunk, "choices", None) or []
+            if not choices:
+                continue
+            finish_reason = getattr(choices[0], "finish_reason", None) or finish_reason
+            delta = getattr(getattr(choices[0], "delta", None), "content", None)
+            if delta:
+                parts.append(delta)
+                yield delta
+    except BaseException as e:
+        error = {"type": type(e).__name__, "message": str(e), "traceback": traceback.format_exc()}
+        stack.__exit__(type(e), e, e.__traceback__)  # lets the backend pool count the failure
+        raise
+    finally:
+        stack.close()
+        # the TPM bucket was charged the estimate when the stream was opened
+        _rate_scheduler(cfg).settle(prov, args.get("model", mdl), opened.get("est_tokens", 0),
+                                    (usage or {}).get("total_tokens"))
+        raw_out = "".join(parts)
+        if usage and finish_reason == "length":
+            usage["truncated"] = True
+        _persist_exchange({
+            "call_id": call_id,
+            "attempt": 1,
+            "timestamp_utc": datetime.utcnow().isoformat(),
+            "description": description,
+            "provider": prov,
+            "model": args.get("model", mdl),
+            "base_url": lease.url if lease is not None else base_url,
+            "parameters": {
+                "temperature": args.get("temperature"),
+                "max_tokens": args.get("max_tokens"),
+                "max_completion_tokens": args.get("max_completion_tokens"),
+            },
+            "messages": messages,
+            "response": {"streamed": True, "chunks": chunks, "finish_reason": finish_reason},
+            "raw_text": raw_out,
+            "usage": usage,
+            "backend": ({"url": lease.url, "latency_sec": lease.latency_sec,
+                         "outstanding_at_start": lease.outstanding_at_start} if lease is not None else None),
+            "error": error,
+        }, run_dir=run_dir, seq=seq, filename_hint="exchange_stream")
+
+        if use_cache and error is None and finish_reason not in (None, "length") and raw_out:
+            try:
+                stored = {k: v for k, v in args.items() if k not in ("stream", "stream_options")}
+                keys = {_cache_key_for(prov, stored)}
+                if request_key and stored.get("model") == mdl:
+                    keys.add(request_key)
+                for k in keys:
+                    _response_cache(cfg).put(k, provider=prov, model=stored.get("model", mdl), raw_text=raw_out, usage=usage)
+            except Exception as e:
+                print(f"[cognition:CACHE] store error (ignored): {e}")
+        if meta is not None:
+            meta.update({"call_id": call_id, "model": args.get("model", mdl), "provider": prov, "usage": usage,
+                         "finish_reason": finish_reason, "cached": False, "error": error})
+        print(f"[cognition:STREAM] id={call_id} done chunks={chunks} len(raw_text)={len(raw_out)} usage={usage}")
+
+# --------------------------- Structured output ------------------------------
+
+def _structured_mode(prov: str, cfg: Optional[LLMConfig] = None) -> str:
+    mode = (_cfg("AILYS_STRUCTURED_MODE", "", cfg) or "").strip().lower()
+    if mode in ("json_schema", "json_object", "off"):
+        return mode
+    return "json_schema" if prov == "openai" else "json_object"
+
+def _response_format_for(mode: str, schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if mode == "off":
+        return None
+    if mode == "json_schema" and schema:
+        return {"type": "json_schema",
+                "json_schema": {"name": "ailys_structured", "schema": schema, "strict": False}}
+    return {"type": "json_object"}
+
+def structured_response_format(schema: Optional[Dict[str, Any]] = None,
+                               cfg: Optional[LLMConfig] = None) -> Optional[Dict[str, Any]]:
+    """response_format that ask_structured() would send (for callers building raw requests, e.g. batch jobs)."""
+    cfg = cfg or config_snapshot()
+    return _response_format_for(_structured_mode(cfg.provider, cfg), schema)
+
+def _item_required_keys(schema: Optional[Dict[str, Any]], items_key: str) -> List[str]:
+    try:
+        props = (schema or {}).get("properties") or {}
+        item_schema = (props.get(items_key) or schema or {}).get("items") or {}
+        return [str(k) for k in item_schema.get("required") or []]
+    except Exception:
+        return []
+
+def ask_structured(
+    *,
+    messages: Optional[List[Dict[str, str]]] = None,
+    prompt: Optional[str] = None,
+    schema: Optional[Dict[str, Any]] = None,   # JSON Schema of the whole reply
+    items_key: str = "items",                  # array holding the per-record objects
+    id_field: Optional[str] = None,            # key echoed back per item (enables missing_ids)
+    expected_ids: Optional[Sequence[str]] = None,
+    description: str = "Artificial cognition request (structured)",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,
+    bypass_cache: bool = False,
+    on_item: Optional[Any] = None,             # callback(item) as each item completes
+) -> StructuredResult:
+    """
+    JSON-returning ask() for batch work.
+    - Uses the provider's JSON / structured-output mode where available
+      (AILYS_STRUCTURED_MODE); falls back to plain text if the provider rejects it.
+    - Streams the reply and parses items incrementally, so every item finished before
+      a truncation or error is kept.
+    - Reports missing_ids (expected ids with no valid item) so callers re-request only those.
+    Same approval gate and persistence as ask_stream().
+    """
+    cfg = config_snapshot()
+    fmt = _response_format_for(_structured_mode(cfg.provider, cfg), schema)
+
+    attempts = [fmt, None] if fmt is not None else [None]
+    for n, response_format in enumerate(attempts):
+        parser = JsonItemStream(items_key)
+        meta: Dict[str, Any] = {}
+        parts: List[str] = []
+        try:
+            for delta in ask_stream(messages=messages, prompt=prompt, description=description,
+                                    temperature=temperature, max_tokens=max_tokens, timeout=timeout,
+                                    bypass_cache=bypass_cache, response_format=response_format, meta=meta):
+                parts.append(delta)
+                for item in parser.feed(delta):
+                    if on_item is not None:
+                        try:
+                            on_item(item)
+                        except Exception as cb_err:
+                            print(f"[cognition:STRUCT] on_item callback error (ignored): {cb_err}")
+        except Exception as e:
+            if not parts and response_format is not None and n + 1 < len(attempts) \
+                    and "response_format" in str(e):
+                print(f"[cognition:STRUCT] provider rejected response_format ({e}); retrying as plain JSON text")
+                continue
+            if not parser.items:
+                raise
+            print(f"[cognition:STRUCT] stream failed after {len(parser.items)} item(s); keeping them: {e}")
+        break
+
+    result = parse_structured(
+        "".join(parts), schema=schema, items_key=items_key, id_field=id_field, expected_ids=expected_ids,
+        model_id=meta.get("model") or cfg.model, provider=meta.get("provider") or cfg.provider,
+        usage=meta.get("usage"), finish_reason=meta.get("finish_reason"), cached=bool(meta.get("cached")))
+    print(f"[cognition:STRUCT] items={len(result.items)} missing={len(result.missing_ids)} bad={result.bad_items} "
+          f"truncated={result.truncated} finish_reason={result.finish_reason}")
+    return result
+
+def _norm_id(value: Any) -> str:
+    return " ".join(str(value or "").split())
+
+def parse_structured(
+    raw_text: str,
+    *,
+    schema: Optional[Dict[str, Any]] = None,
+    items_key: str = "items",
+    id_field: Optional[str] = None,
+    expected_ids: Optional[Sequence[str]] = None,
+    model_id: str = "",
+    provider: str = "",
+    usage: Optional[Dict[str, Any]] = None,
+    finish_reason: Optional[str] = None,
+    cached: bool = False,
+) -> StructuredResult:
+    """
+    Turn a (possibly truncated) JSON reply into a StructuredResult: complete items that
+    carry the schema's required keys, de-duplicated by id_field, plus missing_ids.
+    Ids are compared with whitespace collapsed (models re-flow long ids). Shared by
+    ask_structured() and offline batch jobs.
+    """
+    parser = JsonItemStream(items_key)
+    parser.feed(raw_text or "")
+    required = _item_required_keys(schema, items_key)
+
+    valid: List[Dict[str, Any]] = []
+    seen: set = set()
+    bad = parser.bad_items
+    for item in parser.items:
+        if any(k not in item for k in required):
+            bad += 1
+            continue
+        if id_field:
+            ident = _norm_id(item.get(id_field))
+            if not ident or ident in seen:
+                bad += 1
+                continue
+            seen.add(ident)
+        valid.append(item)
+
+    missing = [str(i) for i in (expected_ids or []) if _norm_id(i) not in seen] if id_field else []
+    return StructuredResult(
+        items=valid,
+        missing_ids=missing,
+        raw_text=raw_text or "",
+        model_id=model_id,
+        provider=provider,
+        usage=usage,
+        finish_reason=finish_reason,
+        complete=parser.closed and not missing,
+        truncated=finish_reason == "length" or parser.in_item or not parser.closed,
+        bad_items=bad,
+        cached=cached,
+    )
+
+
+# ------------------------------ Concurrency ---------------------------------
+
+_ASYNC_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_ASYNC_EXECUTOR_LOCK = threading.Lock()
+
+def _async_executor() -> ThreadPoolExecutor:
+    global _ASYNC_EXECUTOR
+    with _ASYNC_EXECUTOR_LOCK:
+        if _ASYNC_EXECUTOR is None:
+            try:
+                workers = max(1, int(_cfg("AILYS_ASYNC_WORKERS", "16")))
+            except Exception:
+                workers = 16
+            _ASYNC_EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ailys-ask")
+        return _ASYNC_EXECUTOR
+
+async def ask_async(**kwargs: Any) -> CognitionResult:
+    """
+    Awaitable ask(): same arguments, same approval gating and persistence.
+    Runs the blocking call on a shared worker pool so many can be awaited together
+    (e.g. with asyncio.gather). Provider caps from AILYS_MAX_CONCURRENCY* still apply.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_async_executor(), functools.partial(ask, **kwargs))
+
+def map_ask(
+    requests: Sequence[Dict[str, Any]],
+    *,
+    max_concurrency: int = 4,
+    return_exceptions: bool = False,
+    call: Optional[Any] = None,
+) -> List[Union[CognitionResult, BaseException]]:
+    """
+    Run many ask() calls concurrently; each dict in `requests` holds ask() kwargs.
+    - `call` swaps in another entry point with the same gating (e.g. ask_structured).
+    - Every call gets its own approval request and exchange folder.
+    - Results come back in input order.
+    - return_exceptions=True puts the exception in that call's slot instead of raising
+      the first failure (the remaining calls still run to completion either way).
+    """
+    reqs = list(requests or [])
+    if not reqs:
+        return []
+    workers = max(1, min(int(max_concurrency or 1), len(reqs)))
+    print(f"[cognition:MAP] {len(reqs)} request(s), max_concurrency={workers}")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ailys-map") as pool:
+        # each worker runs in a copy of the caller's context (carries an open approval group)
+        futures = [pool.submit(contextvars.copy_context().run, call or ask, **r) for r in reqs]
+        out: List[Union[CognitionResult, BaseException]] = []
+        first_error: Optional[BaseException] = None
+        for fut in futures:
+            try:
+                out.append(fut.result())
+            except BaseException as e:
+                out.append(e)
+                if first_error is None:
+                    first_error = e
+
+    if first_error is not None and not return_exceptions:
+        raise first_error
+    return out
+
 # ------------------------------ Convenience --------------------------------
 
+def stats(*, buckets: bool = False) -> Dict[str, Any]:
+    """
+    ask() latency per stage (approval_wait, preflight, rate_wait, network, serialize,
+    persist, total) as count/mean/p50/p95/p99/max, grouped by model and by task description.
+    """
+    return cognition_metrics.REGISTRY.stats(buckets=buckets)
+
+def export_metrics(dest: Union[str, Path, None] = None) -> Path:
+    """Write stats() (with histogram buckets) to dest (file or folder; default <exchanges>/metrics)."""
+    return cognition_metrics.REGISTRY.export(Path(dest) if dest else _exchanges_dir() / "metrics")
+
+def invalidate_clients() -> int:
+    """Drop pooled SDK clients so the next call picks up new keys/base URLs/timeouts."""
+    return llm_clients.invalidate_clients()
+
 def model_summary() -> str:
     """Small helper for GUI: shows current brain selection."""
-    prov, mdl, burl = _provider(), _model(), _base_url() or ""
+    cfg = config_snapshot()
+    prov, mdl, burl = cfg.provider, cfg.model, cfg.base_url or ""
     if prov == "openai_compatible" and burl:
         return f"{mdl} @ {burl}"
     return mdl
@@ -0,0 +1,217 @@
+# core/backend_pool.py
+"""
+Weighted pool of interchangeable openai_compatible endpoints (local inference servers).
+- Least-outstanding-requests routing, scaled by weight: a weight-2 backend is picked
+  as if it had half the in-flight calls. Ties (always the case for sequential calls)
+  go to the fewest requests per unit weight, so traffic splits in proportion to weight.
+- Passive health checks: consecutive transport/5xx failures eject a backend for a
+  cool-down that doubles on every repeat ejection; the first success restores it.
+  429 (server overloaded) is a soft failure: it extends the streak, so a run of them
+  rests the backend for the base cool-down, but never escalates it. Other 4xx say
+  nothing about the backend (the request was bad): no health or latency update.
+- Per-backend latency stats (EWMA, p50/p95 over a recent window) for the exchange
+  record and the GUI/logs.
+Config (parsed by parse_backends):
+  JSON list  [{"url": "http://h1:8000/v1", "weight": 2}, "http://h2:8000/v1"]
+  or a comma-separated string  "http://h1:8000/v1|2, http://h2:8000/v1"
+"""
+
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class Backend:
+    url: str
+    weight: float = 1.0
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    latency_ewma: Optional[float] = None
+    recent: Deque[float] = field(default_factory=lambda: deque(maxlen=200))
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        vals = sorted(self.recent)
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+
+@dataclass
+class BackendLease:
+    """What one call got from the pool; filled in as the call completes."""
+    url: str
+    outstanding_at_start: int
+    started: float
+    latency_sec: Optional[float] = None
+    ok: Optional[bool] = None
+
+
+def parse_backends(spec: Any) -> List[Tuple[str, float]]:
+    """Accept a JSON list (strings or {"url","weight"}) or "url|weight, url" text."""
+    if not spec:
+        return []
+    items: Sequence[Any]
+    if isinstance(spec, str):
+        text = spec.strip()
+        if text.startswith("["):
+            try:
+                items = json.loads(text)
+            except Exception:
+                items = []
+        else:
+            items = [p.strip() for p in text.split(",") if p.strip()]
+    elif isinstance(spec, (list, tuple)):
+        items = spec
+    else:
+        items = []
+
+    out: List[Tuple[str, float]] = []
+    for it in items:
+        url, weight = None, 1.0
+        if isinstance(it, dict):
+            url = it.get("url") or it.get("base_url")
+            weight = it.get("weight", 1.0)
+        elif isinstance(it, str):
+            url, _, w = it.partition("|")
+            weight = w or 1.0
+        try:
+            weight = max(0.01, float(weight))
+        except Exception:
+            weight = 1.0
+        if url and str(url).strip():
+            out.append((str(url).strip().rstrip("/"), weight))
+    return out
+
+
+def is_backend_failure(e: BaseException) -> bool:
+    """Transport errors, timeouts and 5xx count against a backend; 4xx do not (the request was bad)."""
+    status = getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    name = type(e).__name__
+    return name in ("APIConnectionError", "APITimeoutError") or isinstance(e, (ConnectionError, TimeoutError, OSError))
+
+
+def failure_kind(e: BaseException) -> str:
+    """How an error from a call reflects on its backend: "fail", "soft" (429) or "neutral"."""
+    if getattr(e, "status_code", None) == 429:
+        return "soft"
+    return "fail" if is_backend_failure(e) else "neutral"
+
+
+def is_connect_failure(e: BaseException) -> bool:
+    """Request never reached a server (safe to resend elsewhere without a new approval)."""
+    return type(e).__name__ == "APIConnectionError" or isinstance(e, ConnectionRefusedError)
+
+
+class BackendPool:
+    def __init__(self, backends: Sequence[Tuple[str, float]], *, eject_after: int = 3,
+                 eject_sec: float = 30.0, max_eject_sec: float = 600.0):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends: List[Backend] = [Backend(url=u, weight=w) for u, w in backends]
+        self.eject_after = max(1, int(eject_after))
+        self.eject_sec = float(eject_sec)
+        self.max_eject_sec = float(max_eject_sec)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def _pick_locked(self, exclude: Sequence[str]) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.url not in exclude] or list(self.backends)
+        healthy = [b for b in candidates if b.healthy(now)]
+        if healthy:
+            return min(healthy, key=lambda b: (b.outstanding / b.weight, b.requests / b.weight))
+        # everyone is ejected: probe the one that comes back first rather than fail outright
+        return min(candidates, key=lambda b: b.ejected_until)
+
+    def healthy_count(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for b in self.backends if b.healthy(now))
+
+    @contextmanager
+    def lease(self, exclude: Sequence[str] = ()) -> Iterator[BackendLease]:
+        """Route one call; records latency and health when the block exits."""
+        with self._lock:
+            b = self._pick_locked(exclude)
+            b.outstanding += 1
+            b.requests += 1
+            info = BackendLease(url=b.url, outstanding_at_start=b.outstanding - 1, started=time.monotonic())
+        try:
+            yield info
+        except BaseException as e:
+            self._finish(b, info, failure_kind(e))
+            raise
+        else:
+            self._finish(b, info, "ok")
+
+    def _finish(self, b: Backend, info: BackendLease, outcome: str) -> None:
+        """outcome: "ok", "fail", "soft" (429) or "neutral" (4xx: only the slot is released)."""
+        now = time.monotonic()
+        info.latency_sec = round(now - info.started, 4)
+        info.ok = outcome != "fail" and outcome != "soft"
+        with self._lock:
+            b.outstanding = max(0, b.outstanding - 1)
+            if outcome == "neutral":
+                return
+            if outcome == "ok":
+                b.consecutive_failures = 0
+                b.ejected_until = 0.0
+                b.recent.append(info.latency_sec)
+                b.latency_ewma = info.latency_sec if b.latency_ewma is None else (
+                    0.8 * b.latency_ewma + 0.2 * info.latency_sec)
+                return
+            b.failures += 1
+            b.consecutive_failures += 1
+            if b.consecutive_failures >= self.eject_after:
+                soft = outcome == "soft"
+                if not soft:
+                    b.ejections += 1
+                cool = self.eject_sec if soft else min(self.max_eject_sec, self.eject_sec * (2 ** (b.ejections - 1)))
+                b.ejected_until = now + cool
+                b.consecutive_failures = 0
+                print(f"[backend_pool] ejected {b.url} for {cool:.0f}s "
+                      f"(failures={b.failures}, ejections={b.ejections})")
+
+    def backend_stats(self, url: str) -> Dict[str, Any]:
+        with self._lock:
+            b = next((x for x in self.backends if x.url == url), None)
+            return self._stats_locked(b, time.monotonic()) if b else {}
+
+    def _stats_locked(self, b: Backend, now: float) -> Dict[str, Any]:
+        p50, p95 = b.percentile(0.5), b.percentile(0.95)
+        return {
+            "url": b.url,
+            "weight": b.weight,
+            "healthy": b.healthy(now),
+            "ejected_for_sec": round(max(0.0, b.ejected_until - now), 1),
+            "outstanding": b.outstanding,
+            "requests": b.requests,
+            "failures": b.failures,
+            "consecutive_failures": b.consecutive_failures,
+            "ejections": b.ejections,
+            "latency_ewma_sec": round(b.latency_ewma, 4) if b.latency_ewma is not None else None,
+            "latency_p50_sec": round(p50, 4) if p50 is not None else None,
+            "latency_p95_sec": round(p95, 4) if p95 is not None else None,
+        }
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [self._stats_locked(b, now) for b in self.backends]
@@ -0,0 +1,461 @@
+# core/batch_jobs.py
+"""
+Offline batch jobs for bulk cognition work (relevance scoring and similar).
+- A list of ask()-style requests becomes one JSONL job file (OpenAI batch format:
+  {"custom_id", "method", "url", "body"} per line).
+- The whole job goes through the approval queue ONCE; approval covers the upload and
+  submission (where cost is committed). Polling happens afterwards on the caller's
+  thread, with exponential backoff, so approving never blocks the GUI.
+- Results are written to the exchange journal (one record per request) and returned
+  in input order as CognitionResult objects for the calling task to write to its CSV.
+- Backends:
+    openai → Files + Batches API (/v1/batches, 24h completion window)
+    local  → runs the job lines against the regular chat endpoint in a background
+             thread and writes an output file in the same format. Used for
+             openai_compatible servers without a batch endpoint, and as the stand-in
+             batch server for local testing. Lines go through the AILYS_BASE_URLS
+             pool like ask(). After a restart, a job whose output file is complete
+             is collected from it; a job cut off mid-way reports "expired".
+- Job folders (<exchanges>/batch_jobs/<job_id>/: input.jsonl, job.json, output.jsonl)
+  survive restarts; resume_batch(job_id) picks polling back up.
+Config: AILYS_BATCH_BACKEND ("openai" | "local"; default openai for provider=openai,
+local otherwise), AILYS_BATCH_POLL_SEC (initial poll delay, default 5),
+AILYS_BATCH_POLL_MAX_SEC (backoff cap, default 300).
+"""
+
+from __future__ import annotations
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import core.approval_queue as approvals
+from core import artificial_cognition as ac
+from core import backend_pool, llm_clients
+
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+_ENDPOINT = "/v1/chat/completions"
+
+
+@dataclass
+class BatchJobResult:
+    job_id: str
+    batch_id: Optional[str]
+    status: str
+    backend: str
+    results: List[Optional[ac.CognitionResult]] = field(default_factory=list)  # input order; None = failed
+    errors: Dict[str, str] = field(default_factory=dict)                      # custom_id → message
+    custom_ids: List[str] = field(default_factory=list)
+    job_dir: Optional[str] = None
+
+
+# ------------------------------ Backends ------------------------------------
+
+class OpenAIBatchBackend:
+    name = "openai"
+
+    def __init__(self, cfg: ac.LLMConfig):
+        self.cfg = cfg
+
+    def _client(self):
+        return llm_clients.get_client(self.cfg.provider, None, self.cfg.api_key, self.cfg.timeout)
+
+    def submit(self, input_path: Path, description: str) -> str:
+        client = self._client()
+        with open(input_path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(input_file_id=uploaded.id, endpoint=_ENDPOINT,
+                                      completion_window="24h", metadata={"description": description[:500]})
+        return batch.id
+
+    def status(self, batch_id: str, job_dir: Path) -> Dict[str, Any]:
+        b = self._client().batches.retrieve(batch_id)
+        counts = getattr(b, "request_counts", None)
+        return {
+            "status": b.status,
+            "output_file_id": getattr(b, "output_file_id", None),
+            "error_file_id": getattr(b, "error_file_id", None),
+            "completed": getattr(counts, "completed", None),
+            "failed": getattr(counts, "failed", None),
+            "total": getattr(counts, "total", None),
+        }
+
+    def fetch(self, batch_id: str, state: Dict[str, Any], dest: Path) -> Path:
+        client = self._client()
+        lines: List[str] = []
+        for key in ("output_file_id", "error_file_id"):
+            fid = state.get(key)
+            if fid:
+                lines.append(client.files.content(fid).text.rstrip("\n"))
+        dest.write_text("\n".join(l for l in lines if l) + "\n", encoding="utf-8")
+        return dest
+
+
+class LocalBatchBackend:
+    """
+    Executes a batch file against the normal chat endpoint in a background thread,
+    honouring the provider concurrency slots and RPM/TPM limits, and spreading lines
+    over the AILYS_BASE_URLS pool when one is configured.
+    """
+    OUTPUT_NAME = "local_output.jsonl"
+    name = "local"
+    _JOBS: Dict[str, Dict[str, Any]] = {}
+    _LOCK = threading.Lock()
+
+    def __init__(self, cfg: ac.LLMConfig):
+        self.cfg = cfg
+
+    def submit(self, input_path: Path, description: str) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        out_path = input_path.with_name(self.OUTPUT_NAME)
+        with self._LOCK:
+            self._JOBS[batch_id] = {"status": "in_progress", "completed": 0, "failed": 0, "total": None,
+                                    "output_path": str(out_path)}
+        threading.Thread(target=self._run, args=(batch_id, input_path, out_path),
+                         name=f"ailys-batch-{batch_id}", daemon=True).start()
+        return batch_id
+
+    def _run_line(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.cfg
+        prov = cfg.provider
+        base_url = cfg.base_url if prov == "openai_compatible" else None
+        pool = ac._backend_pool(cfg) if prov == "openai_compatible" else None
+        body = line.get("body") or {}
+        try:
+            model = body.get("model", cfg.model)
+            rpm, tpm = ac._rate_limits(prov, model, cfg)
+            cap = body.get("max_completion_tokens", body.get("max_tokens"))
+            est = ac.token_estimator.count_message_tokens(body.get("messages") or [], model) + (
+                cap if isinstance(cap, int) else 0)
+            sched = ac._rate_scheduler(cfg)
+            sched.acquire(prov, model, est, rpm=rpm, tpm=tpm)
+            tried: List[str] = []
+            while True:
+                lease = None
+                try:
+                    with ExitStack() as stack:
+                        call_base_url = base_url
+                        if pool is not None:
+                            lease = stack.enter_context(pool.lease(exclude=tried))
+                            call_base_url = lease.url
+                        stack.enter_context(ac._provider_slot(prov, cfg))
+                        client = stack.enter_context(
+                            llm_clients.lease_client(prov, call_base_url, cfg.api_key, cfg.timeout))
+                        resp = client.chat.completions.create(**body)
+                    break
+                except Exception as e:
+                    # same rule as ask(): a refused connection never reached a server
+                    if (lease is not None and backend_pool.is_connect_failure(e)
+                            and len(tried) + 1 < len(pool)):
+                        tried.append(lease.url)
+                        continue
+                    raise
+            try:
+                dump = resp.model_dump()
+            except Exception:
+                dump = {"choices": [{"message": {"content": ac._resp_text(resp)}}],
+                        "usage": ac._resp_usage(resp), "model": model}
+            sched.settle(prov, model, est, (dump.get("usage") or {}).get("total_tokens"))
+            return {"id": uuid.uuid4().hex, "custom_id": line.get("custom_id"),
+                    "response": {"status_code": 200, "body": dump}, "error": None}
+        except Exception as e:
+            return {"id": uuid.uuid4().hex, "custom_id": line.get("custom_id"), "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+
+    def _run(self, batch_id: str, input_path: Path, out_path: Path) -> None:
+        lines = [json.loads(l) for l in input_path.read_text(encoding="utf-8").splitlines() if l.strip()]
+        with self._LOCK:
+            self._JOBS[batch_id]["total"] = len(lines)
+        workers = max(1, ac._provider_concurrency(self.cfg.provider, self.cfg))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ailys-batch") as pool, \
+                    open(out_path, "w", encoding="utf-8") as out:
+                for rec in pool.map(self._run_line, lines):
+                    out.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+                    with self._LOCK:
+                        self._JOBS[batch_id]["completed" if rec.get("error") is None else "failed"] += 1
+            final = "completed"
+        except Exception as e:
+            print(f"[batch] local job {batch_id} failed: {e}")
+            final = "failed"
+        with self._LOCK:
+            self._JOBS[batch_id]["status"] = final
+
+    def status(self, batch_id: str, job_dir: Path) -> Dict[str, Any]:
+        with self._LOCK:
+            st = self._JOBS.get(batch_id)
+        if st:
+            return dict(st)
+        # not running in this process (e.g. after a restart): a job whose output file has
+        # a line for every input line finished; anything less was cut off by the restart
+        out_path = job_dir / self.OUTPUT_NAME
+        total = len(_read_jsonl(job_dir / "input.jsonl"))
+        if total:
+            recs = _read_jsonl(out_path)
+            if len(recs) == total:
+                failed = sum(1 for r in recs if r.get("error") is not None)
+                return {"status": "completed", "completed": total - failed, "failed": failed,
+                        "total": total, "output_path": str(out_path)}
+        # a local job does not survive a restart; report it so the caller can resubmit
+        return {"status": "expired"}
+
+    def fetch(self, batch_id: str, state: Dict[str, Any], dest: Path) -> Path:
+        src = Path(state.get("output_path") or "")
+        if src.exists() and src != dest:
+            dest.write_text(src.read_text(encoding="utf-8"), encoding="utf-8")
+        return dest
+
+
+def _backend_for(cfg: ac.LLMConfig, name: Optional[str] = None):
+    name = (name or cfg.get("AILYS_BATCH_BACKEND", "") or "").strip().lower()
+    if not name:
+        name = "openai" if cfg.provider == "openai" else "local"
+    return OpenAIBatchBackend(cfg) if name == "openai" else LocalBatchBackend(cfg)
+
+
+# ------------------------------ Job files -----------------------------------
+
+def _jobs_root() -> Path:
+    root = ac._exchanges_dir() / "batch_jobs"
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+def _write_job_state(job_dir: Path, state: Dict[str, Any]) -> None:
+    tmp = job_dir / "job.json.tmp"
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    tmp.replace(job_dir / "job.json")
+
+def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    """Complete JSON lines of a job file ([] if missing); a torn last line is skipped."""
+    if not path.exists():
+        return []
+    out = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if isinstance(rec, dict):
+                out.append(rec)
+    return out
+
+
+def _job_meta(lines: Sequence[Dict[str, Any]], cfg: ac.LLMConfig) -> Dict[str, Any]:
+    """Approval-policy view of the whole job: provider, model and total estimated tokens."""
+    tokens = 0
+    for l in lines:
+        body = l["body"]
+        cap = body.get("max_completion_tokens", body.get("max_tokens"))
+        tokens += ac._approval_meta(cfg.provider, body["model"], body["messages"],
+                                    cap if isinstance(cap, int) else None)["tokens"]
+    return {"provider": cfg.provider, "model": cfg.model, "tokens": tokens, "batch": len(lines)}
+
+def build_job_lines(requests: Sequence[Dict[str, Any]], cfg: Optional[ac.LLMConfig] = None,
+                    model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    One batch line per request. Each request takes ask()-style keys: messages or
+    prompt, temperature, max_tokens, optional response_format and custom_id.
+    Prompts are size-checked locally, like ask() does.
+    """
+    cfg = cfg or ac.config_snapshot()
+    mdl = model or cfg.model
+    lines: List[Dict[str, Any]] = []
+    seen: set = set()
+    for i, req in enumerate(requests):
+        messages = ac._normalize_messages(req.get("messages"), req.get("prompt"), "submit_batch")
+        temp = cfg.temperature if req.get("temperature") is None else float(req["temperature"])
+        mx = cfg.max_tokens if req.get("max_tokens") is None else int(req["max_tokens"])
+        mx = ac._preflight_size(messages, mdl, mx, "submit_batch")
+        body = ac._build_chat_args(cfg.provider, mdl, messages, temp, mx)
+        if req.get("response_format"):
+            body["response_format"] = req["response_format"]
+        cid = str(req.get("custom_id") or f"req-{i:05d}")
+        if cid in seen:
+            raise ValueError(f"submit_batch(...): duplicate custom_id {cid!r}")
+        seen.add(cid)
+        lines.append({"custom_id": cid, "method": "POST", "url": _ENDPOINT, "body": body})
+    return lines
+
+
+# ------------------------------ Public API ----------------------------------
+
+def submit_batch(
+    requests: Sequence[Dict[str, Any]],
+    *,
+    description: str = "Batch cognition job",
+    timeout: Optional[float] = None,      # approval wait
+    wait: bool = True,                    # poll until finished and return results
+    max_wait_sec: Optional[float] = None, # give up polling after this long (job keeps running)
+    backend: Optional[str] = None,
+) -> BatchJobResult:
+    """
+    Submit many requests as one approval-gated batch job. With wait=True (default),
+    polls with backoff and returns results in input order; otherwise returns right
+    after submission (status "submitted"); call resume_batch(job_id) later.
+    """
+    cfg = ac.config_snapshot()
+    be = _backend_for(cfg, backend)
+    job_id = uuid.uuid4().hex[:10]
+    job_dir = _jobs_root() / f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}_{job_id}"
+    job_dir.mkdir(parents=True, exist_ok=True)
+    state: Dict[str, Any] = {
+        "job_id": job_id, "backend": be.name, "description": description, "provider": cfg.provider,
+        "model": cfg.model, "created_utc": datetime.utcnow().isoformat(), "status": "awaiting_approval",
+        "batch_id": None, "count": len(requests),
+    }
+    lines = build_job_lines(requests, cfg)
+    state["custom_ids"] = [l["custom_id"] for l in lines]
+    input_path = job_dir / "input.jsonl"
+    _write_job_state(job_dir, state)
+
+    def _submit(overrides: Optional[Dict[str, Any]] = None) -> str:
+        # Approval-time model override applies to every line of the job.
+        ov_model = (overrides or {}).get("model")
+        final = lines if not ov_model else build_job_lines(requests, cfg, model=ov_model)
+        with open(input_path, "w", encoding="utf-8") as f:
+            for l in final:
+                f.write(json.dumps(l, ensure_ascii=False) + "\n")
+        batch_id = be.submit(input_path, description)
+        state.update({"batch_id": batch_id, "status": "submitted", "model": ov_model or cfg.model,
+                      "submitted_utc": datetime.utcnow().isoformat()})
+        _write_job_state(job_dir, state)
+        print(f"[batch] job={job_id} submitted batch_id={batch_id} backend={be.name} lines={len(final)}")
+        return batch_id
+
+    batch_id = approvals.request_approval(
+        description=f"{description} | batch of {len(lines)} request(s) | provider={cfg.provider} "
+                    f"model={cfg.model} backend={be.name}",
+        call_fn=_submit,
+        timeout=timeout,
+        kind="llm",
+        meta=_job_meta(lines, cfg),
+    )
+    if not batch_id:
+        state["status"] = "denied_or_failed"
+        _write_job_state(job_dir, state)
+        raise RuntimeError("Batch approval declined or failed; nothing submitted.")
+
+    if not wait:
+        return BatchJobResult(job_id=job_id, batch_id=batch_id, status="submitted", backend=be.name,
+                              custom_ids=state["custom_ids"], job_dir=str(job_dir))
+    return _poll_and_collect(job_dir, state, be, max_wait_sec=max_wait_sec)
+
+
+def resume_batch(job_id: str, *, max_wait_sec: Optional[float] = None) -> BatchJobResult:
+    """Pick up a submitted job (e.g. after a restart) and collect its results."""
+    matches = sorted(_jobs_root().glob(f"*_{job_id}"))
+    if not matches:
+        raise FileNotFoundError(f"No batch job folder for job_id={job_id}")
+    job_dir = matches[-1]
+    state = json.loads((job_dir / "job.json").read_text(encoding="utf-8"))
+    if not state.get("batch_id"):
+        raise RuntimeError(f"Batch job {job_id} was never submitted (status={state.get('status')}).")
+    be = _backend_for(ac.config_snapshot(), state.get("backend"))
+    return _poll_and_collect(job_dir, state, be, max_wait_sec=max_wait_sec)
+
+
+def _poll_and_collect(job_dir: Path, state: Dict[str, Any], be, *, max_wait_sec: Optional[float]) -> BatchJobResult:
+    cfg = ac.config_snapshot()
+    try:
+        delay = max(0.05, float(cfg.get("AILYS_BATCH_POLL_SEC", "5")))
+        delay_cap = max(delay, float(cfg.get("AILYS_BATCH_POLL_MAX_SEC", "300")))
+    except Exception:
+        delay, delay_cap = 5.0, 300.0
+    started = time.time()
+    batch_id = state["batch_id"]
+    while True:
+        try:
+            st = be.status(batch_id, job_dir)
+        except Exception as e:
+            print(f"[batch] job={state['job_id']} status error (will retry): {e}")
+            st = {"status": state.get("status", "submitted")}
+        if st.get("status") != state.get("status"):
+            print(f"[batch] job={state['job_id']} status={st.get('status')} "
+                  f"done={st.get('completed')}/{st.get('total')} failed={st.get('failed')}")
+        state.update({k: v for k, v in st.items() if v is not None})
+        _write_job_state(job_dir, state)
+        if st.get("status") in _TERMINAL:
+            break
+        if max_wait_sec is not None and time.time() - started >= max_wait_sec:
+            return BatchJobResult(job_id=state["job_id"], batch_id=batch_id, status=st.get("status", "unknown"),
+                                  backend=be.name, custom_ids=state.get("custom_ids", []), job_dir=str(job_dir))
+        time.sleep(delay)
+        delay = min(delay_cap, delay * 1.5)
+
+    out_path = job_dir / "output.jsonl"
+    if state["status"] == "completed" or state.get("output_file_id") or state.get("output_path"):
+        try:
+            be.fetch(batch_id, state, out_path)
+        except Exception as e:
+            print(f"[batch] job={state['job_id']} fetch failed: {e}")
+    return _collect(job_dir, state, out_path, be.name)
+
+
+def _collect(job_dir: Path, state: Dict[str, Any], out_path: Path, backend: str) -> BatchJobResult:
+    """Parse the output file, journal one exchange per request, return results in input order."""
+    by_id = {str(rec.get("custom_id")): rec for rec in _read_jsonl(out_path)}
+
+    inputs: Dict[str, Dict[str, Any]] = {}
+    input_path = job_dir / "input.jsonl"
+    if input_path.exists():
+        for line in input_path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                l = json.loads(line)
+                inputs[str(l.get("custom_id"))] = l.get("body") or {}
+
+    job_id = state["job_id"]
+    run_dir = ac._exchanges_dir() / job_dir.name
+    seq = [0]
+    results: List[Optional[ac.CognitionResult]] = []
+    errors: Dict[str, str] = {}
+    for cid in state.get("custom_ids", []):
+        rec = by_id.get(cid)
+        body = inputs.get(cid, {})
+        resp = ((rec or {}).get("response") or {}).get("body") or {}
+        err = (rec or {}).get("error") or (None if rec else {"message": f"no result (job status={state['status']})"})
+        if rec and ((rec.get("response") or {}).get("status_code") or 200) >= 400:
+            err = err or {"message": f"HTTP {(rec.get('response') or {}).get('status_code')}"}
+        try:
+            raw = resp["choices"][0]["message"]["content"] or ""
+        except Exception:
+            raw = ""
+        usage = resp.get("usage") if isinstance(resp, dict) else None
+        model = resp.get("model") or body.get("model") or state.get("model")
+
+        ac._persist_exchange({
+            "call_id": job_id,
+            "custom_id": cid,
+            "batch_id": state.get("batch_id"),
+            "timestamp_utc": datetime.utcnow().isoformat(),
+            "description": f"{state.get('description')} [{cid}]",
+            "provider": state.get("provider"),
+            "model": model,
+            "parameters": {k: body.get(k) for k in ("temperature", "max_tokens", "max_completion_tokens")},
+            "messages": body.get("messages"),
+            "response": resp or None,
+            "raw_text": raw,
+            "usage": usage,
+            "error": err,
+        }, run_dir=run_dir, seq=seq, filename_hint=f"batch_{cid}")
+
+        if err:
+            errors[cid] = str(err.get("message") if isinstance(err, dict) else err)
+            results.append(None)
+        else:
+            results.append(ac.CognitionResult(model_id=model, raw_text=raw, usage=usage,
+                                              provider=state.get("provider") or ""))
+
+    state["collected_utc"] = datetime.utcnow().isoformat()
+    state["errors"] = len(errors)
+    _write_job_state(job_dir, state)
+    print(f"[batch] job={job_id} collected {len(results) - len(errors)}/{len(results)} result(s)")
+    return BatchJobResult(job_id=job_id, batch_id=state.get("batch_id"), status=state["status"], backend=backend,
+                          results=results, errors=errors, custom_ids=list(state.get("custom_ids", [])),
+                          job_dir=str(job_dir))
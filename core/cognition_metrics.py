@@ -0,0 +1,177 @@
+# core/cognition_metrics.py
+"""
+Per-stage latency instrumentation for cognition calls.
+- CallTimer marks the lifecycle of one ask(): queued → approved → preflight →
+  response → serialized → persisted, and turns the marks into spans
+  (approval_wait, preflight, rate_wait, network, serialize, persist, total).
+- MetricsRegistry aggregates spans in process, per model and per task description
+  (digits folded so "batch 3/10" and "batch 4/10" share a series), with fixed
+  log-scale histogram buckets plus a bounded sample window for p50/p95/p99.
+- export() writes the aggregate as JSON (e.g. into a task's run/logs folder).
+- Series is the building block, also used by the approval queue's own metrics.
+"""
+
+from __future__ import annotations
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+# Stage order; each span runs from the previous *recorded* mark to this one.
+STAGES = ("queued", "approved", "preflight", "response", "serialized", "persisted")
+SPAN_NAMES = {
+    "approved": "approval_wait",
+    "preflight": "preflight",
+    "response": "network",
+    "serialized": "serialize",
+    "persisted": "persist",
+}
+
+# Histogram bucket upper bounds, seconds (last bucket is +inf)
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_WINDOW = 2048
+
+
+def _fold_description(desc: str) -> str:
+    """Collapse per-call detail so one task's calls land in one series."""
+    d = (desc or "").split(" | ")[0]
+    return re.sub(r"\d+", "#", d).strip()[:120] or "(none)"
+
+
+class CallTimer:
+    def __init__(self, call_id: str, model: str, description: str):
+        self.call_id = call_id
+        self.model = model
+        self.description = description
+        self.marks: Dict[str, float] = {"queued": time.perf_counter()}
+        self.extra: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        self.marks[stage] = time.perf_counter()
+
+    def add(self, span: str, seconds: float) -> None:
+        """Record a span measured elsewhere (e.g. rate-limit wait inside the network stage)."""
+        self.extra[span] = self.extra.get(span, 0.0) + float(seconds)
+
+    def spans(self) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        prev = self.marks["queued"]
+        for stage in STAGES[1:]:
+            t = self.marks.get(stage)
+            if t is None:
+                continue
+            out[SPAN_NAMES[stage]] = t - prev
+            prev = t
+        if "network" in out and "rate_wait" in self.extra:
+            out["network"] = max(0.0, out["network"] - self.extra["rate_wait"])
+        out.update(self.extra)
+        out["total"] = max(self.marks.values()) - self.marks["queued"]
+        return {k: round(v, 6) for k, v in out.items()}
+
+
+class Series:
+    """One latency series: count/sum/max, log-scale histogram buckets and a recent-sample window."""
+    __slots__ = ("count", "sum", "max", "buckets", "window")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.window: Deque[float] = deque(maxlen=_WINDOW)
+
+    def add(self, v: float) -> None:
+        self.count += 1
+        self.sum += v
+        self.max = max(self.max, v)
+        for i, ub in enumerate(BUCKETS):
+            if v <= ub:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.window.append(v)
+
+    def summary(self) -> Dict[str, Any]:
+        vals = sorted(self.window)
+
+        def pct(q: float) -> Optional[float]:
+            if not vals:
+                return None
+            return round(vals[min(len(vals) - 1, int(q * len(vals)))], 4)
+
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": round(self.max, 4),
+            "buckets": dict([("le_" + str(ub), n) for ub, n in zip(BUCKETS, self.buckets)]
+                            + [("le_inf", self.buckets[-1])]),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model: Dict[str, Dict[str, Series]] = {}
+        self._by_desc: Dict[str, Dict[str, Series]] = {}
+        self._outcomes: Dict[str, int] = {}
+        self.started_utc = datetime.utcnow().isoformat()
+
+    def record(self, timer: CallTimer, status: str = "ok") -> Dict[str, float]:
+        spans = timer.spans()
+        desc = _fold_description(timer.description)
+        with self._lock:
+            self._outcomes[status] = self._outcomes.get(status, 0) + 1
+            for table, key in ((self._by_model, timer.model or "(unknown)"), (self._by_desc, desc)):
+                series = table.setdefault(key, {})
+                for name, v in spans.items():
+                    series.setdefault(name, Series()).add(v)
+        return spans
+
+    def stats(self, *, buckets: bool = False) -> Dict[str, Any]:
+        def _dump(table: Dict[str, Dict[str, Series]]) -> Dict[str, Any]:
+            out: Dict[str, Any] = {}
+            for key, series in table.items():
+                out[key] = {}
+                for name, s in series.items():
+                    summ = s.summary()
+                    if not buckets:
+                        summ.pop("buckets", None)
+                    out[key][name] = summ
+            return out
+
+        with self._lock:
+            return {
+                "since_utc": self.started_utc,
+                "calls": dict(self._outcomes),
+                "by_model": _dump(self._by_model),
+                "by_description": _dump(self._by_desc),
+            }
+
+    def export(self, dest: Path) -> Path:
+        """Write stats (with histogram buckets) to dest; a directory gets a timestamped file."""
+        dest = Path(dest)
+        if dest.suffix.lower() != ".json":
+            dest.mkdir(parents=True, exist_ok=True)
+            dest = dest / f"cognition_metrics_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json"
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_text(json.dumps(self.stats(buckets=True), ensure_ascii=False, indent=2), encoding="utf-8")
+        return dest
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_model.clear()
+            self._by_desc.clear()
+            self._outcomes.clear()
+            self.started_utc = datetime.utcnow().isoformat()
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,482 @@
+# core/exchange_archive.py
+"""
+Manifest index, retention and compressed archives for the exchanges folder.
+- manifest.sqlite (in the exchanges folder) has one row per exchange JSON file, flat
+  ("<ts>_<id>.json") or inside a run folder ("<ts>_<call>/003_exchange.json"), with
+  timestamp, model, description and call_id. Listing and filtering by model/date
+  query it and never open the payloads.
+- Journal records (the default exchange format) get rows too, keyed
+  "journal/<segment>#<call_id>/<seq>" and pointing at their segment and byte offset:
+  the journal writer adds them per batch, and refresh() indexes whatever part of a
+  segment it has not seen (segments written without a manifest, or by older code).
+- Rows are added when artificial_cognition writes a file; refresh() picks up files
+  written by anything else (each new file is parsed once; run folders are only
+  rescanned when their mtime changes).
+- compact() moves cold items (older than AILYS_EXCHANGES_ARCHIVE_DAYS, default 14)
+  into size-bounded tar.gz archives under <exchanges>/archive (AILYS_ARCHIVE_SEGMENT_MB,
+  default 64, of input per archive) and gzips cold journal segments in place (the
+  journal reader already reads .jsonl.gz; segments a writer may still append to are
+  left alone). Archived rows keep their manifest entry, so read_entry() still loads them.
+- WAL, one connection per thread (like response_cache).
+"""
+
+from __future__ import annotations
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.exchange_journal import SEGMENT_IDLE_CLOSE_SEC, open_segments
+
+DDL = """
+PRAGMA journal_mode=WAL;
+
+CREATE TABLE IF NOT EXISTS entries(
+  rel TEXT PRIMARY KEY,
+  top TEXT,
+  timestamp_utc TEXT,
+  model TEXT,
+  description TEXT,
+  call_id TEXT,
+  size_bytes INTEGER,
+  mtime REAL,
+  archive TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_entries_model ON entries(model, timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_entries_top ON entries(top);
+
+CREATE TABLE IF NOT EXISTS dirs(
+  rel TEXT PRIMARY KEY,
+  mtime REAL
+);
+
+CREATE TABLE IF NOT EXISTS segments(
+  name TEXT PRIMARY KEY,
+  indexed_bytes INTEGER,
+  done INTEGER
+);
+"""
+
+# Journal columns (added to manifests created before journal records were indexed)
+_JOURNAL_COLS = (("segment", "TEXT"), ("offset", "INTEGER"), ("seq", "INTEGER"), ("stage", "TEXT"))
+
+MANIFEST_NAME = "manifest.sqlite"
+ARCHIVE_DIR = "archive"
+JOURNAL_DIR = "journal"
+_SKIP_DIRS = (ARCHIVE_DIR, JOURNAL_DIR, "metrics")
+_COLS = ("rel", "top", "timestamp_utc", "model", "description", "call_id", "size_bytes", "mtime", "archive",
+         "segment", "offset", "seq", "stage")
+
+
+def _summary_fields(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    def _s(v: Any) -> Optional[str]:
+        return None if v is None else str(v)[:500]
+    return (_s(payload.get("timestamp_utc")), _s(payload.get("model")),
+            _s(payload.get("description")), _s(payload.get("call_id")))
+
+
+class Manifest:
+    def __init__(self, base_dir: Path):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / MANIFEST_NAME
+        self._local = threading.local()
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.executescript(DDL)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(entries)")}
+            for col, typ in _JOURNAL_COLS:
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE entries ADD COLUMN {col} {typ}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_call ON entries(call_id, seq)")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------- indexing ---------------------------------------------------------
+
+    def _upsert(self, conn: sqlite3.Connection, rel: str, payload: Dict[str, Any], size: int, mtime: float) -> None:
+        ts, model, desc, call_id = _summary_fields(payload)
+        conn.execute(
+            "INSERT OR REPLACE INTO entries(rel, top, timestamp_utc, model, description, call_id,"
+            " size_bytes, mtime, archive) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+            (rel, rel.split("/", 1)[0], ts, model, desc, call_id, int(size), float(mtime)))
+
+    def add(self, path: Path, payload: Dict[str, Any]) -> None:
+        """Index a file just written (payload in hand, so nothing is re-read)."""
+        path = Path(path)
+        rel = path.resolve().relative_to(self.base_dir.resolve()).as_posix()
+        st = path.stat()
+        conn = self._conn()
+        self._upsert(conn, rel, payload, st.st_size, st.st_mtime)
+        conn.commit()
+
+    def _upsert_record(self, conn: sqlite3.Connection, segment: str, offset: int, size: int,
+                       record: Dict[str, Any], mtime: float) -> None:
+        payload = record.get("payload") if isinstance(record.get("payload"), dict) else {}
+        ts, model, desc, payload_call = _summary_fields(payload)
+        call_id = str(record.get("call_id") or payload_call or "")
+        seq = record.get("seq") if isinstance(record.get("seq"), int) else None
+        rel = f"{JOURNAL_DIR}/{segment}#{call_id}/{'' if seq is None else seq}"
+        conn.execute(
+            "INSERT OR REPLACE INTO entries(rel, top, timestamp_utc, model, description, call_id, size_bytes,"
+            " mtime, archive, segment, offset, seq, stage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, ?, ?)",
+            (rel, record.get("run") or rel, ts, model, desc, call_id, int(size), float(mtime),
+             segment, int(offset), seq, record.get("name")))
+
+    def _mark_segment(self, conn: sqlite3.Connection, segment: str, indexed_bytes: int, done: bool = False) -> None:
+        conn.execute(
+            "INSERT INTO segments(name, indexed_bytes, done) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET"
+            " indexed_bytes = MAX(indexed_bytes, excluded.indexed_bytes), done = MAX(done, excluded.done)",
+            (segment, int(indexed_bytes), int(done)))
+
+    def add_journal(self, segment: Path, rows: List[Tuple[int, int, Dict[str, Any]]]) -> None:
+        """Index records just appended to a journal segment: (byte offset, byte length, record)."""
+        name = Path(segment).name
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            for offset, size, record in rows:
+                self._upsert_record(conn, name, offset, size, record, now)
+            if rows:
+                self._mark_segment(conn, name, rows[-1][0] + rows[-1][1])
+
+    def _refresh_journal(self, conn: sqlite3.Connection) -> int:
+        """Index the unseen tail of each journal segment (whole lines only). Returns records added."""
+        journal_dir = self.base_dir / JOURNAL_DIR
+        if not journal_dir.exists():
+            return 0
+        seen = {name: (int(b or 0), bool(d)) for name, b, d in conn.execute(
+            "SELECT name, indexed_bytes, done FROM segments")}
+        added = 0
+        for seg in sorted(journal_dir.glob("*.jsonl*")):
+            if seg.name.endswith(".tmp"):
+                continue
+            gz = seg.suffix == ".gz"
+            name = seg.name[:-3] if gz else seg.name   # rows keep the segment's plain name
+            start, done = seen.get(name, (0, False))
+            if done or (not gz and seg.stat().st_size <= start):
+                continue
+            mtime = seg.stat().st_mtime
+            pos = start
+            try:
+                with conn, (gzip.open(seg, "rb") if gz else open(seg, "rb")) as f:
+                    f.seek(start)
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break   # partial last line (still being written): next time
+                        try:
+                            record = json.loads(raw)
+                        except Exception:
+                            record = None
+                        if isinstance(record, dict):
+                            self._upsert_record(conn, name, pos, len(raw), record, mtime)
+                            added += 1
+                        pos += len(raw)
+                    self._mark_segment(conn, name, pos, done=gz)
+            except Exception as e:
+                print(f"[exchange_archive] could not index {seg}: {e}")
+        return added
+
+    def refresh(self) -> int:
+        """
+        Index exchange files and journal records the manifest has not seen yet (and
+        forget live file entries whose file or folder was deleted). Returns how many
+        were added.
+        """
+        if not self.base_dir.exists():
+            return 0
+        conn = self._conn()
+        records = self._refresh_journal(conn)
+        known = {r[0] for r in conn.execute("SELECT rel FROM entries")}
+        dir_mtimes = dict(conn.execute("SELECT rel, mtime FROM dirs"))
+        new: List[Tuple[str, Path, os.stat_result]] = []
+        seen_dirs: List[Tuple[str, float]] = []
+        present = set()
+        with os.scandir(self.base_dir) as it:
+            for e in it:
+                present.add(e.name)
+                if e.is_file() and e.name.endswith(".json"):
+                    if e.name not in known:
+                        new.append((e.name, Path(e.path), e.stat()))
+                elif e.is_dir() and e.name not in _SKIP_DIRS:
+                    mtime = e.stat().st_mtime
+                    if dir_mtimes.get(e.name) == mtime:
+                        continue   # unchanged run folder
+                    with os.scandir(e.path) as sub:
+                        for f in sub:
+                            rel = f"{e.name}/{f.name}"
+                            if f.is_file() and f.name.endswith(".json") and rel not in known:
+                                new.append((rel, Path(f.path), f.stat()))
+                    seen_dirs.append((e.name, mtime))
+        with conn:
+            for rel, path, st in new:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        payload = json.load(f)
+                except Exception:
+                    payload = {}
+                self._upsert(conn, rel, payload if isinstance(payload, dict) else {}, st.st_size, st.st_mtime)
+            conn.executemany("INSERT OR REPLACE INTO dirs(rel, mtime) VALUES (?, ?)", seen_dirs)
+            gone = [(t,) for (t,) in conn.execute(
+                "SELECT DISTINCT top FROM entries WHERE archive IS NULL AND segment IS NULL") if t not in present]
+            conn.executemany("DELETE FROM entries WHERE top = ? AND archive IS NULL AND segment IS NULL", gone)
+            conn.executemany("DELETE FROM dirs WHERE rel = ?", gone)
+        if new or records:
+            print(f"[exchange_archive] indexed {len(new)} file(s) and {records} journal record(s) in {self.base_dir}")
+        return len(new) + records
+
+    # -------- queries ----------------------------------------------------------
+
+    def find(self, *, model: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+             top_level_only: bool = False, limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+        """
+        Newest first. `model` is a case-insensitive substring; since/until compare
+        against timestamp_utc (ISO strings, e.g. "2025-01-31" or a full timestamp).
+        """
+        where, args = [], []
+        if model:
+            where.append("LOWER(model) LIKE ?")
+            args.append(f"%{model.lower()}%")
+        if since:
+            where.append("timestamp_utc >= ?")
+            args.append(since)
+        if until:
+            where.append("timestamp_utc < ?")
+            args.append(until)
+        if top_level_only:
+            where.append("rel = top")
+        sql = f"SELECT {', '.join(_COLS)} FROM entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY COALESCE(segment, rel) DESC, offset DESC"   # both are timestamp-prefixed
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [dict(zip(_COLS, r)) for r in self._conn().execute(sql, args).fetchall()]
+
+    def get(self, rel: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(f"SELECT {', '.join(_COLS)} FROM entries WHERE rel = ?", (rel,)).fetchone()
+        return dict(zip(_COLS, row)) if row else None
+
+    def journal_calls(self) -> List[Dict[str, Any]]:
+        """ExchangeJournal.list_calls() rows, from the index (no payload is opened)."""
+        self._refresh_journal(self._conn())
+        calls: Dict[str, Dict[str, Any]] = {}
+        rows = self._conn().execute(
+            "SELECT call_id, top, rel, timestamp_utc, model, description, stage FROM entries"
+            " WHERE segment IS NOT NULL ORDER BY segment, offset").fetchall()
+        for cid, top, rel, ts, model, desc, stage in rows:
+            row = calls.setdefault(cid or "", {
+                "call_id": cid or "", "run": top if top != rel else None,
+                "timestamp_utc": ts, "model": model, "description": desc, "stages": [],
+            })
+            row["stages"].append(stage)
+            if not row.get("model") and model:
+                row["model"] = model
+        return list(calls.values())
+
+    def journal_records(self, call_id: str) -> List[Dict[str, Any]]:
+        """Every journal record of one call, read at its indexed offset (in seq order)."""
+        rows = self._conn().execute(
+            "SELECT segment, offset FROM entries WHERE call_id = ? AND segment IS NOT NULL ORDER BY seq",
+            (call_id,)).fetchall()
+        return [self._read_record(seg, off) for seg, off in rows]
+
+    def _read_record(self, segment: str, offset: int) -> Dict[str, Any]:
+        path = self.base_dir / JOURNAL_DIR / segment
+        if path.exists():
+            f = open(path, "rb")
+        elif path.with_name(segment + ".gz").exists():
+            f = gzip.open(path.with_name(segment + ".gz"), "rb")   # gzipped by compact()
+        else:
+            raise FileNotFoundError(str(path))
+        with f:
+            f.seek(int(offset))
+            return json.loads(f.readline())
+
+    def read_entry(self, rel: str) -> Dict[str, Any]:
+        """Load one exchange by manifest name (file, archived file or journal record)."""
+        if rel.startswith(f"{JOURNAL_DIR}/") and "#" in rel:
+            entry = self.get(rel)
+            if entry is None:
+                # locators name the segment the writer expected; find the record by call/seq
+                call_id, _, seq = rel.split("#", 1)[1].partition("/")
+                row = self._conn().execute(
+                    f"SELECT {', '.join(_COLS)} FROM entries WHERE call_id = ? AND seq IS ? AND segment IS NOT NULL",
+                    (call_id, int(seq) if seq.isdigit() else None)).fetchone()
+                entry = dict(zip(_COLS, row)) if row else None
+            if entry is None:
+                raise FileNotFoundError(rel)
+            return self._read_record(entry["segment"], entry["offset"]).get("payload") or {}
+        path = self.base_dir / rel
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        entry = self.get(rel)
+        if not entry or not entry.get("archive"):
+            raise FileNotFoundError(str(path))
+        with tarfile.open(self.base_dir / entry["archive"], "r:gz") as tar:
+            member = tar.extractfile(rel)
+            if member is None:
+                raise FileNotFoundError(f"{rel} in {entry['archive']}")
+            return json.load(io.TextIOWrapper(member, encoding="utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        n, archived, size = conn.execute(
+            "SELECT COUNT(*), COUNT(archive), COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()
+        return {"path": str(self.path), "entries": n, "archived": archived, "size_bytes": size}
+
+    # -------- compaction ---------------------------------------------------------
+
+    def compact(self, older_than_days: float = 14.0, segment_max_bytes: int = 64 * 1024 * 1024) -> Dict[str, Any]:
+        """
+        Archive cold flat files and run folders (whole folders, never split) into
+        tar.gz archives, then gzip cold journal segments. Each archive is written to a
+        temp name, renamed, recorded in the manifest, and only then are the originals removed.
+        """
+        self.refresh()
+        cutoff = time.time() - float(older_than_days) * 86400
+        conn = self._conn()
+        # Top-level items whose newest file is older than the cutoff
+        cold = [r[0] for r in conn.execute(
+            "SELECT top FROM entries WHERE archive IS NULL AND segment IS NULL"
+            " GROUP BY top HAVING MAX(mtime) < ? ORDER BY top", (cutoff,))]
+        out = {"archived_items": 0, "archives": [], "journal_segments": 0, "bytes_in": 0}
+        arch_dir = self.base_dir / ARCHIVE_DIR
+        batch: List[str] = []
+        batch_bytes = 0
+        for top in cold:
+            src = self.base_dir / top
+            if not src.exists():
+                continue
+            size = _tree_size(src)
+            if batch and batch_bytes + size > segment_max_bytes:
+                out["archives"].append(self._write_archive(arch_dir, batch))
+                batch, batch_bytes = [], 0
+            batch.append(top)
+            batch_bytes += size
+            out["bytes_in"] += size
+        if batch:
+            out["archives"].append(self._write_archive(arch_dir, batch))
+        out["archived_items"] = len(cold)
+        out["journal_segments"] = gzip_cold_segments(self.base_dir / JOURNAL_DIR, cutoff)
+        # Leftovers from an interrupted compaction (already archived, originals still here)
+        for (top,) in conn.execute("SELECT DISTINCT top FROM entries WHERE archive IS NOT NULL").fetchall():
+            _remove(self.base_dir / top)
+        if out["archives"] or out["journal_segments"]:
+            print(f"[exchange_archive] compacted {out['archived_items']} item(s) into "
+                  f"{len(out['archives'])} archive(s); gzipped {out['journal_segments']} journal segment(s)")
+        return out
+
+    def _write_archive(self, arch_dir: Path, tops: List[str]) -> str:
+        arch_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"exchanges_{tops[0].split('.')[0]}_{len(tops)}"
+        name, i = f"{stem}.tar.gz", 1
+        while (arch_dir / name).exists():
+            name, i = f"{stem}-{i}.tar.gz", i + 1
+        rel_archive = f"{ARCHIVE_DIR}/{name}"
+        dest = arch_dir / name
+        tmp = dest.with_name(dest.name + ".tmp")
+        with tarfile.open(tmp, "w:gz") as tar:
+            for top in tops:
+                tar.add(str(self.base_dir / top), arcname=top)
+        os.replace(tmp, dest)
+        conn = self._conn()
+        with conn:
+            conn.executemany("UPDATE entries SET archive = ? WHERE top = ? AND segment IS NULL",
+                             [(rel_archive, t) for t in tops])
+            conn.executemany("DELETE FROM dirs WHERE rel = ?", [(t,) for t in tops])
+        for top in tops:
+            _remove(self.base_dir / top)
+        return rel_archive
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _remove(path: Path) -> None:
+    try:
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+    except Exception as e:
+        print(f"[exchange_archive] could not remove {path}: {e}")
+
+
+def gzip_cold_segments(journal_dir: Path, cutoff: float) -> int:
+    """
+    gzip journal segments last written before `cutoff` (epoch seconds); returns how many.
+    Segments a writer may still append to are skipped: those open in this process, and
+    any written within twice the writers' idle-close time (a writer closes an idle
+    segment for good after SEGMENT_IDLE_CLOSE_SEC, so older ones are finished).
+    """
+    if not journal_dir.exists():
+        return 0
+    cutoff = min(cutoff, time.time() - 2 * SEGMENT_IDLE_CLOSE_SEC)
+    live = {p.resolve() for p in open_segments()}
+    n = 0
+    for seg in sorted(journal_dir.glob("*.jsonl")):
+        try:
+            if seg.stat().st_mtime >= cutoff or seg.resolve() in live:
+                continue
+            dest = seg.with_name(seg.name + ".gz")
+            tmp = seg.with_name(seg.name + ".gz.tmp")
+            with open(seg, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, dest)
+            seg.unlink()
+            n += 1
+        except Exception as e:
+            print(f"[exchange_archive] could not gzip {seg}: {e}")
+    return n
+
+
+_MANIFESTS: Dict[Path, Manifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(base_dir: Path) -> Manifest:
+    """Shared Manifest for an exchanges folder."""
+    base = Path(base_dir).resolve()
+    with _MANIFESTS_LOCK:
+        m = _MANIFESTS.get(base)
+        if m is None:
+            m = _MANIFESTS[base] = Manifest(base)
+        return m
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def compact(base_dir: Path, older_than_days: Optional[float] = None,
+            segment_max_mb: Optional[float] = None) -> Dict[str, Any]:
+    """compact() with AILYS_EXCHANGES_ARCHIVE_DAYS / AILYS_ARCHIVE_SEGMENT_MB defaults."""
+    days = _env_float("AILYS_EXCHANGES_ARCHIVE_DAYS", 14.0) if older_than_days is None else older_than_days
+    mb = _env_float("AILYS_ARCHIVE_SEGMENT_MB", 64.0) if segment_max_mb is None else segment_max_mb
+    out = get_manifest(base_dir).compact(days, int(mb * 1024 * 1024))
+    out["at_utc"] = datetime.utcnow().isoformat()
+    return out
@@ -0,0 +1,260 @@
+# core/exchange_journal.py
+"""
+Append-only journal for cognition exchange records.
+- Every lifecycle stage (queued, enqueue, preflight, exchange, ...) becomes one JSON
+  line in a segmented JSONL file instead of its own pretty-printed, fsync'd file.
+- A background writer thread drains the in-memory queue in batches and does one
+  flush+fsync per batch (group commit), so callers never block on disk.
+- Segments rotate by size; each process writes its own segments (no interleaving).
+  A segment left idle for SEGMENT_IDLE_CLOSE_SEC is closed for good (the next write
+  starts a new one), so retention can gzip segments older than that without racing
+  a writer; open_segments() lists the ones this process still holds open.
+- With a manifest (exchange_archive.Manifest), each written batch is indexed there
+  (call_id, model, timestamp, segment, byte offset), so listings never parse payloads.
+- Reader helpers rebuild the per-call view and can export the legacy
+  "<ts>_<call_id>/NNN_<stage>.json" folder layout on demand.
+"""
+
+from __future__ import annotations
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+_SEGMENT_GLOB = "*.jsonl*"
+SEGMENT_IDLE_CLOSE_SEC = 60.0
+
+_OPEN_SEGMENTS: Set[Path] = set()
+_OPEN_LOCK = threading.Lock()
+
+
+def open_segments() -> Set[Path]:
+    """Segments currently held open by journals in this process."""
+    with _OPEN_LOCK:
+        return set(_OPEN_SEGMENTS)
+
+
+def _open_segment_for_read(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+class ExchangeJournal:
+    def __init__(self, base_dir: Path, *, segment_max_bytes: int = 64 * 1024 * 1024,
+                 batch_max: int = 512, fsync: bool = True, manifest=None,
+                 idle_close_sec: float = SEGMENT_IDLE_CLOSE_SEC):
+        self.base_dir = Path(base_dir)
+        self.segment_max_bytes = int(segment_max_bytes)
+        self.batch_max = max(1, int(batch_max))
+        self.fsync = bool(fsync)
+        self.manifest = manifest
+        self.idle_close_sec = float(idle_close_sec)
+        self._q: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue()
+        self._seg_index = 0
+        self._seg_prefix = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}_{os.getpid()}"
+        self._fh = None
+        self._seg_path: Optional[Path] = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="ailys-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # -------- write side ------------------------------------------------------
+
+    def current_segment(self) -> Path:
+        """The segment the next batch goes to."""
+        if self._seg_path is not None and self._fh is not None:
+            return self._seg_path
+        index = self._seg_index + (1 if self._seg_path is not None else 0)
+        return self.base_dir / f"{self._seg_prefix}_{index:04d}.jsonl"
+
+    def append(self, record: Dict[str, Any]) -> str:
+        """
+        Queue one record for writing; returns a locator "<segment file>#<call_id>/<seq>".
+        Never blocks on disk and never throws on bad payloads (falls back to str()).
+        """
+        try:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+        except Exception:
+            line = json.dumps({k: str(v) for k, v in record.items()}, ensure_ascii=False)
+        self._q.put((line, record))
+        return f"{self.current_segment()}#{record.get('call_id', '')}/{record.get('seq', '')}"
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is on disk. Returns False on timeout."""
+        if timeout is None:
+            self._q.join()
+            return True
+        end = time.time() + float(timeout)
+        while self._q.unfinished_tasks and time.time() < end:
+            time.sleep(0.01)
+        return not self._q.unfinished_tasks
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(None)
+        self._writer.join(timeout=5)
+
+    def _roll_if_needed(self) -> None:
+        if self._fh is not None and self._fh.tell() < self.segment_max_bytes:
+            return
+        if self._seg_path is not None:
+            # full, or closed while idle: a finished segment is never reopened
+            self._close_segment()
+            self._seg_index += 1
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self._seg_path = self.base_dir / f"{self._seg_prefix}_{self._seg_index:04d}.jsonl"
+        # no newline translation, so offsets given to the manifest are byte offsets
+        self._fh = open(self._seg_path, "a", encoding="utf-8", newline="\n")
+        with _OPEN_LOCK:
+            _OPEN_SEGMENTS.add(self._seg_path)
+
+    def _close_segment(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        with _OPEN_LOCK:
+            _OPEN_SEGMENTS.discard(self._seg_path)
+
+    def _index(self, rows: List[Tuple[int, int, Dict[str, Any]]]) -> None:
+        if self.manifest is None or not rows:
+            return
+        try:
+            self.manifest.add_journal(self._seg_path, rows)
+        except Exception as e:
+            print(f"[journal] manifest ERROR ({len(rows)} record(s)): {e}")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=self.idle_close_sec)
+            except queue.Empty:
+                self._close_segment()
+                continue
+            batch = [first]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is None for item in batch)
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self._roll_if_needed()
+                    pos = self._fh.tell()
+                    rows = []
+                    for line, record in items:
+                        n = len(line.encode("utf-8")) + 1
+                        rows.append((pos, n, record))
+                        pos += n
+                    self._fh.write("\n".join(line for line, _ in items) + "\n")
+                    self._fh.flush()
+                    if self.fsync:
+                        try:
+                            os.fsync(self._fh.fileno())
+                        except Exception:
+                            pass
+                    self._index(rows)
+            except Exception as e:
+                print(f"[journal] ERROR writing {len(items)} record(s): {e}")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+            if stop:
+                self._close_segment()
+                return
+
+    # -------- read side -------------------------------------------------------
+
+    def segments(self) -> List[Path]:
+        if not self.base_dir.exists():
+            return []
+        return sorted(self.base_dir.glob(_SEGMENT_GLOB), key=lambda p: p.name)
+
+    def iter_records(self, call_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield every journal record (optionally for one call), oldest segment first."""
+        needle = f'"call_id": "{call_id}"' if call_id else None
+        for seg in self.segments():
+            try:
+                with _open_segment_for_read(seg) as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        if needle and needle not in line:
+                            continue
+                        try:
+                            rec = json.loads(line)
+                        except Exception:
+                            continue
+                        if call_id and rec.get("call_id") != call_id:
+                            continue
+                        yield rec
+            except Exception as e:
+                print(f"[journal] ERROR reading {seg}: {e}")
+
+    def read_call(self, call_id: str) -> List[Dict[str, Any]]:
+        """All records for one call, in the order they were written."""
+        self.flush(timeout=5)
+        if self.manifest is not None:
+            try:
+                records = self.manifest.journal_records(call_id)
+                if records:
+                    return records
+            except Exception as e:
+                print(f"[journal] manifest lookup failed for {call_id}, scanning segments: {e}")
+        return sorted(self.iter_records(call_id), key=lambda r: (r.get("seq") is None, r.get("seq") or 0))
+
+    def list_calls(self) -> List[Dict[str, Any]]:
+        """
+        One summary row per call: call_id, run folder name, first timestamp, model,
+        description, stages. Answered from the manifest when there is one.
+        """
+        self.flush(timeout=5)
+        if self.manifest is not None:
+            return self.manifest.journal_calls()
+        calls: Dict[str, Dict[str, Any]] = {}
+        for rec in self.iter_records():
+            cid = rec.get("call_id") or ""
+            payload = rec.get("payload") or {}
+            row = calls.setdefault(cid, {
+                "call_id": cid,
+                "run": rec.get("run"),
+                "timestamp_utc": payload.get("timestamp_utc"),
+                "model": payload.get("model"),
+                "description": payload.get("description"),
+                "stages": [],
+            })
+            row["stages"].append(rec.get("name"))
+            if not row.get("model") and payload.get("model"):
+                row["model"] = payload.get("model")
+        return list(calls.values())
+
+    def export_call(self, call_id: str, dest_base: Path) -> Optional[Path]:
+        """
+        Re-create the legacy folder layout for one call under dest_base:
+        <run>/<NNN>_<stage>.json. Returns the folder, or None if the call is unknown.
+        """
+        records = self.read_call(call_id)
+        if not records:
+            return None
+        run_name = records[0].get("run") or call_id
+        out_dir = Path(dest_base) / run_name
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for i, rec in enumerate(records):
+            n = rec.get("seq") if isinstance(rec.get("seq"), int) else i
+            name = rec.get("name") or rec.get("kind") or "record"
+            path = out_dir / f"{n:03d}_{name}.json"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rec.get("payload"), f, ensure_ascii=False, indent=2)
+        return out_dir
@@ -0,0 +1,108 @@
+# core/json_stream.py
+"""
+Incremental extraction of array items from streamed JSON text.
+- Feed raw model output chunk by chunk; every object inside the target array
+  ({"items": [ {...}, {...} ]} or a bare top-level [ ... ]) is returned as soon as
+  its closing brace arrives.
+- Items completed before a truncation or a later syntax error are kept; only the
+  unfinished tail is lost.
+- Tolerates prose or ``` fences around the JSON (braces inside strings are ignored).
+"""
+
+from __future__ import annotations
+import json
+from typing import Any, Dict, List, Optional
+
+
+class JsonItemStream:
+    def __init__(self, items_key: str = "items"):
+        self.items_key = items_key
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_chars: List[str] = []
+        self._last_str: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._array_depth: Optional[int] = None   # depth inside the target array
+        self._collecting = False                  # inside an item object
+        self._item_chars: List[str] = []
+        self.items: List[Dict[str, Any]] = []
+        self.bad_items = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume a chunk; returns the items completed by it."""
+        done: List[Dict[str, Any]] = []
+        for ch in text or "":
+            if self._collecting:
+                self._item_chars.append(ch)
+
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    self._last_str = "".join(self._str_chars)
+                else:
+                    self._str_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                self._str_chars = []
+            elif ch == ":":
+                # a key at the top-level object (depth 1) names the next value
+                self._pending_key = self._last_str if self._depth == 1 else None
+            elif ch == "{":
+                if self._array_depth is not None and self._depth == self._array_depth and not self._collecting:
+                    self._collecting = True
+                    self._item_chars = ["{"]
+                self._depth += 1
+            elif ch == "[":
+                if self._array_depth is None and (
+                        self._depth == 0 or (self._depth == 1 and self._pending_key == self.items_key)):
+                    self._array_depth = self._depth + 1
+                self._depth += 1
+            elif ch in "}]":
+                self._depth = max(0, self._depth - 1)
+                if ch == "}" and self._collecting and self._depth == self._array_depth:
+                    item = self._parse("".join(self._item_chars))
+                    self._collecting = False
+                    self._item_chars = []
+                    if item is not None:
+                        self.items.append(item)
+                        done.append(item)
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._array_depth = -1   # array closed; ignore anything after it
+            elif ch == "," and self._depth == 1:
+                self._pending_key = None
+        return done
+
+    def _parse(self, blob: str) -> Optional[Dict[str, Any]]:
+        try:
+            val = json.loads(blob)
+        except Exception:
+            self.bad_items += 1
+            return None
+        if not isinstance(val, dict):
+            self.bad_items += 1
+            return None
+        return val
+
+    @property
+    def closed(self) -> bool:
+        """True once the target array's closing bracket has been seen."""
+        return self._array_depth == -1
+
+    @property
+    def in_item(self) -> bool:
+        """True when the stream stopped in the middle of an item (truncation)."""
+        return self._collecting
+
+
+def parse_items(text: str, items_key: str = "items") -> List[Dict[str, Any]]:
+    """Every complete item in a (possibly truncated) JSON response."""
+    stream = JsonItemStream(items_key)
+    stream.feed(text)
+    return stream.items
@@ -2,7 +2,7 @@
 import os, uuid
 from datetime import datetime
 from difflib import unified_diff
-from memory.memory import save_memory_event
+from memory.memory import save_memory_event, batch as memory_batch
 
 from .storage import (
     insert, KS_DIR, get_or_create_collection,
@@ -56,7 +56,12 @@ def review_folder(root_path: str, actor_hint: str|None=None, mode: str = "auto")
     mode:
       - "auto": parse change logs + compute file diffs
       - "log_only": only parse change logs (downloaded/archive spaces)
+    Memory events (one per log row / diff) are buffered and committed in batches.
     """
+    with memory_batch():
+        return _review_folder(root_path, actor_hint, mode)
+
+def _review_folder(root_path: str, actor_hint: str|None, mode: str) -> dict:
     collection_id, label = get_or_create_collection(root_path)
     files_seen = edits = logs_parsed = 0
     total_bytes = 0
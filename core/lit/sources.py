@@ -1,6 +1,7 @@
 # core/lit/sources.py
 import os, time, json, math, xml.etree.ElementTree as ET
 from typing import Dict, List, Optional, Iterable, Tuple
+from urllib.parse import urlparse
 import requests
 from core.approval_queue import request_approval
 
@@ -10,14 +11,31 @@ def _sleep():
     time.sleep(DEFAULT_SLEEP_SEC)
 
 # ---- approval-wrapped GET ---------------------------------------------------
+# Header → env var holding its secret; never written to the approval store, re-read on replay.
+_SECRET_HEADERS = {"x-api-key": "SEMANTIC_SCHOLAR_KEY"}
+
 def _get(url: str, params: Optional[Dict]=None, headers: Optional[Dict]=None, desc: Optional[str]=None):
-    def _do():
+    def _do(_ov=None):
         resp = requests.get(url, params=params, headers=headers, timeout=30)
         resp.raise_for_status()
         return resp
-    approved = request_approval(description=desc or f"HTTP GET {url}", call_fn=_do)
+    public_headers = {k: v for k, v in (headers or {}).items() if k.lower() not in _SECRET_HEADERS}
+    approved = request_approval(description=desc or f"HTTP GET {url}", call_fn=_do, kind="http",
+                                meta={"provider": urlparse(url).hostname or ""},
+                                spec={"replayer": "core.lit.sources:_replay_get",
+                                      "args": {"url": url, "params": params, "headers": public_headers}})
     return approved
 
+def _replay_get(args: Dict, overrides: Optional[Dict]=None):
+    """Approval-store replayer for _get (secret headers come back from the environment)."""
+    headers = dict(args.get("headers") or {})
+    for name, env in _SECRET_HEADERS.items():
+        if os.getenv(env):
+            headers[name] = os.getenv(env)
+    resp = requests.get(args["url"], params=args.get("params"), headers=headers, timeout=30)
+    resp.raise_for_status()
+    return resp
+
 # ---- helpers ----------------------------------------------------------------
 def _norm_authors(auths) -> List[str]:
     out = []
@@ -0,0 +1,138 @@
+# core/llm_clients.py
+"""
+Process-wide registry of long-lived OpenAI SDK clients.
+- One client per (provider, base_url, api_key, timeout) so the underlying httpx
+  connection pool (keep-alive, TLS sessions) survives across calls.
+- Clients are shared by every task thread; the SDK client itself is thread-safe.
+- invalidate_clients() retires everything (e.g., after the Config tab saves).
+  Retired clients are closed once the last in-flight call using them returns.
+"""
+
+from __future__ import annotations
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+ClientKey = Tuple[str, Optional[str], Optional[str], float]
+
+_LOCK = threading.Lock()
+_CLIENTS: Dict[ClientKey, Any] = {}
+_IN_USE: Dict[int, int] = {}          # id(client) -> active leases
+_RETIRED: Dict[int, Any] = {}         # id(client) -> client waiting for leases to drain
+
+
+def _pool_limits():
+    """Keep-alive settings for the shared httpx pool (None if httpx is unavailable)."""
+    try:
+        import httpx
+    except Exception:
+        return None
+    try:
+        max_conn = int(os.getenv("AILYS_HTTP_MAX_CONNECTIONS", "20"))
+    except Exception:
+        max_conn = 20
+    try:
+        expiry = float(os.getenv("AILYS_HTTP_KEEPALIVE_SEC", "60"))
+    except Exception:
+        expiry = 60.0
+    return httpx.Limits(max_connections=max_conn, max_keepalive_connections=max_conn, keepalive_expiry=expiry)
+
+
+def _build_client(provider: str, base_url: Optional[str], api_key: Optional[str], timeout: float):
+    try:
+        from openai import OpenAI
+    except Exception as e:
+        raise RuntimeError(f"OpenAI SDK not available: {e}")
+
+    kwargs: Dict[str, Any] = {}
+    if provider == "openai_compatible":
+        if base_url:
+            kwargs["base_url"] = base_url
+        if api_key:
+            kwargs["api_key"] = api_key
+    else:
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set. Add it in the Config tab.")
+        kwargs["api_key"] = api_key
+
+    kwargs["timeout"] = timeout
+    # Disable SDK-level retries: approval = one HTTP call
+    kwargs["max_retries"] = 0
+
+    limits = _pool_limits()
+    if limits is not None:
+        import httpx
+        kwargs["http_client"] = httpx.Client(limits=limits, timeout=timeout)
+    return OpenAI(**kwargs)
+
+
+def _get_locked(provider: str, base_url: Optional[str], api_key: Optional[str], timeout: float):
+    # caller holds _LOCK
+    key: ClientKey = (provider, base_url, api_key, float(timeout))
+    client = _CLIENTS.get(key)
+    if client is None:
+        client = _build_client(provider, base_url, api_key, float(timeout))
+        _CLIENTS[key] = client
+        print(f"[llm_clients] new client provider={provider} base_url={base_url or ''} timeout={timeout} "
+              f"(pool size={len(_CLIENTS)})")
+    return client
+
+
+def get_client(provider: str, base_url: Optional[str], api_key: Optional[str], timeout: float):
+    """Return the shared client for this key, creating it on first use."""
+    with _LOCK:
+        return _get_locked(provider, base_url, api_key, timeout)
+
+
+@contextmanager
+def lease_client(provider: str, base_url: Optional[str], api_key: Optional[str], timeout: float) -> Iterator[Any]:
+    """
+    Borrow the shared client for the duration of one call. Guarantees a client that
+    is invalidated mid-call is not closed underneath the caller.
+    """
+    with _LOCK:
+        client = _get_locked(provider, base_url, api_key, timeout)
+        cid = id(client)
+        _IN_USE[cid] = _IN_USE.get(cid, 0) + 1
+    try:
+        yield client
+    finally:
+        to_close = None
+        with _LOCK:
+            n = _IN_USE.get(cid, 1) - 1
+            if n <= 0:
+                _IN_USE.pop(cid, None)
+                to_close = _RETIRED.pop(cid, None)
+            else:
+                _IN_USE[cid] = n
+        if to_close is not None:
+            _close_quietly(to_close)
+
+
+def invalidate_clients() -> int:
+    """
+    Drop every cached client. Idle ones are closed now; busy ones when their last
+    lease is released. Returns the number of clients retired.
+    """
+    with _LOCK:
+        old = list(_CLIENTS.values())
+        _CLIENTS.clear()
+        idle = []
+        for client in old:
+            if _IN_USE.get(id(client)):
+                _RETIRED[id(client)] = client
+            else:
+                idle.append(client)
+    for client in idle:
+        _close_quietly(client)
+    if old:
+        print(f"[llm_clients] invalidated {len(old)} client(s)")
+    return len(old)
+
+
+def _close_quietly(client: Any) -> None:
+    try:
+        client.close()
+    except Exception:
+        pass
@@ -0,0 +1,169 @@
+# core/rate_limiter.py
+"""
+Client-side request/token rate scheduler for cognition calls.
+- One pair of token buckets (requests-per-minute, tokens-per-minute) per (provider, model).
+- Callers block in acquire() until both buckets allow the call, so bulk runs are
+  spread out instead of bursting into HTTP 429s.
+- A provider's Retry-After pauses that key for everyone (pause()).
+- Token usage is estimated up front and settled with the real count afterwards.
+- stats() exposes queue depth, wait-time and 429 counters for the GUI/logs.
+A limit of 0 (or None) means "unlimited" for that dimension.
+"""
+
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+Key = Tuple[str, str]  # (provider, model)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. `take` may drive the level negative ("debt") so a single
+    request larger than the burst capacity still goes through once the bucket is full,
+    and the long-run rate stays exact.
+    """
+
+    def __init__(self, per_minute: float, burst_sec: float):
+        self.rate = float(per_minute) / 60.0
+        self.capacity = max(1.0, self.rate * float(burst_sec))
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        self._refill(now)
+        need = min(float(amount), self.capacity)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= float(amount)
+
+    def give_back(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + float(amount))
+
+
+@dataclass
+class _KeyState:
+    rpm: Optional[TokenBucket]
+    tpm: Optional[TokenBucket]
+    limits: Tuple[float, float]
+    blocked_until: float = 0.0
+    waiting: int = 0
+    granted: int = 0
+    throttled: int = 0          # 429s reported via pause()
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=256))
+
+
+class RateScheduler:
+    def __init__(self, burst_sec: float = 10.0):
+        self.burst_sec = float(burst_sec)
+        self._lock = threading.Lock()
+        self._keys: Dict[Key, _KeyState] = {}
+
+    def _state(self, key: Key, rpm: float, tpm: float) -> _KeyState:
+        # caller holds _lock; limits changing (Config tab) rebuilds the buckets
+        st = self._keys.get(key)
+        if st is None or st.limits != (rpm, tpm):
+            st_new = _KeyState(
+                rpm=TokenBucket(rpm, self.burst_sec) if rpm else None,
+                tpm=TokenBucket(tpm, self.burst_sec) if tpm else None,
+                limits=(rpm, tpm),
+            )
+            if st is not None:
+                st_new.blocked_until = st.blocked_until
+                st_new.waiting = st.waiting
+            st = st_new
+            self._keys[key] = st
+        return st
+
+    def acquire(self, provider: str, model: str, est_tokens: int, *, rpm: float = 0, tpm: float = 0,
+                poll_cap: float = 1.0) -> float:
+        """Block until one request of ~est_tokens may be sent. Returns seconds waited."""
+        key = (provider, model)
+        start = time.monotonic()
+        with self._lock:
+            st = self._state(key, float(rpm or 0), float(tpm or 0))
+            st.waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    st = self._state(key, float(rpm or 0), float(tpm or 0))
+                    now = time.monotonic()
+                    wait = st.blocked_until - now
+                    if wait <= 0:
+                        w_req = st.rpm.wait_for(1, now) if st.rpm else 0.0
+                        w_tok = st.tpm.wait_for(est_tokens, now) if st.tpm else 0.0
+                        wait = max(w_req, w_tok)
+                        if wait <= 0:
+                            if st.rpm:
+                                st.rpm.take(1, now)
+                            if st.tpm:
+                                st.tpm.take(est_tokens, now)
+                            break
+                time.sleep(max(0.005, min(wait, poll_cap)))
+        finally:
+            waited = time.monotonic() - start
+            with self._lock:
+                st = self._keys.get(key)
+                if st is not None:
+                    st.waiting = max(0, st.waiting - 1)
+                    st.granted += 1
+                    st.wait_total += waited
+                    st.wait_max = max(st.wait_max, waited)
+                    st.recent_waits.append(waited)
+        return waited
+
+    def settle(self, provider: str, model: str, est_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the TPM bucket once the provider reports real usage."""
+        if not isinstance(actual_tokens, int):
+            return
+        with self._lock:
+            st = self._keys.get((provider, model))
+            if st is None or st.tpm is None:
+                return
+            diff = actual_tokens - est_tokens
+            if diff > 0:
+                st.tpm.take(diff, time.monotonic())
+            elif diff < 0:
+                st.tpm.give_back(-diff)
+
+    def pause(self, provider: str, model: str, seconds: float) -> None:
+        """Hold every caller for this key for `seconds` (Retry-After from a 429)."""
+        with self._lock:
+            st = self._keys.get((provider, model))
+            if st is None:
+                st = self._state((provider, model), 0.0, 0.0)
+            st.blocked_until = max(st.blocked_until, time.monotonic() + max(0.0, float(seconds)))
+            st.throttled += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            now = time.monotonic()
+            for (prov, model), st in self._keys.items():
+                waits = sorted(st.recent_waits)
+                p95 = waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0
+                out[f"{prov}:{model}"] = {
+                    "rpm_limit": st.limits[0] or None,
+                    "tpm_limit": st.limits[1] or None,
+                    "queue_depth": st.waiting,
+                    "granted": st.granted,
+                    "throttled_429": st.throttled,
+                    "paused_for_sec": round(max(0.0, st.blocked_until - now), 3),
+                    "wait_avg_sec": round(st.wait_total / st.granted, 4) if st.granted else 0.0,
+                    "wait_p95_sec": round(p95, 4),
+                    "wait_max_sec": round(st.wait_max, 4),
+                }
+        return out
@@ -0,0 +1,202 @@
+# core/response_cache.py
+"""
+Content-addressed, on-disk cache for cognition responses.
+- Keyed on a canonical SHA-256 of (provider, model, messages, temperature, token param).
+- Backed by a single SQLite file (WAL) so concurrent task threads can share it.
+- Size- and age-based eviction; hit/miss counters are kept per process and on disk.
+Opt-in: artificial_cognition only consults it when AILYS_CACHE is truthy.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DDL = """
+PRAGMA journal_mode=WAL;
+
+CREATE TABLE IF NOT EXISTS responses(
+  key TEXT PRIMARY KEY,
+  provider TEXT,
+  model TEXT,
+  raw_text TEXT,
+  usage_json TEXT,
+  size_bytes INTEGER,
+  created_at REAL,
+  last_hit_at REAL,
+  hits INTEGER DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at);
+CREATE INDEX IF NOT EXISTS idx_responses_last_hit ON responses(last_hit_at);
+
+CREATE TABLE IF NOT EXISTS counters(
+  name TEXT PRIMARY KEY,
+  value INTEGER
+);
+"""
+
+
+def canonical_key(provider: str, model: str, messages: List[Dict[str, Any]],
+                  temperature: Optional[float], token_param: Optional[str],
+                  token_value: Optional[int], extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Stable hash for a request. Dict keys are sorted and separators fixed so the
+    same logical request always produces the same key across processes.
+    `extra` (e.g. response_format) only enters the hash when given, so existing keys stay valid.
+    """
+    payload = {
+        "provider": (provider or "").strip().lower(),
+        "model": (model or "").strip(),
+        "messages": [{"role": m.get("role"), "content": m.get("content")} for m in (messages or [])],
+        "temperature": temperature,
+        "token_param": token_param,
+        "token_value": token_value,
+    }
+    if extra:
+        payload["extra"] = extra
+    blob = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe SQLite cache. One connection per thread (sqlite3 connections are
+    not shareable by default); eviction runs at most every `evict_every` puts.
+    """
+
+    def __init__(self, path: Path, *, max_bytes: int = 256 * 1024 * 1024,
+                 max_age_sec: float = 30 * 86400, evict_every: int = 50):
+        self.path = Path(path)
+        self.max_bytes = int(max_bytes)
+        self.max_age_sec = float(max_age_sec)
+        self.evict_every = max(1, int(evict_every))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(DDL)
+        conn.commit()
+
+    # -------- connection handling -------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO counters(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    # -------- public API -----------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {'provider','model','raw_text','usage'} or None (expired rows count as misses)."""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT provider, model, raw_text, usage_json, created_at FROM responses WHERE key=?",
+            (key,)
+        ).fetchone()
+        if row and (self.max_age_sec <= 0 or now - float(row[4] or 0) <= self.max_age_sec):
+            conn.execute("UPDATE responses SET hits = hits + 1, last_hit_at=? WHERE key=?", (now, key))
+            self._bump(conn, "hits")
+            conn.commit()
+            with self._lock:
+                self.hits += 1
+            try:
+                usage = json.loads(row[3]) if row[3] else None
+            except Exception:
+                usage = None
+            return {"provider": row[0], "model": row[1], "raw_text": row[2] or "", "usage": usage}
+
+        if row:
+            conn.execute("DELETE FROM responses WHERE key=?", (key,))
+        self._bump(conn, "misses")
+        conn.commit()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, *, provider: str, model: str, raw_text: str,
+            usage: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        usage_json = json.dumps(usage, ensure_ascii=False) if usage else None
+        size = len((raw_text or "").encode("utf-8")) + len(usage_json or "")
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses(key, provider, model, raw_text, usage_json, size_bytes, "
+            "created_at, last_hit_at, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, provider, model, raw_text or "", usage_json, size, now, now)
+        )
+        conn.commit()
+        with self._lock:
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= self.evict_every
+            if due:
+                self._puts_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows, then least-recently-hit rows until under max_bytes. Returns rows removed."""
+        conn = self._conn()
+        removed = 0
+        if self.max_age_sec > 0:
+            cur = conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_sec,))
+            removed += cur.rowcount or 0
+
+        if self.max_bytes > 0:
+            total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for key, size in conn.execute("SELECT key, size_bytes FROM responses ORDER BY last_hit_at ASC"):
+                    victims.append((key,))
+                    freed += int(size or 0)
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key=?", victims)
+                removed += len(victims)
+        if removed:
+            self._bump(conn, "evictions")
+        conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()
+        persisted = {name: value for name, value in conn.execute("SELECT name, value FROM counters")}
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "size_bytes": size,
+                "session_hits": self.hits,
+                "session_misses": self.misses,
+                "total_hits": persisted.get("hits", 0),
+                "total_misses": persisted.get("misses", 0),
+                "evictions": persisted.get("evictions", 0),
+            }
@@ -0,0 +1,85 @@
+# core/single_flight.py
+"""
+Single-flight call coalescing.
+- The first caller for a key (the "leader") runs the function; callers arriving with
+  the same key while it is in flight wait and receive the leader's result (or its
+  exception) instead of running their own.
+- A follower waits at most its own timeout; if the leader has not landed by then it
+  gets FlightTimeout (the leader keeps running for everyone else).
+- Nothing is remembered once the flight lands: this is de-duplication of concurrent
+  work, not a cache.
+- Counters (leaders / coalesced / in-flight) for logs and the GUI.
+"""
+
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class FlightTimeout(TimeoutError):
+    """A follower's wait for the leader's result ran out."""
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run fn once per concurrent key. Returns (result, shared) where shared is True
+        for callers that received another caller's result. timeout bounds a follower's
+        wait (None = until the leader lands); it does not apply to the leader's fn.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    flight.waiters -= 1
+                raise FlightTimeout(f"in-flight request still running after {timeout}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+                "waiting": sum(f.waiters for f in self._flights.values()),
+            }
@@ -0,0 +1,170 @@
+# core/token_estimator.py
+"""
+Local token counting for cognition requests (no network, no approval needed).
+- Per-model profiles: context window, tokenizer encoding, chars-per-token ratio.
+- Uses tiktoken when it is installed; otherwise a fast chars-per-token estimate
+  that errs on the high side so preflight checks stay conservative.
+- Helpers to size requests up front: count_message_tokens(), clamp_max_tokens(),
+  fit_text() (trim a document to a token budget).
+- Open-weight families (llama, mistral, qwen, ...) ship with very different windows
+  per release and per server setting, so they only get a chars-per-token ratio; their
+  window counts as unknown (preflight just logs) unless AILYS_CONTEXT_WINDOW is set.
+Overrides: AILYS_CONTEXT_WINDOW (tokens) applies to every model.
+"""
+
+from __future__ import annotations
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    context_window: int
+    encoding: Optional[str]        # tiktoken encoding name (None = approximate only)
+    chars_per_token: float         # fallback ratio; lower = more conservative
+
+
+# Longest matching prefix wins; unknown models fall back to _DEFAULT_PROFILE.
+_PROFILES: Dict[str, ModelProfile] = {
+    "gpt-5":         ModelProfile(400_000, "o200k_base", 3.6),
+    "gpt-4.1":       ModelProfile(1_047_576, "o200k_base", 3.6),
+    "gpt-4o":        ModelProfile(128_000, "o200k_base", 3.6),
+    "o1":            ModelProfile(200_000, "o200k_base", 3.6),
+    "o3":            ModelProfile(200_000, "o200k_base", 3.6),
+    "o4":            ModelProfile(200_000, "o200k_base", 3.6),
+    "gpt-4-turbo":   ModelProfile(128_000, "cl100k_base", 3.4),
+    "gpt-4-32k":     ModelProfile(32_768, "cl100k_base", 3.4),
+    "gpt-4":         ModelProfile(8_192, "cl100k_base", 3.4),
+    "gpt-3.5-turbo": ModelProfile(16_385, "cl100k_base", 3.4),
+}
+_DEFAULT_PROFILE = ModelProfile(8_192, None, 3.2)
+
+# Tokenizer ratios only (the window is not implied by the family name).
+_FAMILY_CHARS_PER_TOKEN: Dict[str, float] = {
+    "llama": 3.2,
+    "mistral": 3.2,
+    "qwen": 3.0,
+}
+
+# Chat framing overhead (role markers etc.), matching OpenAI's published counting recipe.
+_PER_MESSAGE = 4
+_PER_REPLY = 3
+
+_ENC_CACHE: Dict[str, Any] = {}
+_ENC_LOCK = threading.Lock()
+
+
+def profile_for(model: Optional[str]) -> ModelProfile:
+    name = (model or "").strip().lower()
+    best = None
+    for prefix in _PROFILES:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best:
+        prof = _PROFILES[best]
+    else:
+        ratio = next((r for fam, r in _FAMILY_CHARS_PER_TOKEN.items() if name.startswith(fam)),
+                     _DEFAULT_PROFILE.chars_per_token)
+        prof = ModelProfile(_DEFAULT_PROFILE.context_window, None, ratio)
+    try:
+        override = int(os.getenv("AILYS_CONTEXT_WINDOW", "0") or 0)
+    except Exception:
+        override = 0
+    if override > 0:
+        prof = ModelProfile(override, prof.encoding, prof.chars_per_token)
+    return prof
+
+
+def context_window(model: Optional[str]) -> int:
+    return profile_for(model).context_window
+
+
+def has_profile(model: Optional[str]) -> bool:
+    """True when the window is actually known (a profile matched or AILYS_CONTEXT_WINDOW is set)."""
+    name = (model or "").strip().lower()
+    if any(name.startswith(prefix) for prefix in _PROFILES):
+        return True
+    try:
+        return int(os.getenv("AILYS_CONTEXT_WINDOW", "0") or 0) > 0
+    except Exception:
+        return False
+
+
+def _encoding(name: Optional[str]):
+    """tiktoken encoding (cached), or None when tiktoken/the encoding is unavailable."""
+    if not name:
+        return None
+    with _ENC_LOCK:
+        if name in _ENC_CACHE:
+            return _ENC_CACHE[name]
+        try:
+            import tiktoken
+            enc = tiktoken.get_encoding(name)
+        except Exception:
+            enc = None
+        _ENC_CACHE[name] = enc
+        return enc
+
+
+def count_tokens(text: Any, model: Optional[str] = None) -> int:
+    s = text if isinstance(text, str) else ("" if text is None else str(text))
+    if not s:
+        return 0
+    prof = profile_for(model)
+    enc = _encoding(prof.encoding)
+    if enc is not None:
+        try:
+            return len(enc.encode(s, disallowed_special=()))
+        except Exception:
+            pass
+    return int(math.ceil(len(s) / prof.chars_per_token))
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+    """Prompt tokens for a chat request, including per-message framing."""
+    total = _PER_REPLY
+    for m in messages or []:
+        total += _PER_MESSAGE + count_tokens(m.get("content"), model) + count_tokens(m.get("name"), model)
+    return total
+
+
+def clamp_max_tokens(prompt_tokens: int, requested: Optional[int], model: Optional[str],
+                     *, margin: int = 64) -> Tuple[Optional[int], int]:
+    """
+    Fit the output cap into what the context window leaves after the prompt.
+    Returns (max_tokens_to_send, room). `room` <= 0 means the prompt alone does not fit.
+    A requested cap of None stays None (the provider uses the remaining window).
+    """
+    room = context_window(model) - int(prompt_tokens) - int(margin)
+    if requested is None or room <= 0:
+        return requested, room
+    return min(int(requested), room), room
+
+
+def fit_text(text: str, max_tokens: int, model: Optional[str] = None, *, marker: str = " …") -> str:
+    """Trim text so it encodes to at most max_tokens (keeps the beginning)."""
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    prof = profile_for(model)
+    enc = _encoding(prof.encoding)
+    if enc is not None:
+        try:
+            ids = enc.encode(text, disallowed_special=())
+            return enc.decode(ids[:max_tokens]).rstrip() + marker
+        except Exception:
+            pass
+    # approximate: shrink by ratio until it fits (converges in a couple of steps)
+    cut = int(max_tokens * prof.chars_per_token)
+    while cut > 0 and count_tokens(text[:cut], model) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut].rstrip() + marker
+
+
+def input_budget(model: Optional[str], reserved_output: int, *, overhead: int = 0) -> int:
+    """Tokens available for prompt content once output and fixed prompt text are reserved."""
+    return max(0, context_window(model) - int(reserved_output) - int(overhead) - 64)
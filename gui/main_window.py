@@ -1,7 +1,7 @@
 import sys
 import os
 from typing import Optional
-from PySide6.QtGui import QCursor
+from PySide6.QtGui import QCursor, QTextCursor
 
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog,
@@ -62,6 +62,25 @@ class TaskRunnerThread(QThread):
             self.finished.emit(False, error_msg)
 
 
+class ChatStreamThread(QThread):
+    """Runs ChatSession.send_stream on a background thread, forwarding deltas to the GUI."""
+    delta = Signal(str)
+    finished = Signal(bool, str)  # success: bool, full reply or error message
+
+    def __init__(self, session, message: str, description: str = "GUI Chat"):
+        super().__init__()
+        self.session = session
+        self.message = message
+        self.description = description
+
+    def run(self):
+        try:
+            reply = self.session.send_stream(self.message, self.delta.emit, description=self.description)
+            self.finished.emit(True, reply)
+        except Exception as e:
+            self.finished.emit(False, str(e))
+
+
 class PipelineRunnerThread(QThread):
     """Run a sequence of (fn, kwargs) steps on a background thread."""
     update_status = Signal(str)
@@ -223,6 +242,15 @@ class AilysGUI(QWidget):
         self.create_memory_tab()
 
 
+        # Requests a previous session left waiting (approval store) come back as pending items.
+        if approvals.approval_queue.get_mode() == "manual":
+            try:
+                restored = approvals.restore_pending()
+                if restored:
+                    self.chat_log.append(f"↩️ Restored {restored} approval request(s) from the previous session.")
+            except Exception as e:
+                self.chat_log.append(f"⚠️ Could not restore saved approvals: {e}")
+
         self.approval_timer = QTimer()
         self.approval_timer.timeout.connect(self.check_approval_notifications)
         self.approval_timer.start(5000)  # every 5 seconds
@@ -264,9 +292,9 @@ class AilysGUI(QWidget):
 
         # No active tasks; if approvals pending, keep spinner on with an approvals label
         try:
-            pending = approvals.approval_queue.get_pending_requests()
+            pending = approvals.approval_queue.summary()["pending"]
             if pending:
-                self.global_busy.setFormat(f"Waiting for approvals… ({len(pending)})")
+                self.global_busy.setFormat(f"Waiting for approvals… ({pending})")
                 self.global_busy.setVisible(True)
                 # Do not re-enable tabs/cursor here; user is interacting anyway
                 return
@@ -303,9 +331,9 @@ class AilysGUI(QWidget):
     def _maybe_busy_for_approvals(self):
         """Keep spinner visible when approvals are pending, even if no task thread is running."""
         try:
-            pending = approvals.approval_queue.get_pending_requests()
+            pending = approvals.approval_queue.summary()["pending"]
             if pending and self._busy_active_count == 0:
-                self.global_busy.setFormat(f"Waiting for approvals… ({len(pending)})")
+                self.global_busy.setFormat(f"Waiting for approvals… ({pending})")
                 self.global_busy.setVisible(True)
             elif not pending and self._busy_active_count == 0:
                 self.global_busy.setVisible(False)
@@ -369,7 +397,20 @@ class AilysGUI(QWidget):
 
         # update info line (always)
         n = len(pending)
-        self.approvals_info.setText(f"Pending approvals: {n}" if n else "No pending approvals.")
+        info = f"Pending approvals: {n}" if n else "No pending approvals."
+        try:
+            m = approvals.metrics()
+            waits = [k["wait"] for k in m["by_kind"].values() if k["wait"]["count"]]
+            execs = [k["exec"] for k in m["by_kind"].values() if k["exec"]["count"]]
+            if waits:
+                info += (f" | wait p50 {max(w['p50'] for w in waits):.1f}s"
+                         f" p95 {max(w['p95'] for w in waits):.1f}s")
+            if execs:
+                info += f" | exec p95 {max(e['p95'] for e in execs):.1f}s"
+            info += f" | {m['throughput_per_min']['15m']:.1f}/min"
+        except Exception:
+            pass
+        self.approvals_info.setText(info)
 
         # if content didn't change, don't repaint; preserves selection automatically
         if new_ids == self._approvals_last_ids:
@@ -513,8 +554,7 @@ class AilysGUI(QWidget):
 
 
     def check_approval_notifications(self):
-        pending = approvals.approval_queue.get_pending_requests()
-        count = len(pending)
+        count = approvals.approval_queue.summary()["pending"]
         #print(f"[GUI timer] queue_id={id(approvals.approval_queue)} pending={count}")
 
         # only log when the number changes
@@ -687,6 +727,12 @@ class AilysGUI(QWidget):
                 except Exception:
                     pass
 
+                # Re-read LLM settings and drop pooled clients so new keys/base URLs take effect
+                try:
+                    ac.reload_config()
+                except Exception:
+                    pass
+
                 # Refresh the visible brain summary label
                 try:
                     self.parent().chat_log.append("Updated LLM provider/model configuration.")
@@ -1958,17 +2004,28 @@ class AilysGUI(QWidget):
 
         self.chat_display.append("Ailys is thinking... (may require approval)")
 
-        def _task():
-            try:
-                reply = self.chat_session.send(message, description="GUI Chat")
-                return True, reply
-            except Exception as e:
-                return False, str(e)
-
-        self.chat_thread = TaskRunnerThread(_task)
-        self.chat_thread.finished.connect(
-            lambda ok, msg: self.chat_display.append(f"Ailys: {msg.strip()}" if ok else f"❌ Error: {msg}")
-        )
+        # Tokens are rendered as they stream in; the "Ailys:" line opens on the first delta.
+        self._chat_stream_started = False
+
+        def _on_delta(text: str):
+            if not self._chat_stream_started:
+                self._chat_stream_started = True
+                self.chat_display.append("Ailys: ")
+            cursor = self.chat_display.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+            self.chat_display.setTextCursor(cursor)
+            self.chat_display.ensureCursorVisible()
+
+        def _on_done(ok: bool, msg: str):
+            if not ok:
+                self.chat_display.append(f"❌ Error: {msg}")
+            elif not self._chat_stream_started:
+                self.chat_display.append(f"Ailys: {msg.strip()}")
+
+        self.chat_thread = ChatStreamThread(self.chat_session, message, description="GUI Chat")
+        self.chat_thread.delta.connect(_on_delta)
+        self.chat_thread.finished.connect(_on_done)
         self.chat_thread.start()
 
     def _chat_reset_via_task(self):
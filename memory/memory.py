@@ -1,10 +1,107 @@
 
+import gzip
 import json
-from datetime import datetime
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 
 MEMORY_FILE = Path(__file__).parent / "crystallized_memory.jsonl"
 
+# Memory events live in SQLite (memory/store.py: tag/type indexes + full-text search);
+# the JSONL file is imported once. AILYS_MEMORY_STORE=jsonl keeps the old append-only file.
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def _sqlite_enabled() -> bool:
+    return (os.getenv("AILYS_MEMORY_STORE", "sqlite") or "sqlite").strip().lower() != "jsonl"
+
+def _db_path() -> Path:
+    cfg = (os.getenv("AILYS_MEMORY_DB", "") or "").strip()
+    if cfg:
+        p = Path(cfg).expanduser()
+        return p if p.is_absolute() else Path.cwd() / p
+    return Path(__file__).parent / "crystallized_memory.sqlite"
+
+def get_store():
+    """Shared MemoryStore (JSONL imported on first use), or None when using the JSONL backend."""
+    global _STORE
+    if not _sqlite_enabled():
+        return None
+    path = _db_path()
+    with _STORE_LOCK:
+        if _STORE is None or _STORE.path != path:
+            from memory.store import MemoryStore
+            _STORE = MemoryStore(path)
+            _STORE.migrate_jsonl(MEMORY_FILE)
+        return _STORE
+
+# Buffered writes: inside `with batch():` events are kept in memory (per thread) and
+# committed together: one transaction (or one file append) when the buffer reaches
+# AILYS_MEMORY_BATCH_SIZE events or AILYS_MEMORY_FLUSH_SEC seconds, and on exit.
+_batch_state = threading.local()
+
+def _env_num(name: str, default, cast):
+    try:
+        return cast(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+class _Batch:
+    def __init__(self, max_events: int, max_seconds: float):
+        self.max_events = max(1, int(max_events))
+        self.max_seconds = float(max_seconds)
+        self.events = []
+        self.last_flush = time.monotonic()
+        self.flushed = 0
+
+    def due(self) -> bool:
+        return (len(self.events) >= self.max_events
+                or (self.max_seconds > 0 and time.monotonic() - self.last_flush >= self.max_seconds))
+
+    def flush(self) -> int:
+        events, self.events = self.events, []
+        self.last_flush = time.monotonic()
+        if events:
+            _write_events(events)
+            self.flushed += len(events)
+        return len(events)
+
+@contextmanager
+def batch(max_events: int = None, max_seconds: float = None):
+    """
+    Buffer save_memory_event() calls made in this thread and commit them in batches.
+    Nested batch() blocks join the outer one. Reads (get_*) in the same thread flush first.
+    """
+    outer = getattr(_batch_state, "batch", None)
+    if outer is not None:
+        yield outer
+        return
+    b = _Batch(max_events if max_events is not None else _env_num("AILYS_MEMORY_BATCH_SIZE", 500, int),
+               max_seconds if max_seconds is not None else _env_num("AILYS_MEMORY_FLUSH_SEC", 2.0, float))
+    _batch_state.batch = b
+    try:
+        yield b
+    finally:
+        _batch_state.batch = None
+        b.flush()
+
+def flush_memory() -> int:
+    """Commit this thread's buffered events now (no-op outside batch())."""
+    b = getattr(_batch_state, "batch", None)
+    return b.flush() if b is not None else 0
+
+def _write_events(events) -> None:
+    store = get_store()
+    if store is not None:
+        store.add_many(events)
+        return
+    with open(MEMORY_FILE, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events))
+
 def save_memory_event(event_type, source_text, ai_insight, user_input=None, tags=None, file_path=None):
     event = {
         "timestamp": datetime.utcnow().isoformat(),
@@ -16,21 +113,143 @@ def save_memory_event(event_type, source_text, ai_insight, user_input=None, tags
         "file_path": file_path
     }
 
+    b = getattr(_batch_state, "batch", None)
+    if b is not None:
+        b.events.append(event)
+        if b.due():
+            b.flush()
+        return
+
+    store = get_store()
+    if store is not None:
+        store.add(event)
+        return
+
     with open(MEMORY_FILE, "a", encoding="utf-8") as f:
         f.write(json.dumps(event, ensure_ascii=False) + "\n")
 
 def get_all_memories():
+    flush_memory()
+    store = get_store()
+    if store is not None:
+        return store.all()
     if not MEMORY_FILE.exists():
         return []
     with open(MEMORY_FILE, "r", encoding="utf-8") as f:
         return [json.loads(line) for line in f if line.strip()]
 
 def get_memories_by_tag(tag: str):
+    flush_memory()
+    store = get_store()
+    if store is not None:
+        return store.by_tag(tag)
     return [m for m in get_all_memories() if tag in m.get("tags", [])]
 
 def get_ai_insights_by_tag(tag: str):
     return [m["ai_insight"] for m in get_memories_by_tag(tag) if "ai_insight" in m]
 
+def search_memories(text: str, limit: int = 20, tag: str = None):
+    """
+    Full-text search over source_text/ai_insight, best matches first
+    (FTS5 BM25 on the SQLite store; on the JSONL backend, a scan ranked by how many
+    query terms each memory contains). Long texts are reduced to their salient terms.
+    """
+    flush_memory()
+    store = get_store()
+    if store is not None:
+        return store.search(text, limit=limit, tag=tag)
+    from memory.store import query_terms
+    words = query_terms(text)
+    pool = get_memories_by_tag(tag) if tag else get_all_memories()
+    scored = []
+    for i, m in enumerate(pool):
+        hay = f"{m.get('source_text') or ''} {m.get('ai_insight') or ''}".lower()
+        n = sum(1 for w in words if w in hay)
+        if n:
+            scored.append((-n, -i, m))
+    scored.sort(key=lambda t: (t[0], t[1]))
+    return [m for _, _, m in scored[:limit]]
+
+# Retention: old bulk events leave the live store for gzip JSONL segments in memory/archive.
+ARCHIVE_DIR = Path(__file__).parent / "archive"
+
+def compact_memory(older_than_days: float = None, event_types=None, segment_max_mb: float = None):
+    """
+    Archive memories older than AILYS_MEMORY_ARCHIVE_DAYS (default 180) whose event_type
+    is in AILYS_MEMORY_ARCHIVE_TYPES (default "ks_log_entry,ks_file_delta", the per-row
+    Knowledge Space copies; "*" = every type) into gzip segments of at most
+    AILYS_ARCHIVE_SEGMENT_MB (default 64) uncompressed. On the SQLite backend the legacy
+    JSONL file, once fully imported, is archived as well. Returns a summary dict.
+    """
+    flush_memory()
+    days = _env_num("AILYS_MEMORY_ARCHIVE_DAYS", 180.0, float) if older_than_days is None else older_than_days
+    mb = _env_num("AILYS_ARCHIVE_SEGMENT_MB", 64.0, float) if segment_max_mb is None else segment_max_mb
+    if event_types is None:
+        spec = os.getenv("AILYS_MEMORY_ARCHIVE_TYPES", "ks_log_entry,ks_file_delta").strip()
+        event_types = None if spec == "*" else [t.strip() for t in spec.split(",") if t.strip()]
+    cutoff = (datetime.utcnow() - timedelta(days=float(days))).isoformat()
+    max_bytes = int(mb * 1024 * 1024)
+    out = {"cutoff_utc": cutoff, "segments": [], "legacy_jsonl": None}
+
+    store = get_store()
+    if store is not None:
+        out["segments"] = [str(p) for p in store.archive(cutoff, ARCHIVE_DIR, event_types, max_bytes)]
+        if MEMORY_FILE.exists() and store.jsonl_offset(MEMORY_FILE) == MEMORY_FILE.stat().st_size:
+            dest = ARCHIVE_DIR / f"crystallized_memory_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.jsonl.gz"
+            _gzip_move(MEMORY_FILE, dest)
+            store.forget_jsonl(MEMORY_FILE)
+            out["legacy_jsonl"] = str(dest)
+        return out
+
+    # JSONL backend: split the file into archived (old, selected types) and kept lines
+    if not MEMORY_FILE.exists():
+        return out
+    from memory.store import next_segment_path
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    tmp = MEMORY_FILE.with_name(MEMORY_FILE.name + ".tmp")
+    seg, seg_bytes = None, 0
+    size = MEMORY_FILE.stat().st_size
+    try:
+        with open(MEMORY_FILE, "rb") as src, open(tmp, "wb") as keep:
+            consumed = 0
+            for raw in iter(src.readline, b""):
+                consumed += len(raw)
+                line = raw.decode("utf-8", errors="replace")
+                if line.strip():
+                    try:
+                        m = json.loads(line)
+                    except Exception:
+                        m = None
+                    if not isinstance(m, dict) or str(m.get("timestamp") or "") >= cutoff or (
+                            event_types is not None and m.get("event_type") not in event_types):
+                        keep.write(raw)
+                    else:
+                        if seg is None or seg_bytes >= max_bytes:
+                            if seg is not None:
+                                seg.close()
+                            ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+                            path = next_segment_path(ARCHIVE_DIR, f"memory_{stamp}")
+                            seg, seg_bytes = gzip.open(path, "wb"), 0
+                            out["segments"].append(str(path))
+                        seg.write(raw)
+                        seg_bytes += len(raw)
+                if consumed >= size:
+                    break
+            keep.write(src.read())   # lines appended while we were compacting
+    finally:
+        if seg is not None:
+            seg.close()
+    os.replace(tmp, MEMORY_FILE)
+    return out
+
+def _gzip_move(src: Path, dest: Path) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    with open(src, "rb") as f, gzip.open(tmp, "wb") as g:
+        shutil.copyfileobj(f, g)
+    os.replace(tmp, dest)
+    src.unlink()
+
 # ==== Cognition exchange helpers (START) ====
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -39,46 +258,76 @@ from datetime import datetime
 
 _EXCH_DIR = Path(__file__).parent / "exchanges"
 
+def _manifest():
+    from core.exchange_archive import get_manifest
+    m = get_manifest(_EXCH_DIR)
+    m.refresh()
+    return m
+
 def list_exchanges(limit: Optional[int] = 100) -> List[Path]:
     """
-    Return the most recent exchange files (sorted newest-first).
+    Return the most recent top-level exchanges (newest first), from the manifest
+    index: files (archived ones included) and journal records without a run folder,
+    the latter as "<exchanges>/journal/<segment>#<call_id>/<seq>" locators.
+    load_exchange() reads any of them.
+    """
+    if not _EXCH_DIR.exists():
+        return []
+    return [_EXCH_DIR / e["rel"] for e in _manifest().find(top_level_only=True, limit=limit)]
+
+def find_exchanges(model: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                   limit: Optional[int] = 100, include_runs: bool = True) -> List[Dict[str, Any]]:
+    """
+    Manifest rows (rel, timestamp_utc, model, description, call_id, archive, segment, ...),
+    newest first, filtered by model substring and/or ISO timestamp range; both exchange
+    formats (folder files and journal records). Run-folder entries are included unless
+    include_runs=False. No payload is opened.
     """
     if not _EXCH_DIR.exists():
         return []
-    files = sorted(_EXCH_DIR.glob("*.json"), key=lambda p: p.name, reverse=True)
-    return files[:limit] if limit is not None else files
+    return _manifest().find(model=model, since=since, until=until,
+                            top_level_only=not include_runs, limit=limit)
 
 def load_exchange(path_or_name: str) -> Dict[str, Any]:
     """
-    Load a single persisted exchange JSON by absolute path or file name.
+    Load a single persisted exchange JSON by absolute path or file name, manifest name
+    (e.g. "<run>/003_exchange.json"), or journal locator, archived or not.
     """
     p = Path(path_or_name)
-    if not p.is_absolute():
-        p = _EXCH_DIR / p.name
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if p.is_absolute() and p.exists():
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    try:
+        rel = p.resolve().relative_to(_EXCH_DIR.resolve()).as_posix() if p.is_absolute() else p.as_posix()
+    except ValueError:
+        rel = p.name
+    from core.exchange_archive import get_manifest
+    manifest = get_manifest(_EXCH_DIR)
+    try:
+        return manifest.read_entry(rel)
+    except FileNotFoundError:
+        if rel == p.name:
+            raise
+        return manifest.read_entry(p.name)
 
 def get_memories_by_type(event_type: str):
     """
     Convenience: filter crystallized memory by event_type (e.g., 'cognition_exchange').
     """
+    flush_memory()
+    store = get_store()
+    if store is not None:
+        return store.by_type(event_type)
     return [m for m in get_all_memories() if m.get("event_type") == event_type]
 
 def find_exchanges_by_model(model_substr: str, limit: Optional[int] = 100) -> List[Path]:
     """
-    Simple filename scan; for richer filters, open JSON and inspect 'model' / 'description'.
-    """
-    model_substr = (model_substr or "").lower()
-    results: List[Path] = []
-    for p in list_exchanges(limit=None):
-        try:
-            with open(p, "r", encoding="utf-8") as f:
-                j = json.load(f)
-            if model_substr in str(j.get("model", "")).lower():
-                results.append(p)
-                if limit is not None and len(results) >= limit:
-                    break
-        except Exception:
-            continue
-    return results
+    Top-level exchanges (files or journal locators) whose model contains model_substr,
+    newest first, answered from the manifest index; see find_exchanges() for date
+    filters and run-folder entries.
+    """
+    if not _EXCH_DIR.exists():
+        return []
+    rows = _manifest().find(model=model_substr or None, top_level_only=True, limit=limit)
+    return [_EXCH_DIR / e["rel"] for e in rows]
 # ==== Ailys patch: cognition exchange helpers (END) ====
@@ -0,0 +1,363 @@
+# memory/store.py
+"""
+SQLite store for crystallized memory (replaces rescanning crystallized_memory.jsonl).
+- One row per memory event; tags live in their own table, indexed by (tag, id), and
+  event_type is indexed, so tag/type lookups no longer read the whole history.
+- FTS5 index over source_text and ai_insight (kept in sync by triggers, so every
+  save is searchable at once). search() ranks with BM25; long query texts are cut
+  down to their most discriminating terms (query tf × corpus idf from fts5vocab),
+  which keeps top-k recall in milliseconds. Without FTS5 it falls back to a LIKE scan.
+- migrate_jsonl() imports crystallized_memory.jsonl once; the imported byte offset
+  is remembered, so lines appended later by older code are picked up on the next open.
+- archive() moves old rows (optionally of some event types only) out of the live
+  store into size-bounded gzip JSONL segments (same line format as the old file).
+- WAL, one connection per thread (like response_cache).
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DDL = """
+PRAGMA journal_mode=WAL;
+
+CREATE TABLE IF NOT EXISTS memories(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  timestamp TEXT,
+  event_type TEXT,
+  source_text TEXT,
+  ai_insight TEXT,
+  user_input TEXT,
+  tags_json TEXT,
+  file_path TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_memories_type ON memories(event_type, id);
+
+CREATE TABLE IF NOT EXISTS memory_tags(
+  memory_id INTEGER,
+  tag TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_memory_tags_tag ON memory_tags(tag, memory_id);
+
+CREATE TABLE IF NOT EXISTS meta(
+  name TEXT PRIMARY KEY,
+  value TEXT
+);
+"""
+
+FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+  source_text, ai_insight, content='memories', content_rowid='id'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_vocab USING fts5vocab(memories_fts, 'row');
+
+CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+  INSERT INTO memories_fts(rowid, source_text, ai_insight) VALUES (new.id, new.source_text, new.ai_insight);
+END;
+
+CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+  INSERT INTO memories_fts(memories_fts, rowid, source_text, ai_insight)
+  VALUES ('delete', old.id, old.source_text, old.ai_insight);
+END;
+"""
+
+_COLS = "id, timestamp, event_type, source_text, ai_insight, user_input, tags_json, file_path"
+
+
+def _row_to_event(row: tuple) -> Dict[str, Any]:
+    """Same dict shape as a crystallized_memory.jsonl line."""
+    try:
+        tags = json.loads(row[6]) if row[6] else []
+    except Exception:
+        tags = []
+    return {
+        "timestamp": row[1],
+        "event_type": row[2],
+        "source_text": row[3],
+        "ai_insight": row[4],
+        "user_input": row[5],
+        "tags": tags,
+        "file_path": row[7],
+    }
+
+
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how if in into is it its
+may more most not of on or our such than that the their them then there these they this those to was
+we were what when which while who will with within would you your also between both each other over
+using used use about after all any based however only same some through under very via
+""".split())
+
+
+def query_terms(text: str, max_terms: int = 32) -> List[str]:
+    """
+    The most frequent content words of a (possibly long) query text: lowercased, no
+    stopwords or very short tokens, ties broken by first appearance.
+    """
+    counts: Dict[str, int] = {}
+    for w in re.findall(r"\w+", (text or "").lower(), flags=re.UNICODE):
+        if len(w) > 2 and w not in _STOPWORDS and not w.isdigit():
+            counts[w] = counts.get(w, 0) + 1
+    ranked = sorted(counts, key=lambda w: -counts[w])   # stable: first appearance wins ties
+    return ranked[:max(1, int(max_terms))]
+
+
+def fts_query(text: str, max_terms: int = 32) -> str:
+    """Free text → an FTS5 query: salient words quoted (no operator injection), OR-ed."""
+    return _or_query(query_terms(text, max_terms))
+
+
+def _or_query(terms: List[str]) -> str:
+    return " OR ".join(f'"{w}"' for w in terms)
+
+
+# Terms in more than this share of memories barely discriminate but dominate BM25 cost.
+_COMMON_DOC_SHARE = 0.25
+
+
+def next_segment_path(dest_dir: Path, prefix: str) -> Path:
+    """First unused "<prefix>_NNNN.jsonl.gz" in dest_dir."""
+    n = 0
+    while (Path(dest_dir) / f"{prefix}_{n:04d}.jsonl.gz").exists():
+        n += 1
+    return Path(dest_dir) / f"{prefix}_{n:04d}.jsonl.gz"
+
+
+class MemoryStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        try:
+            conn.executescript(FTS_DDL)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False   # no FTS5 in this SQLite build
+            print("[memory_store] FTS5 unavailable; search() uses a LIKE scan")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.executescript(DDL)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------- writes ---------------------------------------------------------
+
+    def _insert(self, conn: sqlite3.Connection, event: Dict[str, Any]) -> int:
+        tags = [str(t) for t in (event.get("tags") or [])]
+        cur = conn.execute(
+            "INSERT INTO memories(timestamp, event_type, source_text, ai_insight, user_input, tags_json, file_path)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (event.get("timestamp"), event.get("event_type"), event.get("source_text"),
+             event.get("ai_insight"), event.get("user_input"),
+             json.dumps(tags, ensure_ascii=False), event.get("file_path")))
+        mid = int(cur.lastrowid)
+        if tags:
+            conn.executemany("INSERT INTO memory_tags(memory_id, tag) VALUES (?, ?)",
+                             [(mid, t) for t in dict.fromkeys(tags)])
+        return mid
+
+    def add(self, event: Dict[str, Any]) -> int:
+        conn = self._conn()
+        mid = self._insert(conn, event)
+        conn.commit()
+        return mid
+
+    def add_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Insert events in one transaction."""
+        conn = self._conn()
+        n = 0
+        with conn:
+            for event in events:
+                self._insert(conn, event)
+                n += 1
+        return n
+
+    # -------- reads ----------------------------------------------------------
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(f"SELECT {_COLS} FROM memories ORDER BY id").fetchall()
+        return [_row_to_event(r) for r in rows]
+
+    def by_tag(self, tag: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            f"SELECT {_COLS} FROM memories WHERE id IN (SELECT memory_id FROM memory_tags WHERE tag = ?)"
+            " ORDER BY id", (tag,)).fetchall()
+        return [_row_to_event(r) for r in rows]
+
+    def by_type(self, event_type: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            f"SELECT {_COLS} FROM memories WHERE event_type = ? ORDER BY id", (event_type,)).fetchall()
+        return [_row_to_event(r) for r in rows]
+
+    def _select_terms(self, conn: sqlite3.Connection, text: str, max_terms: int) -> List[str]:
+        """Query terms by tf × idf against the index; unknown and near-ubiquitous terms dropped."""
+        candidates = query_terms(text, max_terms * 4)
+        if not candidates:
+            return []
+        tf = {w: len(candidates) - i for i, w in enumerate(candidates)}   # rank-based query weight
+        df = dict(conn.execute(
+            f"SELECT term, doc FROM memories_vocab WHERE term IN ({','.join('?' * len(candidates))})",
+            candidates).fetchall())
+        n = max(1, int(conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]))
+        known = [w for w in candidates if df.get(w)]
+        selective = [w for w in known if df[w] <= n * _COMMON_DOC_SHARE] or known
+        selective.sort(key=lambda w: -tf[w] * math.log(1.0 + n / df[w]))
+        return selective[:max_terms]
+
+    def search(self, text: str, limit: int = 20, tag: Optional[str] = None,
+               max_terms: int = 12) -> List[Dict[str, Any]]:
+        """
+        Full-text match on source_text/ai_insight, best first (BM25 with FTS5). Long
+        texts (e.g. an article's opening pages) are reduced to max_terms salient words.
+        """
+        conn = self._conn()
+        q = _or_query(self._select_terms(conn, text, max_terms)) if self.fts else fts_query(text, max_terms)
+        if not q:
+            return []
+        # correlated probe of the (tag, memory_id) index: only the FTS hits are checked
+        tag_sql = " AND EXISTS (SELECT 1 FROM memory_tags t WHERE t.tag = ? AND t.memory_id = m.id)" if tag else ""
+        tag_args: tuple = (tag,) if tag else ()
+        if self.fts:
+            rows = conn.execute(
+                f"SELECT {', '.join('m.' + c.strip() for c in _COLS.split(','))}"
+                f" FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid"
+                f" WHERE memories_fts MATCH ?{tag_sql} ORDER BY bm25(memories_fts) LIMIT ?",
+                (q, *tag_args, int(limit))).fetchall()
+        else:
+            words = [w.strip('"') for w in q.split(" OR ")]
+            like = " OR ".join("m.source_text LIKE ? OR m.ai_insight LIKE ?" for _ in words)
+            args = [a for w in words for a in (f"%{w}%", f"%{w}%")]
+            rows = conn.execute(
+                f"SELECT {', '.join('m.' + c.strip() for c in _COLS.split(','))} FROM memories m"
+                f" WHERE ({like}){tag_sql} ORDER BY m.id DESC LIMIT ?",
+                (*args, *tag_args, int(limit))).fetchall()
+        return [_row_to_event(r) for r in rows]
+
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM memories").fetchone()[0])
+
+    # -------- JSONL migration --------------------------------------------------
+
+    def jsonl_offset(self, jsonl_path: Path) -> int:
+        """Bytes of jsonl_path already imported."""
+        row = self._conn().execute("SELECT value FROM meta WHERE name = ?",
+                                   (f"jsonl_offset:{Path(jsonl_path).resolve()}",)).fetchone()
+        return int(row[0]) if row else 0
+
+    def forget_jsonl(self, jsonl_path: Path) -> None:
+        """Drop the import offset (the file was archived; a new one starts from 0)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM meta WHERE name = ?", (f"jsonl_offset:{Path(jsonl_path).resolve()}",))
+
+    def migrate_jsonl(self, jsonl_path: Path) -> int:
+        """
+        Import crystallized_memory.jsonl from the last imported byte offset (0 the first
+        time). Bad lines are skipped. Returns the number of events imported.
+        """
+        jsonl_path = Path(jsonl_path)
+        if not jsonl_path.exists():
+            return 0
+        conn = self._conn()
+        key = f"jsonl_offset:{jsonl_path.resolve()}"
+        offset = self.jsonl_offset(jsonl_path)
+        size = jsonl_path.stat().st_size
+        if size < offset:
+            offset = 0   # file was replaced
+        if size == offset:
+            return 0
+        events: List[Dict[str, Any]] = []
+        skipped = 0
+        with open(jsonl_path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break   # partial last line (still being written): next time
+                offset += len(raw)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except Exception:
+                    skipped += 1
+        with conn:
+            for event in events:
+                self._insert(conn, event)
+            conn.execute("INSERT OR REPLACE INTO meta(name, value) VALUES (?, ?)", (key, str(offset)))
+        if events or skipped:
+            print(f"[memory_store] migrated {len(events)} event(s) from {jsonl_path}"
+                  + (f" ({skipped} bad line(s) skipped)" if skipped else ""))
+        return len(events)
+
+    # -------- retention ---------------------------------------------------------
+
+    def archive(self, before_iso: str, dest_dir: Path, event_types: Optional[Iterable[str]] = None,
+                segment_max_bytes: int = 64 * 1024 * 1024) -> List[Path]:
+        """
+        Move memories with timestamp < before_iso (and event_type in event_types, if
+        given) into gzip JSONL segments under dest_dir, each closed once it holds
+        segment_max_bytes of uncompressed JSON (checked every 200 rows). Rows are
+        deleted only after their segment is complete on disk. Returns the segments.
+        """
+        dest_dir = Path(dest_dir)
+        types = list(event_types or [])
+        where = "timestamp < ?" + (f" AND event_type IN ({','.join('?' * len(types))})" if types else "")
+        args = (before_iso, *types)
+        conn = self._conn()
+        todo = [r[0] for r in conn.execute(f"SELECT id FROM memories WHERE {where} ORDER BY id", args)]
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        written: List[Path] = []
+        i = 0
+        while i < len(todo):
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            path = next_segment_path(dest_dir, f"memory_{stamp}")
+            tmp = path.with_name(path.name + ".tmp")
+            ids: List[int] = []
+            size = 0
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                while i < len(todo) and size < segment_max_bytes:
+                    chunk = todo[i:i + 200]
+                    i += len(chunk)
+                    rows = conn.execute(f"SELECT {_COLS} FROM memories WHERE id IN ({','.join('?' * len(chunk))})"
+                                        " ORDER BY id", chunk).fetchall()
+                    for row in rows:
+                        line = json.dumps(_row_to_event(row), ensure_ascii=False) + "\n"
+                        f.write(line)
+                        size += len(line.encode("utf-8"))
+                        ids.append(int(row[0]))
+            os.replace(tmp, path)
+            written.append(path)
+            self._delete_ids(ids)
+        if written:
+            if self.fts:
+                with conn:
+                    conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('optimize')")
+            print(f"[memory_store] archived into {len(written)} segment(s) under {dest_dir}")
+        return written
+
+    def _delete_ids(self, ids: List[int]) -> None:
+        conn = self._conn()
+        with conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM memory_tags WHERE memory_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM memories WHERE id IN ({marks})", chunk)
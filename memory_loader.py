@@ -6,7 +6,7 @@ import sys
 from dotenv import load_dotenv
 
 sys.path.append(os.path.abspath("memory"))
-from memory.memory import save_memory_event
+from memory.memory import save_memory_event, batch as memory_batch
 
 from core.approval_queue import request_approval  # ✅ add this near the top with other imports
 
@@ -47,7 +47,8 @@ Structured Review:
             model="gpt-4",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3
-        )
+        ),
+        kind="llm",
     ).choices[0].message.content.strip()
 
 
@@ -117,18 +118,20 @@ def load_txt(filepath):
         print(f"Error reading {filepath}: {e}")
 
 def load_reviews_to_memory():
-    for filename in os.listdir(REVIEW_DIR):
-        filepath = os.path.join(REVIEW_DIR, filename)
-        if filename.endswith(".xlsx"):
-            load_xlsx(filepath)
-        elif filename.endswith(".jsonl"):
-            load_jsonl(filepath)
-        elif filename.endswith(".json"):
-            load_json(filepath)
-        elif filename.endswith(".txt"):
-            load_txt(filepath)
-        else:
-            print(f"Skipped unsupported file: {filename}")
+    # one buffered writer for the whole import (committed in batches, not per row)
+    with memory_batch():
+        for filename in os.listdir(REVIEW_DIR):
+            filepath = os.path.join(REVIEW_DIR, filename)
+            if filename.endswith(".xlsx"):
+                load_xlsx(filepath)
+            elif filename.endswith(".jsonl"):
+                load_jsonl(filepath)
+            elif filename.endswith(".json"):
+                load_json(filepath)
+            elif filename.endswith(".txt"):
+                load_txt(filepath)
+            else:
+                print(f"Skipped unsupported file: {filename}")
 
 if __name__ == "__main__":
     load_reviews_to_memory()
@@ -1,6 +1,6 @@
 # tasks/chat.py
 from __future__ import annotations
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from dataclasses import dataclass, field
 from core import artificial_cognition as ac
 
@@ -48,6 +48,37 @@ class ChatSession:
         self.history.append({"role": "assistant", "content": reply})
         return reply
 
+    def send_stream(self, user_text: str, on_delta: Optional[Callable[[str], None]] = None,
+                    *, description: str = "Chat message") -> str:
+        """
+        Like send(), but renders as it generates: on_delta(text) is called for every
+        streamed fragment. Returns the full reply (also appended to history).
+        """
+        if not user_text or not user_text.strip():
+            return ""
+        self.history.append({"role": "user", "content": user_text})
+        parts: List[str] = []
+        try:
+            for delta in ac.ask_stream(
+                messages=list(self.history),
+                description=f"{description} (Chat)",
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            ):
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+        except Exception:
+            # keep history consistent: keep a partial reply, or drop the unanswered user turn
+            if parts:
+                self.history.append({"role": "assistant", "content": "".join(parts)})
+            else:
+                self.history.pop()
+            raise
+        reply = "".join(parts)
+        self.history.append({"role": "assistant", "content": reply})
+        return reply
+
     # ---- transcript utilities ----
     def transcript_text(self) -> str:
         lines = []
@@ -0,0 +1,37 @@
+# tasks/compact_storage.py
+import json, os
+from pathlib import Path
+
+from core import exchange_archive
+from memory import memory
+
+
+def _exchange_dirs():
+    dirs = [memory._EXCH_DIR]
+    env_dir = os.getenv("AILYS_EXCHANGES_DIR", "").strip()
+    if env_dir:
+        p = Path(env_dir).expanduser()
+        dirs.append(p if p.is_absolute() else Path.cwd() / p)
+    out = []
+    for d in dirs:
+        if d.exists() and d.resolve() not in [o.resolve() for o in out]:
+            out.append(d)
+    return out
+
+
+def run(root_path=None, guidance="", recall_depth=0, output_file=None, downloaded=False):
+    """
+    Retention pass: archive old bulk memory events (memory.compact_memory) and cold
+    exchange files/run folders + journal segments (exchange_archive.compact).
+    Thresholds come from AILYS_MEMORY_ARCHIVE_DAYS / AILYS_EXCHANGES_ARCHIVE_DAYS.
+    """
+    report = {"memory": memory.compact_memory(), "exchanges": {}}
+    for d in _exchange_dirs():
+        report["exchanges"][str(d)] = exchange_archive.compact(d)
+        report["exchanges"][str(d)]["manifest"] = exchange_archive.get_manifest(d).stats()
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output_file:
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(text)
+    return True, text
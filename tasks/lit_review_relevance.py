@@ -7,6 +7,7 @@ from typing import Dict, List, Optional, Tuple
 
 from core.lit.utils import run_dirs, to_list
 from core import artificial_cognition as brain
+from core import batch_jobs, token_estimator
 import core.approval_queue as approvals
 
 DEBUG = os.getenv("LIT_DEBUG", "1") != "0"
@@ -55,6 +56,7 @@ class RelevanceConfig:
     batch_size: int = 15
     max_items: Optional[int] = None  # cap for debugging
     require_reason: bool = True
+    repair_rounds: int = 2           # re-ask only for items missing from a truncated/malformed reply
     # Score names & ranges (all 0-5)
     dimensions: Tuple[str, ...] = (
         "topical_fit",         # does this paper match the research topic?
@@ -116,14 +118,48 @@ CANDIDATE RECORDS:
 {records_block}
 """
 
-def _format_records_block(rows: List[Dict[str, str]]) -> str:
+# Token sizing for scoring batches (counted locally before anything is sent)
+ABSTRACT_MAX_TOKENS = int(os.getenv("LIT_RELEVANCE_ABSTRACT_TOKENS", "400"))
+SCORE_MAX_TOKENS = 1800          # plenty for JSON at the default batch size
+SCORE_TOKENS_PER_ITEM = 120      # room per scored item when batches are larger
+
+# JSON Schema for one scoring reply (structured-output mode + item validation)
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "work_id": {"type": "string"},
+                    "overall_relevance": {"type": "integer", "minimum": 0, "maximum": 100},
+                    "topical_fit": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "method_fit": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "context_fit": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "recency_novelty": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "quality_signal": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "actionability": {"type": "integer", "minimum": 0, "maximum": 5},
+                    "exclusions": {"type": "string"},
+                    "notes": {"type": "string"},
+                },
+                "required": ["work_id", "overall_relevance"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+def _work_id(r: Dict[str, str]) -> str:
+    return r.get("work_id") or (r.get("doi") or f"{(r.get('title','').lower())}::{r.get('year','')}")
+
+def _format_records_block(rows: List[Dict[str, str]], model: Optional[str] = None) -> str:
     # Keep it compact but sufficient for triage
     lines = []
     for r in rows:
         title = _clean(r.get("title",""))
         abs_ = _clean(r.get("abstract",""))
-        if len(abs_) > 1500:  # avoid blowing token budget
-            abs_ = abs_[:1500].rstrip() + " …"
+        abs_ = token_estimator.fit_text(abs_, ABSTRACT_MAX_TOKENS, model)  # avoid blowing token budget
         authors = _clean(r.get("authors|;|",""))
         y = _clean(r.get("year",""))
         venue = _clean(r.get("venue",""))
@@ -167,47 +203,107 @@ def _parse_json_safely(txt: str) -> Dict:
     s = m.group(0)
     return json.loads(s)
 
-def _score_batch(
+def _batch_request(
     need_text: str,
     batch_rows: List[Dict[str, str]],
     batch_idx: int,
     batch_total: int,
-    cfg: RelevanceConfig
-) -> Tuple[List[Dict[str,str]], str]:
-    """
-    Calls the LLM via artificial cognition. Returns (scored_rows, model_id).
-    """
-    records_block = _format_records_block(batch_rows)
+) -> Dict:
+    """ask_structured() kwargs for one scoring batch (shared by the serial and concurrent paths)."""
+    model = brain.config_snapshot().model
+    records_block = _format_records_block(batch_rows, model)
     prompt = PROMPT_TEMPLATE.format(need_text=need_text, records_block=records_block)
-
-    desc = f"Lit relevance scoring batch {batch_idx+1}/{batch_total} (n={len(batch_rows)})"
-    result = brain.ask(
+    return dict(
         prompt=prompt,
-        description=desc,
+        schema=SCORE_SCHEMA,
+        items_key="items",
+        id_field="work_id",
+        expected_ids=[_clean(_work_id(r)) for r in batch_rows],  # normalized like _join_scores
+        description=f"Lit relevance scoring batch {batch_idx+1}/{batch_total} (n={len(batch_rows)})",
         temperature=0.1,            # bias toward consistency
-        max_tokens=1800,            # plenty for JSON
+        max_tokens=max(SCORE_MAX_TOKENS, SCORE_TOKENS_PER_ITEM * len(batch_rows)),
         timeout=None                # approval-gated elsewhere
     )
-    raw = result.raw_text
-    data = _parse_json_safely(raw)
-    items = data.get("items") or []
 
+def _fit_batch(need_text: str, batch_rows: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+    """
+    Split a batch (recursively in halves) until its prompt fits the model's context
+    window with room for the JSON reply, so no request is sent only to be rejected.
+    Models whose window is not known (see token_estimator.has_profile) are not split.
+    """
+    if len(batch_rows) <= 1:
+        return [batch_rows]
+    model = brain.config_snapshot().model
+    if not token_estimator.has_profile(model):
+        return [batch_rows]
+    req = _batch_request(need_text, batch_rows, 0, 1)
+    prompt_tokens = token_estimator.count_message_tokens([{"role": "user", "content": req["prompt"]}], model)
+    if prompt_tokens <= token_estimator.input_budget(model, req["max_tokens"]):
+        return [batch_rows]
+    mid = len(batch_rows) // 2
+    _dbg(f"batch of {len(batch_rows)} is ~{prompt_tokens} tokens; splitting for {model}")
+    return _fit_batch(need_text, batch_rows[:mid]) + _fit_batch(need_text, batch_rows[mid:])
+
+def _score_batch(
+    need_text: str,
+    batch_rows: List[Dict[str, str]],
+    batch_idx: int,
+    batch_total: int,
+    cfg: RelevanceConfig,
+    first=None,
+) -> Tuple[List[Dict[str,str]], str]:
+    """
+    Calls the LLM via artificial cognition. Returns (scored_rows, model_id).
+    Items that parsed are kept even when the reply was cut off; only the rows whose
+    work_id is still missing are re-requested (up to cfg.repair_rounds times).
+    `first` is an already-obtained StructuredResult (concurrent path).
+    """
+    result = first if first is not None else brain.ask_structured(
+        **_batch_request(need_text, batch_rows, batch_idx, batch_total))
+    items = list(result.items)
+    model_id = result.model_id
+    missing = set(result.missing_ids)
+
+    rounds = 0
+    while missing and rounds < cfg.repair_rounds:
+        rounds += 1
+        retry_rows = [r for r in batch_rows if _clean(_work_id(r)) in missing]
+        print(f"[score] batch {batch_idx+1}/{batch_total}: re-requesting {len(retry_rows)} missing item(s) "
+              f"(round {rounds}/{cfg.repair_rounds})")
+        req = _batch_request(need_text, retry_rows, batch_idx, batch_total)
+        req["description"] = f"{req['description']} | repair {rounds}: {len(retry_rows)} missing"
+        retry = brain.ask_structured(**req)
+        items.extend(retry.items)
+        missing = set(retry.missing_ids)
+
+    if missing:
+        _dbg(f"batch {batch_idx+1}: {len(missing)} item(s) still unscored after {rounds} repair round(s)")
+    return _join_scores(batch_rows, items, model_id), model_id
+
+def _join_scores(batch_rows: List[Dict[str, str]], items: List[Dict], model_id: str) -> List[Dict[str,str]]:
+    """Join parsed score items back onto the input rows by work_id."""
     # Build map by work_id for easy join
     by_id = { (_clean(i.get("work_id") or "")): i for i in items if isinstance(i, dict) }
     scored: List[Dict[str,str]] = []
     for r in batch_rows:
-        work_id = r.get("work_id") or (r.get("doi") or f"{(r.get('title','').lower())}::{r.get('year','')}")
+        work_id = _work_id(r)
         j = by_id.get(_clean(work_id), {})
         out = dict(r)
-        out["overall_relevance"] = str(int(j.get("overall_relevance", 0)))
+        out["overall_relevance"] = str(_as_int(j.get("overall_relevance", 0)))
         for k in ("topical_fit","method_fit","context_fit","recency_novelty","quality_signal","actionability"):
-            out[k] = str(int(j.get(k, 0)))
+            out[k] = str(_as_int(j.get(k, 0)))
         out["exclusions"] = _clean(j.get("exclusions",""))
         out["notes"] = _clean(j.get("notes",""))
-        out["llm_model"] = result.model_id
+        out["llm_model"] = model_id
         out["rated_at_utc"] = _now_utc_stamp()
         scored.append(out)
-    return scored, result.model_id
+    return scored
+
+def _as_int(v) -> int:
+    try:
+        return int(float(v))
+    except Exception:
+        return 0
 
 def _unique_attempt_dirs(paths: Dict[str,str]) -> Dict[str,str]:
     stamp = datetime.datetime.utcnow().strftime("attempt_%Y-%m-%d_%H-%M-%S")
@@ -238,6 +334,8 @@ def run(
     batch_size: Optional[int]=None,
     max_items: Optional[int]=None,
     need_override: Optional[str]=None,       # NEW: GUI can pass an explicit literature need
+    concurrency: Optional[int]=None,         # batches in flight at once (default env LIT_RELEVANCE_CONCURRENCY or 1)
+    mode: Optional[str]=None,                # "interactive" (default) | "batch" (env LIT_RELEVANCE_MODE)
     **_kwargs,                                # tolerate extra kwargs from older/newer GUIs
 ) -> Tuple[bool, str]:
     """
@@ -252,6 +350,12 @@ def run(
         max_items: optional cap for debugging/smoke tests.
         need_override: if provided and non-empty, this *replaces* any CSV-1 need/guidance text.
                        (The GUI “Relevance” tab can set this when the user enters a custom need.)
+        concurrency: number of batches scored at once via artificial_cognition.map_ask
+                     (1 keeps the original serial loop). Either way the run's batches share one
+                     approval group: a single ticket covers them all.
+        mode: "batch" submits every scoring batch as one offline batch job (one approval for
+              the whole run; see core.batch_jobs). Rows missing from a reply are repaired
+              interactively, as in the default mode.
     Returns:
         (ok, message)
     """
@@ -313,10 +417,10 @@ def run(
     if max_items and max_items > 0:
         rows = rows[:max_items]
 
-    # Normalize/ensure work_id presence
+    # Normalize/ensure work_id presence (whitespace collapsed once, as the join and missing check see it)
     for r in rows:
         wid = r.get("work_id") or (r.get("doi") or f"{(r.get('title','').lower())}::{r.get('year','')}")
-        r["work_id"] = wid
+        r["work_id"] = _clean(wid)
 
     cfg = RelevanceConfig(
         batch_size = int(batch_size) if batch_size else int(os.getenv("LIT_RELEVANCE_BATCH", "15")),
@@ -350,27 +454,103 @@ def run(
 
     batches: List[List[Dict[str,str]]] = []
     for i in range(0, total, cfg.batch_size):
-        batches.append(rows[i:i+cfg.batch_size])
+        batches.extend(_fit_batch(need_text, rows[i:i+cfg.batch_size]))
 
     all_scored: List[Dict[str,str]] = []
     model_seen = None
 
-    # Approval is handled INSIDE artificial_cognition.ask for every batch.
-    for bi, batch in enumerate(batches):
-        if not batch:
-            continue
-        try:
-            t0 = time.time()
-            scored, model_id = _score_batch(need_text, batch, bi, len(batches), cfg)
-            dt = time.time() - t0
-            model_seen = model_seen or model_id
-            _log(f"[OK] batch {bi+1}/{len(batches)} | n={len(batch)} | {dt:.2f}s | model={model_id}")
-            _wcsv(out_partial, scored, RELEVANCE_HEADER)
-            all_scored.extend(scored)
-            print(f"[score] batch {bi+1}/{len(batches)}: +{len(scored)}")
-        except Exception as e:
-            _log(f"[ERR] batch {bi+1}/{len(batches)} | {type(e).__name__}: {e}")
-            print(f"[score] ERROR in batch {bi+1}: {e}")
+    try:
+        n_parallel = int(concurrency) if concurrency else int(os.getenv("LIT_RELEVANCE_CONCURRENCY", "1"))
+    except Exception:
+        n_parallel = 1
+
+    run_mode = (mode or os.getenv("LIT_RELEVANCE_MODE", "interactive") or "interactive").strip().lower()
+
+    # Batch mode: one approval for the offline job. Interactive: one approval group below.
+    if run_mode == "batch":
+        t0 = time.time()
+        reqs = [_batch_request(need_text, b, bi, len(batches)) for bi, b in enumerate(batches)]
+        fmt = brain.structured_response_format(SCORE_SCHEMA)
+        job = batch_jobs.submit_batch(
+            [dict(prompt=r["prompt"], temperature=r["temperature"], max_tokens=r["max_tokens"],
+                  response_format=fmt, custom_id=f"batch-{bi:04d}") for bi, r in enumerate(reqs)],
+            description=f"Lit relevance scoring ({len(batches)} batches, {total} rows)",
+        )
+        _log(f"[BATCH] job={job.job_id} batch_id={job.batch_id} status={job.status} | "
+             f"{len(job.errors)} failed | {time.time() - t0:.2f}s | folder={job.job_dir}")
+        for bi, (batch, req) in enumerate(zip(batches, reqs)):
+            res = job.results[bi] if bi < len(job.results) else None
+            try:
+                if res is None:
+                    # failed inside the job: score this batch interactively instead
+                    _log(f"[BATCH-ERR] batch {bi+1}/{len(batches)} | "
+                         f"{job.errors.get(f'batch-{bi:04d}', 'no result')} | falling back to ask")
+                    scored, model_id = _score_batch(need_text, batch, bi, len(batches), cfg)
+                else:
+                    first = brain.parse_structured(
+                        res.raw_text, schema=SCORE_SCHEMA, items_key="items", id_field="work_id",
+                        expected_ids=req["expected_ids"], model_id=res.model_id, provider=res.provider,
+                        usage=res.usage)
+                    scored, model_id = _score_batch(need_text, batch, bi, len(batches), cfg, first=first)
+                model_seen = model_seen or model_id
+                _log(f"[OK] batch {bi+1}/{len(batches)} | n={len(batch)} | model={model_id}")
+                _wcsv(out_partial, scored, RELEVANCE_HEADER)
+                all_scored.extend(scored)
+                print(f"[score] batch {bi+1}/{len(batches)}: +{len(scored)}")
+            except Exception as e:
+                _log(f"[ERR] batch {bi+1}/{len(batches)} | {type(e).__name__}: {e}")
+                print(f"[score] ERROR in batch {bi+1}: {e}")
+    else:
+        # One approval ticket covers every scoring call (ask_structured and its repair
+        # rounds, including map_ask workers); each call is logged against the group.
+        snap = brain.config_snapshot()
+        reqs = [_batch_request(need_text, b, bi, len(batches)) for bi, b in enumerate(batches)]
+        est_tokens = sum(token_estimator.count_tokens(r["prompt"], snap.model) + r["max_tokens"] for r in reqs)
+        with approvals.group(f"Lit relevance scoring ({len(batches)} batches, {total} rows)",
+                             count=len(batches), tokens=est_tokens, kind="llm",
+                             meta={"provider": snap.provider, "model": snap.model}) as grp:
+            if not grp.approved:
+                return False, "Approval denied or failed."
+            if n_parallel > 1:
+                t0 = time.time()
+                results = brain.map_ask(
+                    reqs,
+                    max_concurrency=n_parallel,
+                    return_exceptions=True,
+                    call=brain.ask_structured,
+                )
+                dt = time.time() - t0
+                _log(f"[MAP] {len(batches)} batches | concurrency={n_parallel} | {dt:.2f}s total")
+                for bi, (batch, res) in enumerate(zip(batches, results)):
+                    try:
+                        if isinstance(res, BaseException):
+                            raise res
+                        scored, _ = _score_batch(need_text, batch, bi, len(batches), cfg, first=res)
+                        model_seen = model_seen or res.model_id
+                        _log(f"[OK] batch {bi+1}/{len(batches)} | n={len(batch)} | model={res.model_id}")
+                        _wcsv(out_partial, scored, RELEVANCE_HEADER)
+                        all_scored.extend(scored)
+                        print(f"[score] batch {bi+1}/{len(batches)}: +{len(scored)}")
+                    except Exception as e:
+                        _log(f"[ERR] batch {bi+1}/{len(batches)} | {type(e).__name__}: {e}")
+                        print(f"[score] ERROR in batch {bi+1}: {e}")
+            else:
+                for bi, batch in enumerate(batches):
+                    if not batch:
+                        continue
+                    try:
+                        t0 = time.time()
+                        scored, model_id = _score_batch(need_text, batch, bi, len(batches), cfg)
+                        dt = time.time() - t0
+                        model_seen = model_seen or model_id
+                        _log(f"[OK] batch {bi+1}/{len(batches)} | n={len(batch)} | {dt:.2f}s | model={model_id}")
+                        _wcsv(out_partial, scored, RELEVANCE_HEADER)
+                        all_scored.extend(scored)
+                        print(f"[score] batch {bi+1}/{len(batches)}: +{len(scored)}")
+                    except Exception as e:
+                        _log(f"[ERR] batch {bi+1}/{len(batches)} | {type(e).__name__}: {e}")
+                        print(f"[score] ERROR in batch {bi+1}: {e}")
+        _log(f"[APPROVAL-GROUP] {json.dumps(grp.summary())}")
 
     if not all_scored:
         return False, "No items scored; see log."
@@ -392,6 +572,13 @@ def run(
         pass
     _wcsv(out_final, ranked, RELEVANCE_HEADER)
 
+    try:
+        metrics_path = brain.export_metrics(paths["logs"])
+        _log(f"[METRICS] {metrics_path}")
+        _log(f"[METRICS] {approvals.export_metrics(paths['logs'])}")
+    except Exception as e:
+        _log(f"[METRICS] export failed: {e}")
+
     msg = (f"RELEVANCE partial: {out_partial} | rows={len(all_scored)}\n"
            f"RELEVANCE final (ranked): {out_final} | rows={len(ranked)}")
     print(msg)
@@ -406,6 +593,8 @@ if __name__ == "__main__":
     ap.add_argument("--batch", type=int, default=None, help="Batch size (default env LIT_RELEVANCE_BATCH or 15)")
     ap.add_argument("--max-items", type=int, default=None, help="Optional cap for debugging")
     ap.add_argument("--need-override", default=None, help="Optional explicit literature need to override CSV-1")
+    ap.add_argument("--concurrency", type=int, default=None, help="Batches scored at once (default env LIT_RELEVANCE_CONCURRENCY or 1)")
+    ap.add_argument("--mode", choices=("interactive", "batch"), default=None, help="batch = one offline batch job for all batches (default env LIT_RELEVANCE_MODE or interactive)")
     args = ap.parse_args()
     ok, msg = run(
         csv1_path=args.csv1,
@@ -413,5 +602,7 @@ if __name__ == "__main__":
         batch_size=args.batch,
         max_items=args.max_items,
         need_override=args.need_override,
+        concurrency=args.concurrency,
+        mode=args.mode,
     )
     print("✅" if ok else "❌", msg)
@@ -1,7 +1,7 @@
 # tasks/lit_search_collect.py
 from __future__ import annotations
 
-import os, csv, datetime, re, time, html, unicodedata, itertools
+import os, csv, json, datetime, re, time, html, unicodedata, itertools
 # Optional .env loader (no hard dependency). If python-dotenv is installed,
 # this will read a local .env so os.getenv(...) works without exporting shell vars.
 try:
@@ -65,29 +65,6 @@ def _should_stop(stop_flag_path: str | None = None) -> bool:
 # === [PATCH Q END] ===
 
 
-def _with_temp_approval_mode(temp_mode: str, fn):
-    """
-    Run fn() while the approval queue is temporarily set to `temp_mode`
-    (e.g., 'auto'), then restore the previous mode. Used so that
-    non-token, network-only child calls do NOT enqueue approvals.
-    """
-    prev_mode = None
-    try:
-        prev_mode = approvals.approval_queue.get_mode() if hasattr(approvals.approval_queue, "get_mode") else None
-    except Exception:
-        try:
-            prev_mode = getattr(approvals.approval_queue, "mode", None)
-        except Exception:
-            prev_mode = None
-    try:
-        approvals.approval_queue.set_mode(temp_mode)
-        return fn()
-    finally:
-        try:
-            if prev_mode:
-                approvals.approval_queue.set_mode(prev_mode)
-        except Exception:
-            pass
 def _clean_text(s: str) -> str:
     if not s:
         return s
@@ -1895,13 +1872,15 @@ def run(
         desc = (f"Literature Collection (CSV-2) — NO LLM TOKENS | "
                 f"engines={','.join(engines)} | queries={len(qs)} | requests≈{req_count}")
 
-        # Single approval; temporarily switch approvals to 'auto' so
-        # downstream network-only calls don’t enqueue new prompts.
-        ok = approvals.request_approval(
-            description=desc,
-            call_fn=lambda ov=None: _with_temp_approval_mode("auto", _collect),
-            timeout=None
-        )
+        # Single approval for the whole collection: the per-query HTTP GETs made
+        # inside the group run under its ticket and are logged against it.
+        with approvals.group(desc, count=req_count, kind="http") as grp:
+            ok = _collect() if grp.approved else None
+        _write_log_line(results_log_path, f"[APPROVAL-GROUP] {json.dumps(grp.summary())}")
+        try:
+            _write_log_line(results_log_path, f"[METRICS] {approvals.export_metrics(paths['logs'])}")
+        except Exception as e:
+            _write_log_line(results_log_path, f"[METRICS] export failed: {e}")
         if not ok:
             return False, "Approval denied or failed."
 
@@ -1,7 +1,7 @@
 # tasks/lit_search_pull.py
 from __future__ import annotations
 
-import os, csv, re, time, datetime, html, unicodedata, hashlib
+import os, csv, json, re, time, datetime, html, unicodedata, hashlib
 from typing import Dict, List, Optional, Tuple
 
 import core.approval_queue as approvals
@@ -411,25 +411,6 @@ def _write_out_csv(path: str, rows: List[Dict[str,str]]):
         for r in rows:
             w.writerow(r)
 
-def _with_temp_approval_mode(temp_mode: str, fn):
-    prev_mode = None
-    try:
-        prev_mode = approvals.approval_queue.get_mode() if hasattr(approvals.approval_queue, "get_mode") else None
-    except Exception:
-        try:
-            prev_mode = getattr(approvals.approval_queue, "mode", None)
-        except Exception:
-            prev_mode = None
-    try:
-        approvals.approval_queue.set_mode(temp_mode)
-        return fn()
-    finally:
-        try:
-            if prev_mode:
-                approvals.approval_queue.set_mode(prev_mode)
-        except Exception:
-            pass
-
 def run(
     input_csv: str,
     out_root: Optional[str] = None,
@@ -562,11 +543,14 @@ def run(
 
         return True
 
-    ok = approvals.request_approval(
-        description=desc,
-        call_fn=lambda ov=None: _with_temp_approval_mode("auto", _pull_all),
-        timeout=None
-    )
+    # One approval for the whole pull; any gated calls inside are logged against the group.
+    with approvals.group(desc, count=len(rows), kind="http") as grp:
+        ok = _pull_all() if grp.approved else None
+    _write_log_line(results_log, f"[APPROVAL-GROUP] {json.dumps(grp.summary())}")
+    try:
+        _write_log_line(results_log, f"[METRICS] {approvals.export_metrics(logs_dir)}")
+    except Exception as e:
+        _write_log_line(results_log, f"[METRICS] export failed: {e}")
     if not ok:
         return False, "Approval denied or failed."
 
@@ -7,8 +7,9 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from core.pdf_reader import extract_text_from_pdf
 from openpyxl.utils import get_column_letter
-from memory.memory import save_memory_event, get_ai_insights_by_tag
+from memory.memory import save_memory_event, get_ai_insights_by_tag, search_memories
 from core.approval_queue import request_approval
+from core import token_estimator
 # Set up environment and OpenAI client
 load_dotenv()
 
@@ -30,9 +31,40 @@ COLUMNS = [
     "Keywords", "Type of Publication", "Reviewed By"
 ]
 
-def get_memory_context(tag="literature_review", max_memories=5):
-    insights = get_ai_insights_by_tag(tag)
-    return "\n\n".join(insights[-int(max_memories):]) if insights else ""
+REVIEW_MODEL = "gpt-4"
+REVIEW_OUTPUT_TOKENS = int(os.getenv("LIT_REVIEW_OUTPUT_TOKENS", "2500"))  # reserved for the structured reply
+
+def _memory_context_tokens() -> int:
+    try:
+        return max(0, int(os.getenv("AILYS_MEMORY_CONTEXT_TOKENS", "1500")))
+    except ValueError:
+        return 1500
+
+def get_memory_context(tag="literature_review", max_memories=5, query=None, max_tokens=None):
+    """
+    Memory insights for the prompt. With a query (the article text), the most relevant
+    memories under `tag` (BM25 recall over the memory index), best first, packed until
+    max_tokens (AILYS_MEMORY_CONTEXT_TOKENS, default 1500); without one, the latest.
+    """
+    if not query:
+        insights = get_ai_insights_by_tag(tag)
+        return "\n\n".join(insights[-int(max_memories):]) if insights else ""
+    budget = _memory_context_tokens() if max_tokens is None else int(max_tokens)
+    picked, used, seen = [], 0, set()
+    # over-fetch a little: duplicates and over-budget entries are skipped
+    for m in search_memories(query, limit=max(1, int(max_memories)) * 3, tag=tag):
+        insight = (m.get("ai_insight") or "").strip()
+        if not insight or insight in seen:
+            continue
+        cost = token_estimator.count_tokens(insight + "\n\n", REVIEW_MODEL)
+        if used + cost > budget:
+            continue
+        seen.add(insight)
+        picked.append(insight)
+        used += cost
+        if len(picked) >= int(max_memories):
+            break
+    return "\n\n".join(picked)
 
 FIELD_PROMPT = """
 You are Ailys, a research assistant trained to produce structured literature reviews.
@@ -85,8 +117,18 @@ def run(pdf_path, guidance="", recall_depth=5, output_file="outputs/C2_Lit_Revie
         return False, f"Exception during PDF extraction: {e}"
 
     try:
-        text_chunk = full_text[:10000]
-        memory_context = get_memory_context(max_memories=recall_depth)
+        # recall by relevance to this article (title/abstract/introduction), not recency
+        memory_context = get_memory_context(max_memories=recall_depth, query=full_text[:8000]) \
+            if recall_depth > 0 else ""
+
+        # Size the article excerpt to what the model's window leaves after the
+        # instructions, memory context and reserved reply (counted locally).
+        overhead = token_estimator.count_tokens(
+            FIELD_PROMPT.format(text="", guidance=guidance, memory_context=memory_context), REVIEW_MODEL)
+        budget = token_estimator.input_budget(REVIEW_MODEL, REVIEW_OUTPUT_TOKENS, overhead=overhead)
+        text_chunk = token_estimator.fit_text(full_text, budget, REVIEW_MODEL, marker="")
+        if not text_chunk:
+            return False, "Guidance and memory context leave no room for article text; lower recall_depth."
 
         prompt = FIELD_PROMPT.format(text=text_chunk, guidance=guidance, memory_context=memory_context)
 
@@ -94,10 +136,11 @@ def run(pdf_path, guidance="", recall_depth=5, output_file="outputs/C2_Lit_Revie
         response = request_approval(
             description=f"Run GPT-4 review on '{os.path.basename(pdf_path)}'",
             call_fn=lambda: get_openai_client().chat.completions.create(
-                model="gpt-4",
+                model=REVIEW_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3
-            )
+            ),
+            kind="llm",
         )
 
         if not response or not hasattr(response, "choices") or not response.choices:
@@ -137,7 +180,7 @@ Review Fields:
     try:
         print("🧠 Sending insight prompt to GPT-4...")
         memory_response = get_openai_client().chat.completions.create(
-            model="gpt-4",
+            model=REVIEW_MODEL,
             messages=[{"role": "user", "content": memory_summary_prompt}],
             temperature=0.3
         )
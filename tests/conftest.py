@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# The repo root is itself a package directory; make `core`/`memory` importable as top-level.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
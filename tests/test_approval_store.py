@@ -0,0 +1,69 @@
+# tests/test_approval_store.py
+"""Approval store leases (claim_open) and journaling from the approval queue."""
+
+import pytest
+
+from core import approval_queue, approval_store
+from core.approval_store import ApprovalStore
+
+SPEC = {"replayer": "core.approval_queue:preapproved", "args": {}}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "approvals.sqlite"
+    monkeypatch.setenv("AILYS_APPROVAL_DB", str(path))
+    monkeypatch.setenv("AILYS_APPROVAL_STORE", "1")
+    monkeypatch.setattr(approval_store, "_STORE", None)
+    monkeypatch.setattr(ApprovalStore, "_start_heartbeat", lambda self: None)
+    return path
+
+
+def _as_process(monkeypatch, owner):
+    monkeypatch.setattr(approval_store, "OWNER", owner)
+
+
+def _age(store, store_id, seconds):
+    conn = store._conn()
+    conn.execute("UPDATE approvals SET updated_at = updated_at - ? WHERE store_id = ?", (seconds, store_id))
+    conn.commit()
+
+
+def test_claim_open_takes_only_expired_leases(db, monkeypatch):
+    store = ApprovalStore(db, lease_sec=60)
+    _as_process(monkeypatch, "first")
+    store.add("live", "still waiting", "llm", SPEC)
+    store.add("dead", "left behind", "llm", SPEC)
+    store.set_status("dead", "running")
+    _age(store, "dead", 61)
+
+    _as_process(monkeypatch, "second")
+    rows = store.claim_open()
+    assert [(r["store_id"], r["interrupted"]) for r in rows] == [("dead", True)]
+    assert store.get("dead")["status"] == "pending"
+    assert store.claim_open() == []   # now leased by "second"
+
+    _as_process(monkeypatch, "first")
+    assert store.heartbeat() == 1   # "live" only; "dead" changed hands
+    _as_process(monkeypatch, "third")
+    _age(store, "live", 30)
+    assert store.claim_open() == []   # renewed within the lease
+
+
+def test_add_after_decision_keeps_the_status(db):
+    store = ApprovalStore(db)
+    store.set_status("late", "denied")
+    store.add("late", "journaled after it was denied", "llm", SPEC, {"tokens": 3})
+    row = store.get("late")
+    assert row["status"] == "denied"
+    assert row["spec"] == SPEC and row["meta"] == {"tokens": 3}
+    assert store.claim_open() == []
+
+
+def test_queue_journals_and_records_the_decision(db):
+    queue = approval_queue.ApprovalQueue(mode="manual")
+    req = queue.submit("needs a human", lambda overrides=None: 42, kind="llm", spec=SPEC)
+    assert req.store_id and approval_store.get_store().get(req.store_id)["status"] == "pending"
+    assert queue.deny_request(req.id)
+    row = approval_store.get_store().get(req.store_id)
+    assert row["status"] == "denied" and row["spec"] == SPEC
@@ -0,0 +1,275 @@
+# tests/test_backend_pool.py
+"""BackendPool routing and passive health checks, driven with fake per-backend clients."""
+
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import core.approval_queue as approvals
+from core import artificial_cognition as ac
+from core import backend_pool, llm_clients
+from core.backend_pool import BackendPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Stands in for the OpenAI client of one base_url: succeeds, or raises `error`."""
+
+    def __init__(self, url):
+        self.url = url
+        self.error = None
+        self.calls = 0
+
+    def create(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"url": self.url}
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class APIConnectionError(Exception):
+    """Same name as the openai exception the pool treats as "never reached a server"."""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(backend_pool.time, "monotonic", c)
+    return c
+
+
+def make(spec, **kwargs):
+    pool = BackendPool(backend_pool.parse_backends(spec), **kwargs)
+    return pool, {b.url: FakeClient(b.url) for b in pool.backends}
+
+
+def call(pool, clients, exclude=()):
+    """One routed call, the way artificial_cognition uses a lease."""
+    with pool.lease(exclude=exclude) as lease:
+        return clients[lease.url].create()
+
+
+def test_parse_backends_formats():
+    assert backend_pool.parse_backends("http://a/v1/|2, http://b/v1") == [("http://a/v1", 2.0), ("http://b/v1", 1.0)]
+    assert backend_pool.parse_backends('[{"url": "http://a", "weight": 3}, "http://b"]') == [
+        ("http://a", 3.0), ("http://b", 1.0)]
+    assert backend_pool.parse_backends("") == []
+
+
+def test_sequential_calls_follow_weights(clock):
+    pool, clients = make("http://a|3, http://b|1")
+    for _ in range(400):
+        call(pool, clients)
+    assert clients["http://a"].calls == 300
+    assert clients["http://b"].calls == 100
+
+
+def test_outstanding_requests_scaled_by_weight(clock):
+    pool, clients = make("http://a|2, http://b|1")
+    leases = [pool.lease() for _ in range(6)]
+    urls = [cm.__enter__().url for cm in leases]
+    assert urls.count("http://a") == 4 and urls.count("http://b") == 2
+    for cm in leases:
+        cm.__exit__(None, None, None)
+    assert all(s["outstanding"] == 0 for s in pool.stats())
+
+
+def test_ejected_after_consecutive_failures(clock):
+    pool, clients = make("http://a, http://b", eject_after=3, eject_sec=30)
+    clients["http://a"].error = ConnectionError("refused")
+    failures = 0
+    for _ in range(10):
+        try:
+            call(pool, clients)
+        except ConnectionError:
+            failures += 1
+    assert failures == 3
+    stats = pool.backend_stats("http://a")
+    assert stats["healthy"] is False and stats["ejections"] == 1
+    assert stats["ejected_for_sec"] == 30
+    assert pool.healthy_count() == 1
+    assert clients["http://b"].calls == 7
+
+
+def test_client_errors_do_not_eject(clock):
+    pool, clients = make("http://a", eject_after=2)
+    clients["http://a"].error = BadRequest("bad prompt")
+    for _ in range(5):
+        with pytest.raises(BadRequest):
+            call(pool, clients)
+    assert pool.backend_stats("http://a")["healthy"] is True
+
+
+def test_client_errors_are_neutral(clock):
+    pool, clients = make("http://a, http://b", eject_after=2, eject_sec=10)
+    a = clients["http://a"]
+    a.error = ConnectionError()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(pool, clients, exclude=["http://b"])
+    a.error = BadRequest("bad prompt")
+    with pytest.raises(BadRequest):
+        call(pool, clients, exclude=["http://b"])   # a probe of the ejected backend
+    stats = pool.backend_stats("http://a")
+    # a 400 says nothing about the backend: still ejected, no failure or latency recorded
+    assert stats["healthy"] is False and stats["failures"] == 2
+    assert stats["outstanding"] == 0 and stats["latency_ewma_sec"] is None
+
+
+def test_rate_limits_are_soft_failures(clock):
+    pool, clients = make("http://a, http://b", eject_after=2, eject_sec=10)
+    a = clients["http://a"]
+    a.error = RateLimited("slow down")
+    for round_ in range(3):
+        for _ in range(2):
+            with pytest.raises(RateLimited):
+                call(pool, clients, exclude=["http://b"])
+        stats = pool.backend_stats("http://a")
+        # rested for the base cool-down every time, never escalated
+        assert stats["healthy"] is False and stats["ejected_for_sec"] == 10
+        assert stats["ejections"] == 0 and stats["latency_ewma_sec"] is None
+        clock.now += 10.5
+
+
+def test_success_resets_the_failure_streak(clock):
+    pool, clients = make("http://a", eject_after=3)
+    a = clients["http://a"]
+    for error in (ConnectionError(), ConnectionError(), None, ConnectionError(), ConnectionError()):
+        a.error = error
+        try:
+            call(pool, clients)
+        except ConnectionError:
+            pass
+    assert pool.backend_stats("http://a")["ejections"] == 0
+
+
+def test_readmitted_after_cooldown_and_cooldown_doubles(clock):
+    pool, clients = make("http://a, http://b", eject_after=2, eject_sec=10)
+    a = clients["http://a"]
+    a.error = ConnectionError()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(pool, clients, exclude=["http://b"])
+    assert pool.backend_stats("http://a")["healthy"] is False
+    calls_before = a.calls
+    call(pool, clients)
+    assert a.calls == calls_before
+
+    clock.now += 10.5
+    assert pool.backend_stats("http://a")["healthy"] is True
+    a.error = None
+    a.calls = 0
+    for _ in range(4):
+        call(pool, clients)
+    assert a.calls == 2   # back in rotation
+
+    a.error = ConnectionError()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(pool, clients, exclude=["http://b"])
+    stats = pool.backend_stats("http://a")
+    assert stats["ejections"] == 2 and stats["ejected_for_sec"] == 20
+
+
+def test_all_ejected_probes_first_to_return(clock):
+    pool, clients = make("http://a, http://b", eject_after=1, eject_sec=10)
+    clients["http://a"].error = ConnectionError()
+    clients["http://b"].error = ConnectionError()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(pool, clients)
+    assert pool.healthy_count() == 0
+    clients["http://a"].error = None
+    assert call(pool, clients) == {"url": "http://a"}   # a was ejected first, so it comes back first
+    assert pool.healthy_count() == 1
+
+
+@pytest.fixture
+def pooled(tmp_path, monkeypatch):
+    """ac.ask() against two pooled endpoints; http://down refuses connections."""
+    for key, value in {
+        "AILYS_EXCHANGES_DIR": str(tmp_path / "exchanges"),
+        "AILYS_EXCHANGES_FORMAT": "folders",
+        "AILYS_PROVIDER": "openai_compatible",
+        "AILYS_MODEL": "local-test-model",
+        "AILYS_BASE_URL": "http://down/v1",
+        "AILYS_BASE_URLS": "http://down/v1, http://up/v1",
+        "AILYS_APPROVAL_STORE": "0",
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setattr(ac, "_POOL", {"key": None, "pool": None})
+    seen = []
+
+    class Completions:
+        def __init__(self, url):
+            self.url = url
+
+        def create(self, **body):
+            seen.append(self.url)
+            if self.url == "http://down/v1":
+                raise APIConnectionError("connection refused")
+            usage = SimpleNamespace(prompt_tokens=2, completion_tokens=1, total_tokens=3)
+            message = SimpleNamespace(content="pong")
+            return SimpleNamespace(
+                model=body["model"], usage=usage,
+                choices=[SimpleNamespace(message=message, finish_reason="stop")],
+                model_dump=lambda: {"model": body["model"], "choices": [{"message": {"content": "pong"}}]})
+
+    class Client:
+        def __init__(self, url):
+            self.chat = self
+            self.completions = Completions(url)
+
+    @contextmanager
+    def lease_client(provider, base_url, api_key, timeout):
+        yield Client(base_url)
+
+    monkeypatch.setattr(llm_clients, "lease_client", lease_client)
+    mode = approvals.approval_queue.get_mode()
+    approvals.approval_queue.set_mode("auto")
+    yield seen
+    approvals.approval_queue.set_mode(mode)
+
+
+def _exchanges(root):
+    out = []
+    for path in Path(root).rglob("*.json"):
+        record = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(record, dict) and "raw_text" in record and "base_url" in record:
+            out.append(record)
+    return out
+
+
+def test_send_fails_over_and_journals_the_backend_used(pooled, tmp_path):
+    seen = pooled
+    # the pool is idle, so the first pick is the first backend: the one that is down
+    res = ac.ask(prompt="ping", description="pool failover", hedge=False, bypass_cache=True)
+    assert res.raw_text == "pong"
+    assert seen == ["http://down/v1", "http://up/v1"]   # one approval, failed over in place
+
+    pool = ac._backend_pool()
+    assert pool.backend_stats("http://down/v1")["consecutive_failures"] == 1
+    assert pool.backend_stats("http://up/v1")["requests"] == 1
+
+    records = _exchanges(tmp_path / "exchanges")
+    assert len(records) == 1
+    assert records[0]["base_url"] == "http://up/v1"
+    assert records[0]["backend"]["url"] == "http://up/v1"
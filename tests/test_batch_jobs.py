@@ -0,0 +1,239 @@
+# tests/test_batch_jobs.py
+"""submit_batch / resume_batch on the local batch backend, with a fake chat client."""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+import core.approval_queue as approvals
+from core import artificial_cognition as ac
+from core import batch_jobs, llm_clients
+
+_sleep = time.sleep   # batch_jobs.time is this module; tests patch its sleep
+
+
+class APIConnectionError(Exception):
+    """Same name as the openai exception the backend pool fails over on."""
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+
+    def model_dump(self):
+        return self._body
+
+
+class FakeChatClient:
+    """chat.completions.create(**body): echoes the prompt; prompts containing FAIL raise."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.urls = []      # base_url of every client leased
+        self.down = set()   # base_urls that refuse connections
+        self._lock = threading.Lock()
+        self.chat = self
+        self.completions = self
+
+    def create(self, **body):
+        with self._lock:
+            self.calls += 1
+        _sleep(self.delay)
+        prompt = body["messages"][-1]["content"]
+        if "FAIL" in prompt:
+            raise RuntimeError(f"server error for {prompt!r}")
+        return FakeResponse({
+            "model": body["model"],
+            "choices": [{"message": {"content": f"echo:{prompt}"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        })
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    for key, value in {
+        "AILYS_EXCHANGES_DIR": str(tmp_path / "exchanges"),
+        "AILYS_EXCHANGES_FORMAT": "journal",
+        "AILYS_PROVIDER": "openai_compatible",
+        "AILYS_MODEL": "local-test-model",
+        "AILYS_BASE_URL": "http://fake/v1",
+        "AILYS_BATCH_BACKEND": "local",
+        "AILYS_BATCH_POLL_SEC": "0.05",
+        "AILYS_BATCH_POLL_MAX_SEC": "0.2",
+        "AILYS_MAX_CONCURRENCY": "1",
+        "AILYS_APPROVAL_STORE": "0",
+    }.items():
+        monkeypatch.setenv(key, value)
+    fake = FakeChatClient(delay=0.02)
+
+    @contextmanager
+    def lease_client(provider, base_url, api_key, timeout):
+        fake.urls.append(base_url)
+        if base_url in fake.down:
+            raise APIConnectionError(f"{base_url} refused")
+        yield fake
+
+    monkeypatch.setattr(llm_clients, "lease_client", lease_client)
+    mode = approvals.approval_queue.get_mode()
+    approvals.approval_queue.set_mode("auto")
+    yield fake
+    approvals.approval_queue.set_mode(mode)
+
+
+@pytest.fixture
+def approval_calls(monkeypatch):
+    """Record every approval request the batch makes (auto-approving them)."""
+    calls = []
+    real = approvals.request_approval
+
+    def request_approval(description, call_fn, timeout=None, kind=None, meta=None, spec=None):
+        calls.append({"description": description, "kind": kind, "meta": meta})
+        return real(description, call_fn, timeout=timeout, kind=kind, meta=meta, spec=spec)
+
+    monkeypatch.setattr(approvals, "request_approval", request_approval)
+    return calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Poll delays asked for by _poll_and_collect (kept short for the test)."""
+    seen = []
+
+    def sleep(sec):
+        seen.append(sec)
+        _sleep(min(sec, 0.05))
+
+    monkeypatch.setattr(batch_jobs.time, "sleep", sleep)
+    return seen
+
+
+def _requests(*prompts):
+    return [{"prompt": p, "custom_id": f"row-{i}"} for i, p in enumerate(prompts)]
+
+
+def _job_state(result):
+    return json.loads((Path(result.job_dir) / "job.json").read_text(encoding="utf-8"))
+
+
+def test_submit_polls_with_backoff_and_collects_in_order(client, sleeps):
+    client.delay = 0.1
+    res = batch_jobs.submit_batch(_requests("a", "b", "c"), description="scoring")
+    assert res.status == "completed" and res.backend == "local"
+    assert res.custom_ids == ["row-0", "row-1", "row-2"]
+    assert [r.raw_text for r in res.results] == ["echo:a", "echo:b", "echo:c"]
+    assert all(r.model_id == "local-test-model" and r.provider == "openai_compatible" for r in res.results)
+    assert res.errors == {}
+    assert client.calls == 3 and set(client.urls) == {"http://fake/v1"}
+    # polled more than once, each wait 1.5x the previous, capped at AILYS_BATCH_POLL_MAX_SEC
+    assert len(sleeps) >= 2
+    assert sleeps[0] == pytest.approx(0.05)
+    assert all(b == pytest.approx(min(0.2, a * 1.5)) for a, b in zip(sleeps, sleeps[1:]))
+    state = _job_state(res)
+    assert state["status"] == "completed" and state["completed"] == 3 and state["errors"] == 0
+    assert (Path(res.job_dir) / "output.jsonl").exists()
+
+
+def test_partial_failures_and_per_item_journal(client):
+    res = batch_jobs.submit_batch(_requests("ok-1", "FAIL me", "ok-2"))
+    assert res.status == "completed"
+    assert res.results[0].raw_text == "echo:ok-1" and res.results[2].raw_text == "echo:ok-2"
+    assert res.results[1] is None
+    assert set(res.errors) == {"row-1"} and "server error" in res.errors["row-1"]
+    assert _job_state(res)["failed"] == 1
+
+    records = ac.journal().read_call(res.job_id)
+    assert [r["name"] for r in records] == ["batch_row-0", "batch_row-1", "batch_row-2"]
+    by_cid = {r["payload"]["custom_id"]: r["payload"] for r in records}
+    assert by_cid["row-0"]["raw_text"] == "echo:ok-1" and by_cid["row-0"]["error"] is None
+    assert by_cid["row-1"]["error"]["code"] == "RuntimeError"
+    assert by_cid["row-2"]["usage"]["total_tokens"] == 5
+
+
+def test_one_approval_per_job(client, approval_calls):
+    res = batch_jobs.submit_batch(_requests(*[f"p{i}" for i in range(6)]), description="many")
+    assert len(res.results) == 6 and client.calls == 6
+    assert len(approval_calls) == 1
+    call = approval_calls[0]
+    assert call["kind"] == "llm"
+    assert call["meta"]["batch"] == 6 and call["meta"]["tokens"] > 0
+    assert "batch of 6 request(s)" in call["description"]
+
+
+def test_denied_job_submits_nothing(client, monkeypatch):
+    monkeypatch.setattr(approvals, "request_approval", lambda *a, **k: None)
+    with pytest.raises(RuntimeError, match="declined"):
+        batch_jobs.submit_batch(_requests("a"))
+    assert client.calls == 0
+    job_dir = next((Path(ac._exchanges_dir()) / "batch_jobs").iterdir())
+    assert json.loads((job_dir / "job.json").read_text(encoding="utf-8"))["status"] == "denied_or_failed"
+    assert not (job_dir / "input.jsonl").exists()
+
+
+def test_max_wait_then_resume(client):
+    client.delay = 0.1
+    first = batch_jobs.submit_batch(_requests("a", "b", "c"), max_wait_sec=0.01)
+    assert first.status == "in_progress" and first.results == []
+    res = batch_jobs.resume_batch(first.job_id)
+    assert res.status == "completed"
+    assert [r.raw_text for r in res.results] == ["echo:a", "echo:b", "echo:c"]
+
+
+def _finished_then_restarted(prompts):
+    """A local job that ran to the end, seen from a new process (gone from _JOBS)."""
+    first = batch_jobs.submit_batch(_requests(*prompts), wait=False)
+    assert first.status == "submitted"
+    deadline = time.time() + 5
+    while batch_jobs.LocalBatchBackend._JOBS[first.batch_id]["status"] != "completed" and time.time() < deadline:
+        time.sleep(0.01)
+    batch_jobs.LocalBatchBackend._JOBS.pop(first.batch_id)
+    return first
+
+
+def test_restarted_job_completes_from_its_output_file(client):
+    first = _finished_then_restarted(["a", "FAIL b"])
+    res = batch_jobs.resume_batch(first.job_id)
+    assert res.status == "completed"
+    assert res.results[0].raw_text == "echo:a" and res.results[1] is None
+    assert set(res.errors) == {"row-1"}
+    state = _job_state(res)
+    assert state["completed"] == 1 and state["failed"] == 1 and state["total"] == 2
+
+
+def test_expired_job_reports_every_item(client):
+    first = _finished_then_restarted(["a", "b"])
+    # the restart cut the job off before its output was complete
+    out = Path(first.job_dir) / batch_jobs.LocalBatchBackend.OUTPUT_NAME
+    out.write_text(out.read_text(encoding="utf-8").splitlines()[0] + "\n", encoding="utf-8")
+    res = batch_jobs.resume_batch(first.job_id)
+    assert res.status == "expired"
+    assert res.results == [None, None]
+    assert all("job status=expired" in msg for msg in res.errors.values())
+    assert len(ac.journal().read_call(first.job_id)) == 2
+
+
+def test_rows_settle_the_rate_budget(client, monkeypatch):
+    settled = []
+    sched = ac._rate_scheduler(ac.config_snapshot())
+    real = sched.settle
+    monkeypatch.setattr(sched, "settle", lambda *a: (settled.append(a), real(*a)))
+    batch_jobs.submit_batch(_requests("a", "b"))
+    assert len(settled) == 2
+    assert all(a[0] == "openai_compatible" and a[1] == "local-test-model" and a[3] == 5 for a in settled)
+
+
+def test_rows_are_spread_over_the_backend_pool(client, monkeypatch):
+    monkeypatch.setenv("AILYS_BASE_URLS", "http://down/v1, http://a/v1, http://b/v1")
+    monkeypatch.setattr(ac, "_POOL", {"key": None, "pool": None})
+    client.down.add("http://down/v1")
+    res = batch_jobs.submit_batch(_requests(*[f"p{i}" for i in range(6)]))
+    assert [r.raw_text for r in res.results] == [f"echo:p{i}" for i in range(6)]
+    assert res.errors == {}
+    # the refused backend failed over in place; the rest went to the live ones
+    assert client.calls == 6
+    assert {u for u in client.urls if u != "http://down/v1"} == {"http://a/v1", "http://b/v1"}
+    assert "http://fake/v1" not in client.urls